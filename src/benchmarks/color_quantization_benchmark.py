@@ -0,0 +1,87 @@
+"""
+Compare the dominant color detection with a fresh sklearn KMeans per call (the previous
+implementation) against the NumPy color quantization warm-started from the calibrated colors.
+
+Speed is measured per call. Score stability is the standard deviation of the color similarity
+of the same person over a sequence of torso crops with slightly changing lighting and noise.
+
+Usage (from the src directory):
+    python -m benchmarks.color_quantization_benchmark [image_file]
+
+Without an image, a synthetic torso crop with three colored regions is used.
+"""
+import sys
+import time
+
+import cv2
+import numpy as np
+from sklearn.cluster import KMeans
+
+from benchmarks.utils import synthetic_torso
+from video_processing.color_quantization import MAX_COLOR_DISTANCE
+from video_processing.person_color_detection import find_dominant_colors, calculate_color_similarity
+
+NUM_CROPS = 30
+
+
+def jittered_crops(image, num_crops=NUM_CROPS, seed=0):
+    """
+    Create crops of the same person with changing brightness, noise and crop borders.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    crops = []
+    for _ in range(num_crops):
+        dy, dx = rng.integers(0, max(1, height // 20)), rng.integers(0, max(1, width // 20))
+        crop = image[dy:height - dy, dx:width - dx].astype(np.float32)
+        crop = crop * rng.uniform(0.9, 1.1) + rng.normal(0, 6, crop.shape)
+        crops.append(np.clip(crop, 0, 255).astype(np.uint8))
+    return crops
+
+
+def legacy_dominant_colors(image, k=3):
+    """
+    Dominant colors as computed before: sklearn KMeans with default settings on all pixels.
+    """
+    kmeans = KMeans(n_clusters=k).fit(image.reshape(-1, 3))
+    return np.round(kmeans.cluster_centers_).astype(int)
+
+
+def legacy_color_similarity(calibrated_colors, current_colors):
+    """
+    Color similarity as computed before: centers compared by index.
+    """
+    distance = np.mean([np.linalg.norm(calibrated_colors[i] - current_colors[i])
+                        for i in range(len(calibrated_colors))])
+    return 1 - distance / MAX_COLOR_DISTANCE
+
+
+def measure(name, crops, find_colors, similarity):
+    """
+    Calibrate on the first crop and score all other crops against it.
+    """
+    calibrated = find_colors(crops[0], None)
+    scores = []
+    start_time = time.perf_counter()
+    for crop in crops[1:]:
+        scores.append(similarity(calibrated, find_colors(crop, calibrated)))
+    elapsed = (time.perf_counter() - start_time) / (len(crops) - 1)
+    print(f"{name:>8}: {elapsed * 1000:7.2f} ms/call, similarity mean {np.mean(scores):.3f}, "
+          f"std {np.std(scores):.4f}, min {np.min(scores):.3f}")
+
+
+def main():
+    if len(sys.argv) > 1:
+        image = cv2.cvtColor(cv2.imread(sys.argv[1]), cv2.COLOR_BGR2RGB)
+    else:
+        image = synthetic_torso()
+    crops = jittered_crops(image)
+    print(f"{len(crops)} crops of about {image.shape[1]}x{image.shape[0]} pixels")
+
+    measure("sklearn", crops, lambda crop, calibrated: legacy_dominant_colors(crop), legacy_color_similarity)
+    measure("numpy", crops, lambda crop, calibrated: find_dominant_colors(crop, initial_colors=calibrated),
+            calculate_color_similarity)
+
+
+if __name__ == "__main__":
+    main()
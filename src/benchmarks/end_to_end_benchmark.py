@@ -0,0 +1,132 @@
+"""
+Run the full Main wiring against a simulated Tello on the local machine and report the
+glass-to-command latency: from a frame leaving the simulated camera to the first stick command
+on the wire that was computed from it. The latency is split into the time until the frame left
+the decoder, until the stick state was set and until tellopy sent it.
+
+Usage (from the src directory):
+    python -m benchmarks.end_to_end_benchmark video_file
+"""
+import bisect
+import sys
+import time
+
+from drone_controller import DroneController
+from drone_controller.simulated_tello import SimulatedTello
+from main import Main
+from metrics import MetricsRegistry
+
+# Maximum difference between a set stick position and the one on the wire, which tellopy quantizes
+STICK_TOLERANCE = 0.01
+
+
+class StickRecorder:
+    """
+    Wraps a tellopy drone and records every stick state set by the CommandMixer.
+    """
+
+    def __init__(self, drone):
+        self.drone = drone
+        # Returns the capture time of the measurement the stick state is computed from
+        self.get_measurement_time = lambda: None
+        # Time, pitch, throttle, yaw and measurement capture time of every set stick state
+        self.states = []
+
+    def __getattr__(self, name):
+        return getattr(self.drone, name)
+
+    def set_yaw(self, yaw):
+        # The CommandMixer sets yaw last, the state is complete now
+        self.drone.set_yaw(yaw)
+        self.states.append((time.time(), self.drone.right_y, self.drone.left_y, self.drone.left_x,
+                            self.get_measurement_time()))
+
+
+def record_capture_times(video_processor):
+    """
+    Record the stream index of every frame leaving the decoder, keyed by its capture time.
+
+    The stream index is the number of the frame in decoding order, which is also the order the
+    simulator sends the frames in. It counts the frames skipped by the decoder.
+
+    Returns:
+        dict: Capture time to stream index, filled while the video is processed.
+    """
+    capture_frames = {}
+    slot = video_processor.inference_slot
+    put = slot.put
+
+    def put_recorded(packet):
+        capture_frames[packet.capture_time] = packet.stream_index
+        put(packet)
+
+    slot.put = put_recorded
+    return capture_frames
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    simulator = SimulatedTello(sys.argv[1], port=0)
+    simulator.start()
+
+    drone_controller = DroneController(simulator.address)
+    drone_controller.drone.set_loglevel(drone_controller.drone.LOG_WARN)
+    recorder = StickRecorder(drone_controller.drone)
+    drone_controller.drone = recorder
+    main_controller = Main(headless=True, drone_controllers=[drone_controller])
+    video_processor = main_controller.video_processor
+    recorder.get_measurement_time = lambda: video_processor.tracking_controller.state.last_measurement_time
+    capture_frames = record_capture_times(video_processor)
+
+    # Measure the steady state, without the frames dropped while the models load
+    video_processor.warmup.start()
+    video_processor.warmup.wait()
+
+    # Returns a few seconds after the last frame, when tellopy's video stream times out
+    main_controller.start()
+    simulator.stop()
+
+    glass_times = [send_time for send_time, presentation_time in simulator.sent_frames]
+    wire_times = [command[0] for command in simulator.stick_commands]
+    registry = MetricsRegistry()
+    stages = {name: registry.histogram(name) for name in ("glass_to_command", "glass_to_decoded",
+                                                         "decoded_to_set", "set_to_wire")}
+    unmatched = 0
+    previous = None
+    for set_time, pitch, throttle, yaw, capture_time in recorder.states:
+        state = (pitch, throttle, yaw)
+        if state == previous or state == (0, 0, 0) or capture_time not in capture_frames:
+            previous = state
+            continue
+        previous = state
+        stream_index = capture_frames[capture_time]
+        index = bisect.bisect_left(wire_times, set_time)
+        if stream_index >= len(glass_times) or index == len(wire_times):
+            unmatched += 1
+            continue
+        roll, wire_pitch, wire_throttle, wire_yaw = simulator.stick_commands[index][1:]
+        if max(abs(wire_pitch - pitch), abs(wire_throttle - throttle), abs(wire_yaw - yaw)) > STICK_TOLERANCE:
+            # Replaced by a newer state before tellopy sent it
+            unmatched += 1
+            continue
+        glass_time, wire_time = glass_times[stream_index], wire_times[index]
+        stages["glass_to_command"].record(wire_time - glass_time)
+        stages["glass_to_decoded"].record(capture_time - glass_time)
+        stages["decoded_to_set"].record(set_time - capture_time)
+        stages["set_to_wire"].record(wire_time - set_time)
+
+    print(f"{len(glass_times)} frames sent, {video_processor.frame_count} decoded, "
+          f"{video_processor.ingest.skipped_frames + video_processor.ingest.flushed_packets} skipped by the decoder, "
+          f"{len(simulator.stick_commands)} stick commands received, "
+          f"{stages['glass_to_command'].count} stick changes matched to their frame, {unmatched} not matched")
+    for name, histogram in stages.items():
+        summary = histogram.summary()
+        if summary["count"]:
+            print(f"{name}: p50 {summary['p50'] * 1000:.1f} ms, p95 {summary['p95'] * 1000:.1f} ms, "
+                  f"p99 {summary['p99'] * 1000:.1f} ms, max {summary['max'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
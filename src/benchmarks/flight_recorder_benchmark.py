@@ -0,0 +1,164 @@
+"""
+Compare the CPU time per frame of the FlightRecorder, which remuxes the packets, with decoding
+and with re-encoding the decoded frames, and measure lookups and seeking in the recording.
+
+Usage (from the src directory):
+    python -m benchmarks.flight_recorder_benchmark [video_file] [segment_seconds]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import av
+import numpy as np
+
+from benchmarks.utils import create_synthetic_video
+from video_processing.flight_recorder import FlightRecorder, FlightRecording
+
+# Number of random lookups and seeks in the recording
+LOOKUPS = 1000
+SEEKS = 10
+
+
+def demux_packets(path):
+    """
+    Read all video packets of a file, numbered like by the VideoIngest.
+
+    Returns:
+        tuple: The opened container, its video stream and the packets.
+    """
+    container = av.open(path)
+    stream = container.streams.video[0]
+    packets = [packet for packet in container.demux(stream) if packet.size]
+    for index, packet in enumerate(packets):
+        packet.opaque = index
+    return container, stream, packets
+
+
+def measure_recording(stream, packets, directory, segment_seconds, frame_period):
+    """
+    Record the packets, with arrival times at the frame rate of the video.
+
+    Returns:
+        float: CPU seconds of the recording.
+    """
+    recorder = FlightRecorder(directory, segment_seconds)
+    start_time = time.time()
+    cpu_start = time.process_time()
+    recorder.start(stream)
+    for index, packet in enumerate(packets):
+        recorder.record_packet(packet, start_time + index * frame_period)
+        recorder.record_pose(start_time + index * frame_period, index, np.zeros((33, 4), dtype=np.float32))
+        # Wait for the writer thread like for the next frame of the live stream, without sleeping the frame period
+        while recorder.queue:
+            time.sleep(0.0005)
+    recorder.stop()
+    return time.process_time() - cpu_start
+
+
+def measure_decoding(stream, packets):
+    """
+    Decode the packets and re-encode the frames, like a recording of the decoded frames would.
+
+    Returns:
+        tuple: CPU seconds of the decoding and of the encoding.
+    """
+    decoder = av.CodecContext.create(stream.codec_context.name, "r")
+    decoder.extradata = stream.codec_context.extradata
+    cpu_start = time.process_time()
+    frames = [frame for packet in packets for frame in decoder.decode(packet)]
+    frames += decoder.decode(None)
+    decode_time = time.process_time() - cpu_start
+
+    encoder = av.CodecContext.create("libx264", "w")
+    encoder.width, encoder.height = frames[0].width, frames[0].height
+    encoder.pix_fmt = "yuv420p"
+    encoder.time_base = stream.time_base
+    encoder.options = {"preset": "ultrafast", "tune": "zerolatency"}
+    cpu_start = time.process_time()
+    for index, frame in enumerate(frames):
+        frame.pts = index
+        encoder.encode(frame)
+    encoder.encode(None)
+    return decode_time, time.process_time() - cpu_start
+
+
+def measure_seeking(directory):
+    """
+    Look up random times in the index and seek to random frames of the recording.
+
+    Returns:
+        tuple: Seconds to open the index, per lookup, per seek and per decode from the segment start.
+    """
+    open_start = time.perf_counter()
+    recording = FlightRecording(directory)
+    open_time = time.perf_counter() - open_start
+    times = np.concatenate([index["frames"]["time"] for index in recording.index])
+    rng = random.Random(0)
+
+    lookup_start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        timestamp = rng.uniform(times[0], times[-1])
+        recording.find_frame(timestamp)
+        recording.records_between("poses", timestamp - 0.5, timestamp + 0.5)
+    lookup_time = (time.perf_counter() - lookup_start) / LOOKUPS
+
+    seek_times = []
+    linear_times = []
+    for _ in range(SEEKS):
+        timestamp = rng.uniform(times[0], times[-1])
+        seek_start = time.perf_counter()
+        container, segment_time = recording.open_at(timestamp)
+        for frame in container.decode(video=0):
+            if frame.time >= segment_time - 1e-3:
+                break
+        container.close()
+        seek_times.append(time.perf_counter() - seek_start)
+
+        # Without the index: decode the segment from its start
+        segment_number, frame_record = recording.find_frame(timestamp)
+        linear_start = time.perf_counter()
+        with av.open(recording.segment_path(segment_number)) as container:
+            for frame in container.decode(video=0):
+                if frame.time >= segment_time - 1e-3:
+                    break
+        linear_times.append(time.perf_counter() - linear_start)
+    return open_time, lookup_time, np.mean(seek_times), np.mean(linear_times)
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    segment_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    synthetic = path is None
+    if synthetic:
+        path = create_synthetic_video()
+    directory = tempfile.mkdtemp()
+
+    try:
+        container, stream, packets = demux_packets(path)
+        frame_period = 1 / float(stream.average_rate)
+        record_time = measure_recording(stream, packets, directory, segment_seconds, frame_period)
+        decode_time, encode_time = measure_decoding(stream, packets)
+        container.close()
+
+        count = len(packets)
+        print(f"{count} frames, CPU time per frame: recording {record_time / count * 1000:.2f} ms, "
+              f"decoding {decode_time / count * 1000:.2f} ms, "
+              f"re-encoding decoded frames {encode_time / count * 1000:.2f} ms")
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"Recording: {len(os.listdir(directory)) // 4} segments, {size / 1e6:.1f} MB")
+
+        open_time, lookup_time, seek_time, linear_time = measure_seeking(directory)
+        print(f"Index opened in {open_time * 1000:.2f} ms, lookup of frame and poses {lookup_time * 1e6:.1f} µs, "
+              f"seek to a frame {seek_time * 1000:.1f} ms, decoding the segment up to it {linear_time * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(directory)
+        if synthetic:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare the frame conversion of the original VideoProcessor.create_image_from_frame with the
+pooled FrameConverter.
+
+Usage (from the src directory):
+    python -m benchmarks.frame_conversion_benchmark [video_file]
+"""
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmarks.utils import create_synthetic_video, decode_frames
+from video_processing.frame_conversion import FrameConverter
+
+
+def legacy_conversion(frame):
+    """
+    Frame conversion as done before the FrameConverter, including the copy of the current frame.
+    """
+    image = cv2.cvtColor(np.array(frame.to_image()), cv2.COLOR_RGB2BGR)
+    frame_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    current_frame = image.copy()
+    return frame_rgb, current_frame
+
+
+def pooled_conversion(converter, frame):
+    """
+    Frame conversion with the FrameConverter, the current frame is a view of the pooled buffer.
+    """
+    frame_rgb = converter.convert(frame)
+    return frame_rgb, frame_rgb[..., ::-1]
+
+
+def measure(name, frames, convert):
+    """
+    Measure time and allocated memory per frame of a conversion function.
+
+    Args:
+        name (str): Name printed in the report.
+        frames (list): The decoded frames.
+        convert (callable): Conversion function taking a frame.
+    """
+    # Warm up
+    for frame in frames[:5]:
+        convert(frame)
+
+    start_time = time.perf_counter()
+    for frame in frames:
+        convert(frame)
+    elapsed = time.perf_counter() - start_time
+
+    # Peak of memory allocated during one conversion (numpy, Pillow and PyAV report to tracemalloc)
+    tracemalloc.start()
+    peaks = []
+    for frame in frames:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        result = convert(frame)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        del result
+    tracemalloc.stop()
+
+    frame_bytes = frames[0].width * frames[0].height * 3
+    print(f"{name:>8}: {elapsed / len(frames) * 1000:6.2f} ms/frame, "
+          f"{np.mean(peaks) / 1e6:6.2f} MB allocated/frame "
+          f"(~{np.mean(peaks) / frame_bytes:.1f} RGB frames)")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else create_synthetic_video()
+    frames = decode_frames(path)
+    print(f"{len(frames)} frames of {frames[0].width}x{frames[0].height} ({frames[0].format.name})")
+
+    measure("legacy", frames, legacy_conversion)
+
+    converter = FrameConverter()
+    measure("pooled", frames, lambda frame: pooled_conversion(converter, frame))
+    conversions = (len(frames) + 5) * 2
+    print(f"  pooled: {converter.allocations} buffer allocations for {conversions} conversions "
+          f"({converter.allocations / conversions:.3f}/frame), "
+          f"{converter.fallback_conversions} fallback conversions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare the OpenCV color histogram (cv2.calcHist on the full torso crop and one
+cv2.compareHist per reference) with the lookup-table histogram engine.
+
+Usage (from the src directory):
+    python -m benchmarks.histogram_benchmark [image_file] [num_references]
+
+Without an image, a synthetic torso crop with noise is used.
+"""
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.utils import synthetic_torso
+from video_processing.histogram_engine import calculate_histogram, ReferenceHistograms
+
+REPEATS = 200
+
+
+def opencv_histogram(image):
+    """
+    Histogram as computed before the histogram engine.
+    """
+    hist = cv2.calcHist([image], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
+    return cv2.normalize(hist, hist).flatten().astype(np.float32)
+
+
+def time_per_call(function, repeats=REPEATS):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start_time) / repeats, result
+
+
+def main():
+    if len(sys.argv) > 1:
+        image = cv2.cvtColor(cv2.imread(sys.argv[1]), cv2.COLOR_BGR2RGB)
+    else:
+        noise = np.random.default_rng(0).normal(0, 12, (300, 220, 3))
+        image = np.clip(synthetic_torso() + noise, 0, 255).astype(np.uint8)
+    num_references = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f"Crop of {image.shape[1]}x{image.shape[0]} pixels, {num_references} reference histograms")
+
+    opencv_time, opencv_hist = time_per_call(lambda: opencv_histogram(image))
+    engine_time, engine_hist = time_per_call(lambda: calculate_histogram(image))
+    agreement = cv2.compareHist(opencv_hist, engine_hist, cv2.HISTCMP_CORREL)
+    print(f"histogram  opencv: {opencv_time * 1e6:8.1f} us, engine: {engine_time * 1e6:8.1f} us, "
+          f"correlation between both: {agreement:.4f}")
+
+    rng = np.random.default_rng(1)
+    references = rng.random((num_references, engine_hist.size), dtype=np.float32)
+    reference_matrix = ReferenceHistograms(references)
+    opencv_time, opencv_scores = time_per_call(
+        lambda: [cv2.compareHist(reference, engine_hist, cv2.HISTCMP_CORREL) for reference in references])
+    engine_time, engine_scores = time_per_call(lambda: reference_matrix.correlate(engine_hist))
+    print(f"comparison opencv: {opencv_time * 1e6:8.1f} us, engine: {engine_time * 1e6:8.1f} us, "
+          f"max score difference: {np.max(np.abs(np.array(opencv_scores) - engine_scores)):.2e}")
+
+
+if __name__ == "__main__":
+    main()
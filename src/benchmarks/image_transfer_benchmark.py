@@ -0,0 +1,121 @@
+"""
+Compare the size and transfer time at a given baud rate of the former base64 JPEG image reply
+with the chunked binary image transfer, and check a transfer with a lost chunk end-to-end over
+a pseudo-terminal pair.
+
+Usage (from the src directory):
+    python -m benchmarks.image_transfer_benchmark [image_file] [baud_rate]
+"""
+import base64
+import os
+import sys
+import threading
+import time
+import tty
+
+import cv2
+import numpy as np
+
+from benchmarks.serial_benchmark import FakeDroneController, FRAME_HEIGHT, FRAME_WIDTH
+from serial_controller import SerialListener
+from serial_controller.image_transfer import (byte_budget, decode_frame, encode_image, CHUNK_SIZE, FRAME_CRC,
+                                              FRAME_HEADER, FLAG_PREVIEW)
+
+
+class ImageVideoProcessor:
+    def __init__(self, image):
+        self.image = image
+
+    def get_current_frame(self):
+        return self.image
+
+
+class FrameReader:
+    """
+    Receiving side of the connection, splits the incoming bytes into binary frames.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.data = b""
+
+    def read(self, count):
+        frames = []
+        while len(frames) < count:
+            while len(self.data) < FRAME_HEADER.size or len(self.data) < self.frame_size():
+                self.data += os.read(self.fd, 65536)
+            end = self.frame_size()
+            frames.append(decode_frame(self.data[:end]))
+            self.data = self.data[end:]
+        return frames
+
+    def frame_size(self):
+        return FRAME_HEADER.size + FRAME_HEADER.unpack_from(self.data)[-1] + FRAME_CRC.size
+
+
+def round_trip(image, baud_rate):
+    """
+    Request a progressive image, drop one chunk of the full image and request it again.
+
+    Returns:
+        tuple: The preview and the reassembled full JPEG data.
+    """
+    master, slave = os.openpty()
+    tty.setraw(master)
+    listener = SerialListener(os.ttyname(slave), baud_rate, FakeDroneController(), ImageVideoProcessor(image))
+    listen_thread = threading.Thread(target=listener.listen)
+    listen_thread.start()
+
+    reader = FrameReader(master)
+    os.write(master, b"<IMAGE>REQUEST_IMAGE_PROGRESSIVE\n")
+    first = reader.read(1)[0]
+    frames = [first] + reader.read(first[4] - 1)
+    preview = b"".join(frame[5] for frame in sorted(frames, key=lambda frame: frame[3]))
+
+    full = reader.read(1)
+    full += reader.read(full[0][4] - 1)
+    image_id, total = full[0][2], full[0][4]
+    # Simulate a lost chunk and request it again
+    lost = total // 2
+    chunks = {frame[3]: frame[5] for frame in full if frame[3] != lost}
+    os.write(master, f"<IMAGE>RESEND:{image_id}:{lost}\n".encode())
+    resent = reader.read(1)[0]
+    chunks[resent[3]] = resent[5]
+
+    listener.stop()
+    listen_thread.join()
+    assert first[1] & FLAG_PREVIEW and not full[0][1] & FLAG_PREVIEW
+    return preview, b"".join(chunks[seq] for seq in range(total))
+
+
+def main():
+    if len(sys.argv) > 1:
+        image = cv2.resize(cv2.imread(sys.argv[1]), (FRAME_WIDTH, FRAME_HEIGHT))
+    else:
+        # Smooth synthetic scene, noise would be an unrealistic worst case for JPEG
+        x = np.linspace(0, 255, FRAME_WIDTH, dtype=np.uint8)
+        image = np.dstack([np.tile(x, (FRAME_HEIGHT, 1))] * 3)
+        cv2.circle(image, (640, 360), 150, (40, 80, 200), -1)
+    baud_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 9600
+    bytes_per_second = baud_rate / 10
+
+    ret, buffer = cv2.imencode('.jpg', image)
+    legacy = len(b"<IMAGE>" + base64.b64encode(buffer))
+    print(f"Base64 JPEG: {legacy} bytes, {legacy / bytes_per_second:.1f} s at {baud_rate} baud")
+
+    start_time = time.perf_counter()
+    data, (width, quality) = encode_image(image, byte_budget(baud_rate))
+    encode_time = time.perf_counter() - start_time
+    chunks = -(-len(data) // CHUNK_SIZE)
+    size = len(data) + chunks * (FRAME_HEADER.size + FRAME_CRC.size)
+    print(f"Chunked transfer: {size} bytes ({width} px, quality {quality}, {chunks} chunks), "
+          f"{size / bytes_per_second:.1f} s at {baud_rate} baud, encoded in {encode_time * 1000:.1f} ms")
+
+    preview, full = round_trip(image, baud_rate)
+    decoded = cv2.imdecode(np.frombuffer(full, dtype=np.uint8), cv2.IMREAD_COLOR)
+    print(f"Round trip with a lost chunk: preview {len(preview)} bytes, full image {len(full)} bytes, "
+          f"{'reassembled correctly' if full == data and decoded is not None else 'reassembly FAILED'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure the cost of a target selection in multi-person mode as a function of the number of
+people in the frame.
+
+Copies of a person image are placed side by side into a 720p frame, each copy with a different
+color tint, and the first copy is calibrated as target. The pose estimation per person and the
+batched appearance scoring are timed with the known person boxes; the HOG people detector,
+which runs once per selection regardless of the person count, is timed separately.
+
+Usage (from the src directory):
+    python -m benchmarks.multi_person_benchmark person_image [max_people] [repeats]
+"""
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from video_processing.multi_person import HogPeopleDetector, MultiPersonTracker
+from video_processing.person_color_detection import calibrate_colors, gallery
+from video_processing.pose_estimation import landmarks_to_array
+from video_processing.utils import get_frame_height, get_frame_width
+
+
+class FixedBoxDetector:
+    """
+    Candidate detector with known person boxes, the pose is estimated like in the HogPeopleDetector.
+    """
+
+    def __init__(self, detector, boxes):
+        self.detector = detector
+        self.boxes = boxes
+
+    def detect(self, frame_rgb, max_candidates):
+        candidates = []
+        for box in self.boxes[:max_candidates]:
+            landmarks = self.detector.estimate_pose(frame_rgb, box)
+            if landmarks is not None:
+                candidates.append(landmarks)
+        return candidates
+
+
+def compose_frame(person, num_people):
+    """
+    Place tinted copies of the person image side by side into a frame.
+
+    Returns:
+        tuple: The RGB frame and the person boxes.
+    """
+    frame = np.full((get_frame_height(), get_frame_width(), 3), 90, dtype=np.uint8)
+    width = get_frame_width() // num_people
+    size = min(width, get_frame_height())
+    scaled = cv2.resize(person, (size, size))
+    boxes = []
+    for i in range(num_people):
+        tint = np.roll(np.array([1.0, 0.8, 0.6]), i)
+        x = i * width + (width - size) // 2
+        y = (get_frame_height() - size) // 2
+        frame[y:y + size, x:x + size] = np.clip(scaled * tint, 0, 255).astype(np.uint8)
+        boxes.append((x, y, x + size, y + size))
+    return frame, boxes
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    person = cv2.cvtColor(cv2.imread(sys.argv[1]), cv2.COLOR_BGR2RGB)
+    max_people = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    hog = HogPeopleDetector()
+    for num_people in range(1, max_people + 1):
+        frame, boxes = compose_frame(person, num_people)
+
+        # Calibrate on the first person
+        target_landmarks = hog.estimate_pose(frame, boxes[0])
+        gallery.clear()
+        if target_landmarks is not None:
+            calibrate_colors(frame, landmarks_to_array(target_landmarks))
+
+        tracker = MultiPersonTracker(detector=FixedBoxDetector(hog, boxes), max_candidates=max_people)
+        for i in range(repeats):
+            tracker.select_target(frame, time.time())
+        selection_time = tracker.get_cost_stats()
+
+        start_time = time.perf_counter()
+        for i in range(repeats):
+            hog.detect_boxes(frame)
+        detector_time = (time.perf_counter() - start_time) / repeats
+
+        costs = ", ".join(f"{count} candidates: {seconds * 1000:.1f} ms" for count, seconds in selection_time.items())
+        print(f"{num_people} people: selection {costs}; HOG detector {detector_time * 1000:.1f} ms; "
+              f"target score {tracker.target_score}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Stream previews of a video over a pseudo-terminal pair and report the preview rate, the used
+bandwidth compared to the cap, the share of delta previews and the delay of a LAND command
+during streaming. The received previews are decoded and compared with the sender's state.
+
+Usage (from the src directory):
+    python -m benchmarks.preview_stream_benchmark [video_file] [bytes_per_second] [seconds]
+"""
+import os
+import sys
+import threading
+import time
+import tty
+import zlib
+
+import cv2
+
+from benchmarks.image_transfer_benchmark import FrameReader
+from benchmarks.serial_benchmark import FakeDroneController
+from benchmarks.utils import create_synthetic_video, decode_frames
+from serial_controller import SerialListener
+from serial_controller.image_transfer import FRAME_CRC, FRAME_HEADER
+from serial_controller.preview_stream import decode_preview, FLAG_KEYFRAME, PREVIEW_HEADER
+
+
+class VideoPlayback:
+    """
+    Provides the frames of a video in real time, like the VideoProcessor provides the current frame.
+    """
+
+    def __init__(self, frames, fps=30):
+        self.frames = frames
+        self.fps = fps
+        self.start_time = time.perf_counter()
+
+    def get_current_frame(self):
+        index = int((time.perf_counter() - self.start_time) * self.fps) % len(self.frames)
+        return self.frames[index]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else create_synthetic_video()
+    bytes_per_second = float(sys.argv[2]) if len(sys.argv) > 2 else 480
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    frames = [cv2.cvtColor(frame.to_ndarray(format='rgb24'), cv2.COLOR_RGB2BGR) for frame in decode_frames(path)]
+
+    master, slave = os.openpty()
+    tty.setraw(master)
+    drone_controller = FakeDroneController()
+    listener = SerialListener(os.ttyname(slave), 9600, drone_controller, VideoPlayback(frames))
+    listen_thread = threading.Thread(target=listener.listen)
+    listen_thread.start()
+    os.write(master, f"<PREVIEW>START:{bytes_per_second:g}\n".encode())
+
+    reader = FrameReader(master)
+    reference = None
+    received_bytes = keyframes = deltas = 0
+    land_sent = None
+    start_time = time.perf_counter()
+    elapsed = None
+    while elapsed is None or keyframes + deltas < listener.preview_stream.sent_previews:
+        first = reader.read(1)[0]
+        chunks = [first] + reader.read(first[4] - 1)
+        payload = b"".join(chunk[5] for chunk in chunks)
+        received_bytes += sum(FRAME_HEADER.size + len(chunk[5]) + FRAME_CRC.size for chunk in chunks)
+        flags = PREVIEW_HEADER.unpack_from(zlib.decompress(payload))[0]
+        reference = decode_preview(payload, reference)
+        if flags & FLAG_KEYFRAME:
+            keyframes += 1
+        else:
+            deltas += 1
+        if land_sent is None and time.perf_counter() - start_time > seconds / 2:
+            land_sent = time.perf_counter()
+            os.write(master, b"<COMMAND>LAND\n")
+        if elapsed is None and time.perf_counter() - start_time >= seconds:
+            elapsed = time.perf_counter() - start_time
+            os.write(master, b"<PREVIEW>STOP\n")
+            # Previews sent before the stop are still read
+            time.sleep(0.2)
+
+    mismatches = int((listener.preview_stream.reference != reference).sum())
+    listener.stop()
+    listen_thread.join()
+
+    print(f"{keyframes + deltas} previews in {elapsed:.1f} s ({keyframes} keyframes, {deltas} delta), "
+          f"{received_bytes / elapsed:.0f} bytes/s of {bytes_per_second:g} allowed")
+    if land_sent is not None and drone_controller.land_time is not None:
+        print(f"LAND handled {(drone_controller.land_time - land_sent) * 1000:.1f} ms after sending")
+    print(f"Decoded preview differs from the sender's state in {mismatches} pixels")
+    print(listener.preview_stream.get_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Replay a recorded video through the decode, pose, similarity and tracking stages of the
+VideoProcessor with a fake drone that records every command.
+
+By default the video is processed as fast as possible without dropping frames and the drone is
+adjusted directly after every pose estimation instead of by the fixed-rate control thread, so
+every command is recorded with the number of the frame it was decided on. The inference scheduler
+adapts to the measured pose latency and the similarity check runs in the background, so traces of
+two runs can still differ in the frames pose estimation ran on. With --realtime, the video is
+decoded at its frame rate and frames are dropped like with the live stream. Per-stage timings,
+the effective frame rate, the pipeline statistics and the command trace are written as JSON.
+
+Usage (from the src directory):
+    python -m benchmarks.replay video_file [--realtime] [--calibrate-frame N] [--output trace.json]
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from video_processing import VideoProcessor
+from video_processing.tracking_controller import CONTROL_RATE
+
+
+class RecordingDrone:
+    """
+    Fake tellopy drone that plays a video file and records every command with a timestamp.
+    """
+
+    COMMANDS = ("up", "down", "forward", "backward", "left", "right", "clockwise", "counter_clockwise",
+                "set_throttle", "set_pitch", "set_yaw", "set_roll", "takeoff", "land")
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.commands = []
+        # Returns the number of the last decoded frame, set by the replay
+        self.get_frame_id = lambda: None
+
+        for name in self.COMMANDS:
+            setattr(self, name, self.recorder(name))
+
+    def recorder(self, name):
+        def record(*args):
+            with self.lock:
+                self.commands.append({"time": time.time() - self.start_time, "frame_id": self.get_frame_id(),
+                                      "command": name, "args": list(args)})
+        return record
+
+    def get_video_stream(self):
+        return self.video_path
+
+    def quit(self):
+        pass
+
+
+class ReplayDroneController:
+    """
+    Stands in for the DroneController during a replay.
+    """
+
+    def __init__(self, video_path):
+        self.drone = RecordingDrone(video_path)
+        self.running = True
+
+    def takeoff(self):
+        self.drone.takeoff()
+
+    def land(self):
+        self.drone.land()
+
+    def quit(self):
+        self.drone.quit()
+
+
+def calibrate_at_frame(video_processor, frame_id):
+    """
+    Calibrate the colors on the first frame from frame_id on that has pose landmarks.
+    """
+    while video_processor.drone_controller.running:
+        if video_processor.frame_count >= frame_id and video_processor.pose_landmarks is not None:
+            video_processor.calibrate_colors()
+            return
+        time.sleep(0.005)
+
+
+def replay(video_path, realtime=False, calibrate_frame=None):
+    """
+    Replay a video through the VideoProcessor.
+
+    Args:
+        video_path (str): Path of the recorded video.
+        realtime (bool, optional): Decode at the frame rate of the video and drop frames. Default is False.
+        calibrate_frame (int, optional): Calibrate the colors at this frame. Default is no calibration.
+
+    Returns:
+        dict: The replay results.
+    """
+    drone_controller = ReplayDroneController(video_path)
+    video_processor = VideoProcessor(drone_controller, headless=True, pace_playback=realtime,
+                                     drop_frames=realtime, control_rate=CONTROL_RATE if realtime else None)
+    drone_controller.drone.get_frame_id = lambda: video_processor.frame_count
+
+    if calibrate_frame is not None:
+        threading.Thread(target=calibrate_at_frame, args=(video_processor, calibrate_frame), daemon=True).start()
+
+    # Load the models first, like on the drone while it connects, so the timings are of the pipeline only
+    video_processor.warmup.start()
+    video_processor.warmup.wait()
+
+    start_time = time.time()
+    video_processor.start_video_stream()
+    wall_time = time.time() - start_time
+
+    stats = video_processor.get_pipeline_stats()
+    return {
+        "video": video_path,
+        "mode": "realtime" if realtime else "fast",
+        "wall_time": wall_time,
+        "decoded_frames": stats["decoded_frames"],
+        "effective_fps": stats["decoded_frames"] / wall_time,
+        "pose_fps": stats["stage_timings"].get("pose", {}).get("count", 0) / wall_time,
+        "stage_timings": stats.pop("stage_timings"),
+        "pipeline_stats": stats,
+        "commands": drone_controller.drone.commands,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded video through the tracking pipeline.")
+    parser.add_argument("video_file")
+    parser.add_argument("--realtime", action="store_true",
+                        help="decode at the frame rate of the video and drop frames like with the live stream")
+    parser.add_argument("--calibrate-frame", type=int, help="calibrate the colors of the person at this frame")
+    parser.add_argument("--output", help="file the JSON results are written to (default: stdout)")
+    args = parser.parse_args()
+
+    results = replay(args.video_file, args.realtime, args.calibrate_frame)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"{results['decoded_frames']} frames in {results['wall_time']:.1f} s "
+              f"({results['effective_fps']:.1f} fps), {len(results['commands'])} commands, "
+              f"written to {args.output}")
+    else:
+        json.dump(results, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the time per pose inference on the full frame and on the region of interest around
+the last known person.
+
+Usage (from the src directory):
+    python -m benchmarks.roi_pose_benchmark video_file
+
+The video has to show a person, otherwise the ROI mode always falls back to the full frame.
+"""
+import sys
+
+from benchmarks.utils import decode_frames
+from video_processing.frame_conversion import FrameConverter
+from video_processing.roi_pose import RoiPoseEstimator
+
+
+def run(frames, roi_enabled):
+    """
+    Run pose estimation on every frame.
+
+    Args:
+        frames (list): The decoded frames.
+        roi_enabled (bool): Whether the ROI mode is used.
+
+    Returns:
+        tuple: The inference statistics and the number of frames with a detected person.
+    """
+    converter = FrameConverter()
+    estimator = RoiPoseEstimator(roi_enabled=roi_enabled)
+    detections = 0
+    for frame in frames:
+        if estimator.process(converter.convert(frame)).pose_landmarks:
+            detections += 1
+    return estimator.get_stats(), detections
+
+
+def format_time(seconds):
+    return f"{seconds * 1000:6.2f} ms" if seconds is not None else "   n/a"
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    frames = decode_frames(sys.argv[1])
+    print(f"{len(frames)} frames of {frames[0].width}x{frames[0].height}")
+
+    for name, roi_enabled in (("full-frame", False), ("roi", True)):
+        stats, detections = run(frames, roi_enabled)
+        print(f"{name:>10}: person in {detections}/{len(frames)} frames, "
+              f"{stats['roi_inferences']} ROI inferences ({format_time(stats['avg_roi_time'])}), "
+              f"{stats['full_frame_inferences']} full-frame inferences ({format_time(stats['avg_full_frame_time'])}), "
+              f"{stats['fallbacks']} fallbacks")
+
+
+if __name__ == "__main__":
+    main()
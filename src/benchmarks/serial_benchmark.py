@@ -0,0 +1,92 @@
+"""
+Measure the CPU usage of the idle SerialListener and the delay of a LAND command that arrives
+while images are requested, over a pseudo-terminal pair instead of a real serial port.
+
+Usage (from the src directory):
+    python -m benchmarks.serial_benchmark [idle_seconds] [image_requests]
+"""
+import os
+import sys
+import threading
+import time
+import tty
+
+import numpy as np
+
+from serial_controller import SerialListener
+
+# Size of the drone's 720p frames, video_processing is not imported to keep MediaPipe out of the measurement
+FRAME_HEIGHT = 720
+FRAME_WIDTH = 1280
+
+
+class FakeDroneController:
+    def __init__(self):
+        self.land_time = None
+
+    def takeoff(self):
+        pass
+
+    def land(self):
+        self.land_time = time.perf_counter()
+
+
+class FakeVideoProcessor:
+    def __init__(self):
+        rng = np.random.default_rng(0)
+        self.frame = rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+
+    def get_current_frame(self):
+        return self.frame
+
+
+def drain(fd, stop_event):
+    """
+    Read everything the listener writes, like the receiving side of the serial connection.
+    """
+    while not stop_event.is_set():
+        try:
+            os.read(fd, 65536)
+        except OSError:
+            return
+
+
+def main():
+    idle_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    image_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    master, slave = os.openpty()
+    tty.setraw(master)
+    drone_controller = FakeDroneController()
+    listener = SerialListener(os.ttyname(slave), 115200, drone_controller, FakeVideoProcessor())
+    listen_thread = threading.Thread(target=listener.listen)
+    listen_thread.start()
+    stop_event = threading.Event()
+    threading.Thread(target=drain, args=(master, stop_event), daemon=True).start()
+
+    # CPU time while no commands arrive
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    time.sleep(idle_seconds)
+    cpu = (time.process_time() - start_cpu) / (time.perf_counter() - start_wall)
+    print(f"Idle CPU usage: {cpu * 100:.1f} % of a core")
+
+    # LAND right after several image requests
+    os.write(master, b"<IMAGE>REQUEST_IMAGE\n" * image_requests)
+    send_time = time.perf_counter()
+    os.write(master, b"<COMMAND>LAND\n")
+    while drone_controller.land_time is None and time.perf_counter() - send_time < 5:
+        time.sleep(0.001)
+    if drone_controller.land_time is not None:
+        print(f"LAND handled {(drone_controller.land_time - send_time) * 1000:.1f} ms after sending, "
+              f"behind {image_requests} image requests")
+    else:
+        print("LAND was not handled")
+
+    listener.stop()
+    listen_thread.join()
+    stop_event.set()
+    print(listener.get_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Throughput of the pose estimation as a function of the number of drone sessions in one process.
+
+Every session replays the same video with its own VideoProcessor, as fast as possible and with
+pose estimation on every frame. The pose estimations and appearance checks of all sessions run
+in one shared WorkerPool. For every session count, the total pose inferences per second, the
+rate of the slowest and fastest session (fairness) and the average time a pose estimation waited
+for a worker are reported.
+
+Usage (from the src directory):
+    python -m benchmarks.session_scaling_benchmark [video_file] [max_sessions] [workers]
+"""
+import os
+import sys
+import threading
+import time
+
+from benchmarks.replay import ReplayDroneController
+from benchmarks.utils import create_synthetic_video
+from video_processing import VideoProcessor
+from video_processing.inference_scheduler import InferenceScheduler
+from video_processing.worker_pool import NUM_WORKERS, WorkerPool
+
+# Largest number of sessions measured by default
+MAX_SESSIONS = 4
+
+
+def run_sessions(video_path, num_sessions, num_workers):
+    """
+    Replay the video in several sessions at once.
+
+    Args:
+        video_path (str): Path of the video.
+        num_sessions (int): Number of sessions.
+        num_workers (int): Size of the worker pool.
+
+    Returns:
+        tuple: The wall time and the pipeline statistics of every session.
+    """
+    pool = WorkerPool(num_workers)
+    processors = []
+    for index in range(num_sessions):
+        # Pose estimation on every frame at a constant quality, so only the scheduling differs
+        scheduler = InferenceScheduler(min_pose_interval=1, max_pose_interval=1, latency_budget=float("inf"))
+        processors.append(VideoProcessor(ReplayDroneController(video_path), scheduler=scheduler, headless=True,
+                                         drop_frames=False, control_rate=None, adaptive_quality=False,
+                                         worker_pool=pool, session_name=f"session{index + 1}"))
+
+    # Load the models first, so the timings are of the pipeline only
+    for video_processor in processors:
+        video_processor.warmup.start()
+    for video_processor in processors:
+        video_processor.warmup.wait()
+
+    pool.start()
+    threads = [threading.Thread(target=video_processor.start_video_stream) for video_processor in processors]
+    start_time = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.time() - start_time
+    pool.stop()
+
+    return wall_time, [video_processor.get_pipeline_stats() for video_processor in processors]
+
+
+def main():
+    video_path = sys.argv[1] if len(sys.argv) > 1 else None
+    max_sessions = int(sys.argv[2]) if len(sys.argv) > 2 else MAX_SESSIONS
+    num_workers = int(sys.argv[3]) if len(sys.argv) > 3 else NUM_WORKERS
+
+    synthetic = video_path is None
+    if synthetic:
+        video_path = create_synthetic_video()
+    print(f"{os.cpu_count()} CPU cores, {num_workers} workers")
+
+    try:
+        single_rate = None
+        for num_sessions in range(1, max_sessions + 1):
+            wall_time, stats = run_sessions(video_path, num_sessions, num_workers)
+            pose_counts = [session["stage_timings"].get("pose", {}).get("count", 0) for session in stats]
+            rate = sum(pose_counts) / wall_time
+            if single_rate is None:
+                single_rate = rate
+            waits = [session["worker_pool"]["pose"]["avg_wait_time"] for session in stats
+                     if session["worker_pool"]["pose"]["avg_wait_time"] is not None]
+            avg_wait = sum(waits) / len(waits) if waits else 0.0
+            print(f"{num_sessions} sessions: {rate:6.1f} poses/s ({rate / single_rate:4.2f}x), "
+                  f"per session {min(pose_counts) / wall_time:5.1f} to {max(pose_counts) / wall_time:5.1f} poses/s, "
+                  f"avg wait for a worker {avg_wait * 1000:5.2f} ms")
+    finally:
+        if synthetic:
+            os.remove(video_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the startup time: importing main, building the VideoProcessor, the steps of the model
+warm-up and the first pose inference with and without warm-up. Every run is a new Python process,
+so the imports are cold.
+
+Usage (from the src directory):
+    python -m benchmarks.startup_benchmark [runs]
+"""
+import importlib
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Inferences timed after the first one, for the steady-state inference time
+STEADY_INFERENCES = 5
+
+
+class FakeDroneController:
+    running = True
+    drone = None
+
+
+def measure_startup(warm_up):
+    """
+    Start the program parts in this process and time them.
+
+    Args:
+        warm_up (bool): Wait for the model warm-up before the first inference.
+
+    Returns:
+        dict: Seconds per phase.
+    """
+    start_time = time.perf_counter()
+    # Imported only to time the module loading of the program
+    importlib.import_module("main")
+    from video_processing import VideoProcessor
+    from video_processing.utils import get_frame_height, get_frame_width
+    import_time = time.perf_counter()
+
+    video_processor = VideoProcessor(FakeDroneController(), headless=True)
+    construction_time = time.perf_counter()
+    times = {"import_main": import_time - start_time, "construct_video_processor": construction_time - import_time}
+
+    if warm_up:
+        video_processor.warmup.start()
+        video_processor.warmup.wait()
+        times["warmup_total"] = time.perf_counter() - construction_time
+        for name, seconds in video_processor.warmup.get_status()["timings"].items():
+            times[f"warmup_{name}"] = seconds
+
+    frame_rgb = np.random.default_rng(0).integers(0, 256, (get_frame_height(), get_frame_width(), 3), dtype=np.uint8)
+    inference_start = time.perf_counter()
+    video_processor.pose_estimator.process(frame_rgb)
+    times["first_inference"] = time.perf_counter() - inference_start
+    times["until_first_result"] = time.perf_counter() - start_time
+
+    inference_start = time.perf_counter()
+    for _ in range(STEADY_INFERENCES):
+        video_processor.pose_estimator.process(frame_rgb)
+    times["steady_inference"] = (time.perf_counter() - inference_start) / STEADY_INFERENCES
+    return times
+
+
+def run_child(warm_up):
+    """
+    Measure the startup in a new Python process.
+
+    Args:
+        warm_up (bool): Wait for the model warm-up before the first inference.
+
+    Returns:
+        dict: Seconds per phase, see measure_startup.
+    """
+    code = ("import json; from benchmarks.startup_benchmark import measure_startup; "
+            f"print(json.dumps(measure_startup({warm_up})))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    for warm_up in (False, True):
+        results = [run_child(warm_up) for _ in range(runs)]
+        print(f"{'With' if warm_up else 'Without'} warm-up, median of {runs} runs:")
+        for phase in results[0]:
+            print(f"  {phase}: {statistics.median(result[phase] for result in results) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import av
+import numpy as np
+
+from video_processing.utils import get_frame_height, get_frame_width
+
+
+def create_synthetic_video(num_frames=120, fps=30):
+    """
+    Encode a synthetic H.264 test video in the drone's frame size.
+
+    Args:
+        num_frames (int, optional): Number of frames to encode. Default is 120.
+        fps (int, optional): Frame rate of the video. Default is 30.
+
+    Returns:
+        str: Path of the temporary MP4 file.
+    """
+    width, height = get_frame_width(), get_frame_height()
+    handle, path = tempfile.mkstemp(suffix='.mp4')
+    os.close(handle)
+
+    container = av.open(path, 'w')
+    stream = container.add_stream('h264', rate=fps)
+    stream.width = width
+    stream.height = height
+    stream.pix_fmt = 'yuv420p'
+
+    x = (np.arange(width) % 256).astype(np.uint8)
+    y = (np.arange(height) % 256).astype(np.uint8)
+    for i in range(num_frames):
+        # Moving gradient with some noise, so the encoder produces realistic frame types
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[..., 0] = x + np.uint8(i * 4 % 256)
+        image[..., 1] = y[:, None]
+        image[..., 2] = np.random.randint(0, 32, (height, width), dtype=np.uint8)
+        for packet in stream.encode(av.VideoFrame.from_ndarray(image, format='rgb24')):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+
+    return path
+
+
+def decode_frames(path):
+    """
+    Decode all frames of a video file.
+
+    Args:
+        path (str): Path of the video file.
+
+    Returns:
+        list: The decoded av.VideoFrame objects.
+    """
+    with av.open(path) as container:
+        return list(container.decode(video=0))
+
+
+def synthetic_torso(height=300, width=220):
+    """
+    Create a torso crop with a shirt, a jacket and a background color.
+    """
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = (40, 60, 150)
+    image[:, width // 4:3 * width // 4] = (200, 190, 170)
+    image[:height // 5] = (90, 90, 90)
+    return image
@@ -0,0 +1,97 @@
+"""
+Measure the VideoIngest: the decoding time per frame and the frames held back by the decoder for
+every threading mode, and the delay of the frames behind the stream with a consumer that is too
+slow for the frame rate, with and without catch-up skipping.
+
+Usage (from the src directory):
+    python -m benchmarks.video_ingest_benchmark [video_file] [consumer_ms]
+"""
+import os
+import sys
+import time
+
+import av
+
+from benchmarks.utils import create_synthetic_video
+from metrics.registry import LatencyHistogram
+from video_processing.video_ingest import VideoIngest
+
+# Decoder threading modes compared
+THREAD_TYPES = ("NONE", "SLICE", "FRAME", "AUTO")
+# Default processing time in milliseconds per frame of the slow consumer
+CONSUMER_MS = 60.0
+
+
+def measure_threading(path, thread_type):
+    """
+    Decode the whole video as fast as possible.
+
+    Returns:
+        tuple: Decoding time histogram, decoded frames and the number of packets before the first frame.
+    """
+    histogram = LatencyHistogram()
+    ingest = VideoIngest(thread_type, catch_up=False, histogram=histogram)
+    with av.open(path) as container:
+        ingest.start(container)
+        first_frame_packets = None
+        frames = 0
+        for frame in ingest.frames():
+            if first_frame_packets is None:
+                first_frame_packets = ingest.decoded_packets
+            frames += 1
+    return histogram, frames, first_frame_packets
+
+
+def measure_catch_up(path, catch_up, consumer_seconds):
+    """
+    Play the video at its frame rate to a consumer that needs consumer_seconds per frame.
+
+    Returns:
+        tuple: Histogram of the delay behind the stream, consumed frames and the ingest statistics.
+    """
+    delays = LatencyHistogram()
+    ingest = VideoIngest(catch_up=catch_up, pace=True)
+    with av.open(path) as container:
+        ingest.start(container)
+        start_time = None
+        frames = 0
+        for frame in ingest.frames():
+            if start_time is None:
+                start_time = time.time() - frame.time
+            # Delay of the frame behind its time in the stream when the consumer takes it
+            delays.record(time.time() - start_time - frame.time)
+            time.sleep(consumer_seconds)
+            frames += 1
+    return delays, frames, ingest.get_stats()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    consumer_ms = float(sys.argv[2]) if len(sys.argv) > 2 else CONSUMER_MS
+    synthetic = path is None
+    if synthetic:
+        path = create_synthetic_video()
+
+    try:
+        print(f"Decoding, {os.cpu_count()} CPU cores:")
+        for thread_type in THREAD_TYPES:
+            histogram, frames, first_frame_packets = measure_threading(path, thread_type)
+            summary = histogram.summary()
+            print(f"{thread_type:>5}: {frames} frames, avg {summary['avg'] * 1000:.2f} ms, "
+                  f"p95 {summary['p95'] * 1000:.2f} ms per packet, first frame after {first_frame_packets} packets")
+
+        print(f"Consumer needing {consumer_ms:g} ms per frame:")
+        for catch_up in (False, True):
+            delays, frames, stats = measure_catch_up(path, catch_up, consumer_ms / 1000)
+            summary = delays.summary()
+            print(f"{'catch-up' if catch_up else 'no skipping':>11}: {frames} frames, delay behind the stream "
+                  f"p50 {summary['p50'] * 1000:.0f} ms, max {summary['max'] * 1000:.0f} ms, "
+                  f"{stats['skipped_frames']} non-reference frames skipped, "
+                  f"{stats['flushed_packets']} packets dropped in {stats['flushes']} jumps to a keyframe")
+    finally:
+        if synthetic:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
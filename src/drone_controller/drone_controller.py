@@ -1,21 +1,56 @@
-import tellopy
+import time
 
-from pynput import keyboard
+from .tello import COMMAND_PORT, VIDEO_PORT, Tello
+
+# Seconds between two checks whether the program quit, without keyboard control
+QUIT_POLL_INTERVAL = 0.1
 
 
 class DroneController:
-    def __init__(self):
-        self.drone = tellopy.Tello()
+    def __init__(self, address=None, port=COMMAND_PORT, video_port=VIDEO_PORT):
+        """
+        Initialize the DroneController.
+
+        Args:
+            address (tuple, optional): Host and port of the drone, e.g. of a SimulatedTello. Default is the
+                address of the Tello in its own Wi-Fi.
+            port (int, optional): Local command port, unique per drone in a process. Default is COMMAND_PORT.
+            video_port (int, optional): Local video port, unique per drone in a process. Default is VIDEO_PORT.
+
+        Raises:
+            OSError: If one of the local ports is already in use.
+        """
+        self.drone = Tello(port, video_port)
+        if address is not None:
+            self.drone.tello_addr = address
         self.running = True
+        self.keyboard = None
+        # Called with the name of every flight command, e.g. to record it
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """
+        Add a function that is called with the name of every flight command ("takeoff" or "land").
+
+        Args:
+            listener (callable): The function.
+        """
+        self.listeners.append(listener)
+
+    def notify(self, command):
+        for listener in self.listeners:
+            listener(command)
 
     def connect(self):
         self.drone.connect()
 
     def takeoff(self):
         self.drone.takeoff()
+        self.notify("takeoff")
 
     def land(self):
         self.drone.land()
+        self.notify("land")
 
     def quit(self):
         self.drone.quit()
@@ -28,9 +63,24 @@ class DroneController:
                 self.running = False
                 return False
         except AttributeError:
-            if key == keyboard.Key.tab:
+            if key == self.keyboard.Key.tab:
                 self.takeoff()
 
     def start_listening(self):
+        """
+        Listen for key presses until 'q' is pressed.
+
+        pynput needs a display server. Without it, e.g. on a CI machine, the keyboard control is
+        skipped and the method returns once the program quits.
+        """
+        try:
+            from pynput import keyboard
+        except ImportError as e:
+            print(f"Keyboard control not available: {e}")
+            while self.running:
+                time.sleep(QUIT_POLL_INTERVAL)
+            return
+
+        self.keyboard = keyboard
         with keyboard.Listener(on_press=self.on_key_press) as listener:
             listener.join()
@@ -0,0 +1,315 @@
+"""
+Simulated Tello drone on the local machine, for end-to-end tests without a drone.
+
+The simulator speaks the part of the Tello UDP protocol that tellopy uses: it answers the
+connection request, acknowledges commands, sends status messages and streams the H.264 video
+of a file to the video port of the client as if it came from the camera. Every received stick
+command is timestamped.
+
+Usage (from the src directory):
+    python -m drone_controller.simulated_tello video_file [--port PORT] [--loop]
+
+The program is then started with `python main.py --drone-address 127.0.0.1:PORT`.
+"""
+import argparse
+import socket
+import struct
+import threading
+import time
+
+import av
+from av.bitstream import BitStreamFilterContext
+
+from .tello import decode_video_port
+
+# Port the simulated drone receives commands on, like the Tello
+CONTROL_PORT = 8889
+# Port of the client the video is sent to until it sends its own, tellopy's default
+VIDEO_PORT = 6038
+# Status messages per second, tellopy sends a stick command after every received message
+STATUS_RATE = 20.0
+# Maximum size of a video datagram, without its 2-byte header
+VIDEO_PACKET_SIZE = 1460
+# Seconds a socket read waits before the simulator checks whether it should stop
+SOCKET_TIMEOUT = 0.1
+
+# Tello packet format: start byte, message ids and stick scaling
+START_OF_PACKET = 0xcc
+WIFI_MSG = 0x001a
+VIDEO_START_CMD = 0x0025
+STICK_CMD = 0x0050
+TAKEOFF_CMD = 0x0054
+LAND_CMD = 0x0055
+STICK_CENTER = 1024
+STICK_RANGE = 660.0
+
+
+def crc8(data):
+    crc = 0x77
+    for value in data:
+        crc ^= value
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8c if crc & 1 else crc >> 1
+    return crc
+
+
+def crc16(data):
+    crc = 0x3692
+    for value in data:
+        crc ^= value
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+    return crc
+
+
+def build_packet(cmd, payload=b"", pkt_type=0x48, seq=0):
+    """
+    Build a Tello protocol packet.
+
+    Args:
+        cmd (int): The message id.
+        payload (bytes, optional): The message data.
+        pkt_type (int, optional): The packet type byte. Default is 0x48.
+        seq (int, optional): The sequence number, acknowledgements repeat the one of the command.
+
+    Returns:
+        bytes: The packet with header and checksums.
+    """
+    size = 11 + len(payload)
+    header = bytearray([START_OF_PACKET, (size << 3) & 0xff, (size >> 5) & 0xff])
+    header.append(crc8(header))
+    packet = header + struct.pack("<BHH", pkt_type, cmd, seq) + payload
+    return bytes(packet + struct.pack("<H", crc16(packet)))
+
+
+def parse_packet(data):
+    """
+    Parse a Tello protocol packet, the counterpart of build_packet.
+
+    Args:
+        data (bytes): The received datagram.
+
+    Returns:
+        tuple or None: Message id, sequence number and payload, None if it's no protocol packet.
+    """
+    if len(data) < 11 or data[0] != START_OF_PACKET:
+        return None
+    cmd, seq = struct.unpack_from("<HH", data, 5)
+    return cmd, seq, bytes(data[9:-2])
+
+
+def parse_sticks(payload):
+    """
+    Get the stick positions of a stick command.
+
+    Args:
+        payload (bytes): The payload of the stick command.
+
+    Returns:
+        tuple: Roll, pitch, throttle and yaw from -1 to 1.
+    """
+    packed = int.from_bytes(payload[:6], "little")
+    return tuple((((packed >> shift) & 0x7ff) - STICK_CENTER) / STICK_RANGE for shift in (0, 11, 22, 33))
+
+
+def read_annexb_frames(path):
+    """
+    Read the H.264 frames of a video file as Annex B byte stream, as sent by the Tello.
+
+    Args:
+        path (str): The video file.
+
+    Returns:
+        tuple: The frame rate and a list of (presentation time in seconds, frame data), in decoding order.
+    """
+    container = av.open(path)
+    stream = container.streams.video[0]
+    bitstream_filter = BitStreamFilterContext("h264_mp4toannexb", stream)
+    frames = []
+    for packet in container.demux(stream):
+        for filtered in bitstream_filter.filter(packet):
+            if filtered.size:
+                frames.append((float(filtered.pts * stream.time_base), bytes(filtered)))
+    fps = float(stream.average_rate)
+    container.close()
+    return fps, frames
+
+
+class SimulatedTello:
+    """
+    Tello stand-in on UDP that streams a video file and records the received commands.
+    """
+
+    def __init__(self, video_path, port=CONTROL_PORT, host="127.0.0.1", video_port=None,
+                 status_rate=STATUS_RATE, loop=False):
+        """
+        Initialize the SimulatedTello.
+
+        Args:
+            video_path (str): H.264 video file streamed as camera image.
+            port (int, optional): The control port, 0 picks a free one. Default is CONTROL_PORT.
+            host (str, optional): The address to listen on. Default is the loopback address.
+            video_port (int, optional): The port of the client the video is sent to. Default is the port in the
+                connection request of the client, VIDEO_PORT for the original app.
+            status_rate (float, optional): Status messages per second. Default is STATUS_RATE.
+            loop (bool, optional): Repeat the video instead of stopping at its end. Default is False.
+        """
+        self.fps, self.frames = read_annexb_frames(video_path)
+        self.video_port = video_port
+        self.status_period = 1.0 / status_rate
+        self.loop = loop
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(SOCKET_TIMEOUT)
+        self.address = self.sock.getsockname()
+
+        self.lock = threading.Lock()
+        self.client = None
+        self.client_video_port = VIDEO_PORT
+        self.running = False
+        self.streaming = threading.Event()
+        self.threads = []
+
+        # Time (time.time()) each frame was sent and its presentation time, in sending order
+        self.sent_frames = []
+        # Time, roll, pitch, throttle and yaw of every received stick command
+        self.stick_commands = []
+        # Time and name of every other received command
+        self.commands = []
+        self.video_finished = threading.Event()
+
+    def start(self):
+        """
+        Start answering the client and, once it requests the video, streaming.
+        """
+        self.running = True
+        for target in (self.receive, self.send_status, self.stream_video):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        self.streaming.set()
+        for thread in self.threads:
+            thread.join()
+        self.sock.close()
+
+    def receive(self):
+        """
+        Answer the connection request and acknowledge and record the commands.
+        """
+        while self.running:
+            try:
+                data, client = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            receive_time = time.time()
+
+            if data.startswith(b"conn_req:"):
+                with self.lock:
+                    self.client = client
+                    # The client asks for the video on the port in its connection request
+                    self.client_video_port = decode_video_port(data[9:11])
+                self.sock.sendto(b"conn_ack:" + data[9:11], client)
+                continue
+
+            packet = parse_packet(data)
+            if packet is None:
+                continue
+            cmd, seq, payload = packet
+            if cmd == STICK_CMD:
+                self.stick_commands.append((receive_time,) + parse_sticks(payload))
+                continue
+
+            self.commands.append((receive_time, cmd))
+            # Acknowledge with the sequence number of the command
+            self.sock.sendto(build_packet(cmd, b"\x00", seq=seq), client)
+            if cmd == VIDEO_START_CMD:
+                self.streaming.set()
+
+    def send_status(self):
+        """
+        Send status messages to the connected client, which triggers its stick commands.
+        """
+        next_time = time.monotonic()
+        while self.running:
+            with self.lock:
+                client = self.client
+            if client is not None:
+                try:
+                    self.sock.sendto(build_packet(WIFI_MSG, b"\x5a\x00"), client)
+                except OSError:
+                    return
+            next_time += self.status_period
+            time.sleep(max(next_time - time.monotonic(), 0))
+
+    def stream_video(self):
+        """
+        Send the frames at the frame rate of the video, split into datagrams like the Tello does.
+
+        The first byte of a datagram is the frame number, the second the number of the datagram
+        within the frame, with the highest bit set on the last one.
+        """
+        self.streaming.wait()
+        video_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        duration = len(self.frames) / self.fps
+        start_time = time.monotonic()
+        frame_number = 0
+        repetition = 0
+        while self.running:
+            for presentation_time, data in self.frames:
+                if not self.running:
+                    break
+                # Frames are sent in decoding order at the frame rate
+                time.sleep(max(start_time + frame_number / self.fps - time.monotonic(), 0))
+                with self.lock:
+                    client = self.client
+                    video_port = self.video_port or self.client_video_port
+                chunks = [data[i:i + VIDEO_PACKET_SIZE] for i in range(0, len(data), VIDEO_PACKET_SIZE)]
+                for index, chunk in enumerate(chunks):
+                    last = 0x80 if index == len(chunks) - 1 else 0
+                    video_sock.sendto(bytes([frame_number & 0xff, (index & 0x7f) | last]) + chunk,
+                                      (client[0], video_port))
+                self.sent_frames.append((time.time(), repetition * duration + presentation_time))
+                frame_number += 1
+            if not self.loop:
+                break
+            repetition += 1
+        video_sock.close()
+        self.video_finished.set()
+
+    def frame_send_times(self):
+        """
+        Get the send times of the frames in presentation order, which is the order they are decoded in.
+
+        Returns:
+            list: Send time (time.time()) of every sent frame.
+        """
+        return [send_time for send_time, presentation_time in sorted(self.sent_frames, key=lambda frame: frame[1])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Tello drone streaming a video file.")
+    parser.add_argument("video_file")
+    parser.add_argument("--port", type=int, default=CONTROL_PORT, help=f"control port (default: {CONTROL_PORT})")
+    parser.add_argument("--loop", action="store_true", help="repeat the video")
+    args = parser.parse_args()
+
+    drone = SimulatedTello(args.video_file, args.port, loop=args.loop)
+    drone.start()
+    print(f"Simulated Tello listening on {drone.address[0]}:{drone.address[1]}")
+    try:
+        while not drone.video_finished.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    drone.stop()
+    print(f"{len(drone.sent_frames)} frames sent, {len(drone.stick_commands)} stick commands received")
+
+
+if __name__ == "__main__":
+    main()
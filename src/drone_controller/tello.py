@@ -0,0 +1,126 @@
+import socket
+import time
+
+import tellopy
+from tellopy._internal import dispatcher
+from tellopy._internal.protocol import Packet
+
+# Local port tellopy sends commands from and receives their replies on
+COMMAND_PORT = 9000
+# Local port the drone's video is received on, the port the Tello streams to
+VIDEO_PORT = 6038
+# Seconds a read of the video socket waits before the receiver checks whether the drone quit
+VIDEO_TIMEOUT = 5.0
+# Seconds between two start video commands, the drone sends the SPS and PPS again after each
+START_VIDEO_INTERVAL = 2.0
+
+
+def encode_video_port(port):
+    """
+    Encode a port like the Tello connection request: four decimal digits, two per byte.
+
+    Args:
+        port (int): The port, up to 9999.
+
+    Returns:
+        bytes: The two bytes.
+    """
+    if not 0 < port <= 9999:
+        raise ValueError(f"The video port of a Tello connection request has at most 4 digits, got {port}")
+    return bytes([(port // 1000 % 10) << 4 | port // 100 % 10, (port // 10 % 10) << 4 | port % 10])
+
+
+def decode_video_port(data):
+    """
+    Decode the port of a Tello connection request, the inverse of encode_video_port.
+
+    Args:
+        data (bytes): The two bytes.
+
+    Returns:
+        int: The port.
+    """
+    return ((data[0] >> 4) * 1000 + (data[0] & 0xf) * 100 + (data[1] >> 4) * 10 + (data[1] & 0xf))
+
+
+class Tello(tellopy.Tello):
+    """
+    tellopy.Tello with own local command and video ports, so several drones can be used in one process.
+
+    tellopy always receives the video on port 6038 and delivers its events through a dispatcher
+    shared by all instances. Here, the video socket is bound to video_port when the drone is
+    created, the port is sent with the connection request, and the state machine and all
+    subscribers only receive the events of their own drone.
+    """
+
+    def __init__(self, port=COMMAND_PORT, video_port=VIDEO_PORT):
+        """
+        Initialize the Tello.
+
+        Args:
+            port (int, optional): Local command port. Default is COMMAND_PORT.
+            video_port (int, optional): Local video port, up to 9999. Default is VIDEO_PORT.
+
+        Raises:
+            OSError: If one of the ports is already in use.
+        """
+        encode_video_port(video_port)
+        self.video_port = video_port
+        # Bound before tellopy starts its threads, so a port in use fails here and not in the video thread
+        self.video_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.video_sock.bind(("", video_port))
+            self.video_sock.settimeout(VIDEO_TIMEOUT)
+            self.video_sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 512 * 1024)
+            super().__init__(port)
+        except OSError:
+            self.video_sock.close()
+            raise
+
+    def subscribe(self, signal, handler):
+        """
+        Subscribe to an event of this drone, e.g. EVENT_VIDEO_DATA.
+
+        Args:
+            signal (tellopy._internal.event.Event): The event.
+            handler (callable): Called with event, sender and data.
+        """
+        def handle_own_event(event, sender, **args):
+            if sender is self:
+                handler(event=event, sender=sender, **args)
+        dispatcher.connect(handle_own_event, signal)
+
+    def _Tello__state_machine(self, event, sender, data, **args):
+        # Connected by tellopy to the shared dispatcher, events of other drones are ignored
+        if sender is self:
+            tellopy.Tello._Tello__state_machine(self, event, sender, data, **args)
+
+    def _Tello__send_conn_req(self):
+        self.log.info(f"send connection request (video port {self.video_port})")
+        return self.send_packet(Packet(b"conn_req:" + encode_video_port(self.video_port)))
+
+    def _Tello__video_thread(self):
+        """
+        Receive the video datagrams and publish them, like tellopy's video thread on the own video port.
+        """
+        last_start_time = time.time()
+        while self.state != self.STATE_QUIT:
+            if not self.video_enabled:
+                time.sleep(1.0)
+                continue
+            try:
+                data, _ = self.video_sock.recvfrom(self.udpsize)
+            except socket.timeout:
+                self.log.error("video recv: timeout")
+                continue
+            except OSError as e:
+                self.log.error(f"video recv: {e}")
+                break
+
+            self._Tello__publish(event=self.EVENT_VIDEO_FRAME, data=data[2:])
+            self._Tello__publish(event=self.EVENT_VIDEO_DATA, data=data)
+            if time.time() - last_start_time > START_VIDEO_INTERVAL:
+                last_start_time = time.time()
+                # Keeps the drone sending the SPS and PPS, so a decoder can start at any time
+                self._Tello__send_start_video()
+        self.video_sock.close()
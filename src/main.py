@@ -1,40 +1,360 @@
+import argparse
+import importlib.util
+import os
 import threading
+import time
+
+# Start of the program, before the imports, for the startup breakdown
+START_TIME = time.perf_counter()
 
 from drone_controller import DroneController
+from drone_controller.tello import COMMAND_PORT, VIDEO_PORT
+from metrics import MetricsRegistry, MetricsFileWriter, MetricsServer
 from serial_controller import SerialListener
 from video_processing import VideoProcessor
+from video_processing.flight_recorder import FlightRecorder
+from video_processing.inference_scheduler import LATENCY_BUDGET
+from video_processing.model_warmup import STATE_READY
+from video_processing.multi_person import PERSON_DETECTORS
+from video_processing.profile_store import ProfileStore, PROFILE_DIR
+from video_processing.video_ingest import DECODE_THREAD_TYPE, DECODE_THREAD_COUNT
+from video_processing.quality_governor import MAX_MODEL_COMPLEXITY
+from video_processing.track_filters import FILTER_TYPES
+from video_processing.video_processor import DISPLAY_FPS
+from video_processing.worker_pool import NUM_WORKERS, WorkerPool
 
 # Serial port configuration
 SERIAL_PORT = '/dev/cu.usbserial-10'
 BAUD_RATE = 9600
 
 
-class Main:
-    def __init__(self):
-        self.drone_controller = DroneController()
-        self.video_processor = VideoProcessor(self.drone_controller)
-        self.serial_listener = SerialListener(SERIAL_PORT, BAUD_RATE,
-                                              self.drone_controller, self.video_processor)
+class DroneSession:
+    """
+    Everything that belongs to one drone: its controller, video processing, flight recording and serial link.
+    """
 
-    def start(self):
-        # Connect to drone
+    def __init__(self, name, drone_controller, metrics, headless=False, display_fps=DISPLAY_FPS,
+                 decode_thread_type=DECODE_THREAD_TYPE, decode_thread_count=DECODE_THREAD_COUNT, record_dir=None,
+                 pose_budget=LATENCY_BUDGET, adaptive_quality=True, max_model_complexity=MAX_MODEL_COMPLEXITY,
+                 worker_pool=None, serial_port=None, profile_store=None, roi_mode=False, multi_person=False,
+                 person_detector="hog", landmarker_model=None, filter_type="moving_average"):
+        """
+        Initialize the DroneSession.
+
+        Args:
+            name (str): Name of the session, used as metrics label and in the worker pool.
+            drone_controller (DroneController): Controller of the drone.
+            metrics (MetricsRegistry): Registry of the session's metrics, e.g. labeled with its name.
+            headless (bool, optional): Run without displaying the video. Default is False.
+            display_fps (float, optional): Maximum number of displayed frames per second. Default is DISPLAY_FPS.
+            decode_thread_type (str, optional): Threading of the video decoder. Default is DECODE_THREAD_TYPE.
+            decode_thread_count (int, optional): Number of decoder threads, 0 for automatic.
+                Default is DECODE_THREAD_COUNT.
+            record_dir (str, optional): Directory the flight is recorded to.
+            pose_budget (float, optional): Time budget for one pose estimation in seconds. Default is LATENCY_BUDGET.
+            adaptive_quality (bool, optional): Adapt the pose inference resolution and model complexity to the
+                budget. Default is True.
+            max_model_complexity (int, optional): Highest model complexity of the pose estimation.
+                Default is MAX_MODEL_COMPLEXITY.
+            worker_pool (WorkerPool, optional): Pool shared with the other sessions. Default is own threads.
+            serial_port (str, optional): Serial port of the remote control. Default is no serial link.
+            profile_store (ProfileStore, optional): Saved appearance profiles, shared by all sessions.
+            roi_mode (bool, optional): Run pose estimation on a crop around the last known person. Default is False.
+            multi_person (bool, optional): Select the target among several people by appearance. Default is False.
+            person_detector (str, optional): Detector of the people in multi-person mode. Default is "hog".
+            landmarker_model (str, optional): Pose landmarker model bundle of the "landmarker" person detector.
+            filter_type (str, optional): Filter for shoulder position and torso size, one of FILTER_TYPES.
+                Default is "moving_average".
+        """
+        self.name = name
+        self.drone_controller = drone_controller
+
+        # Flight recording of the raw video, the poses and the commands
+        self.recorder = None
+        if record_dir:
+            self.recorder = FlightRecorder(record_dir)
+            self.drone_controller.add_listener(self.recorder.record_command)
+
+        self.video_processor = VideoProcessor(self.drone_controller, headless=headless, display_fps=display_fps,
+                                              metrics=metrics, decode_thread_type=decode_thread_type,
+                                              decode_thread_count=decode_thread_count, recorder=self.recorder,
+                                              pose_budget=pose_budget, adaptive_quality=adaptive_quality,
+                                              max_model_complexity=max_model_complexity, worker_pool=worker_pool,
+                                              session_name=name if worker_pool is not None else None,
+                                              profile_store=profile_store, roi_mode=roi_mode, multi_person=multi_person,
+                                              person_detector=person_detector, landmarker_model=landmarker_model,
+                                              filter_type=filter_type)
+        self.serial_listener = None
+        if serial_port is not None:
+            self.serial_listener = SerialListener(serial_port, BAUD_RATE, self.drone_controller,
+                                                  self.video_processor, metrics=metrics)
+            # Readiness of the models is reported over serial
+            self.video_processor.warmup.add_listener(self.serial_listener.report_status)
+
+        self.threads = []
+
+    def connect(self):
+        """
+        Connect to the drone, the models are loaded in the background meanwhile.
+        """
+        self.video_processor.warmup.start()
         self.drone_controller.connect()
 
+    def start(self):
+        """
+        Start the control and serial threads of the drone.
+        """
         # Drone control thread
-        control_thread = threading.Thread(target=self.drone_controller.start_listening)
-        control_thread.start()
-
+        self.threads.append(threading.Thread(target=self.drone_controller.start_listening))
         # Serial listener thread
-        serial_thread = threading.Thread(target=self.serial_listener.listen)
-        serial_thread.start()
+        if self.serial_listener is not None:
+            self.threads.append(threading.Thread(target=self.serial_listener.listen))
+        for thread in self.threads:
+            thread.start()
 
-        # Start video processing in the main thread to ensure cv2.imshow works
+    def run(self):
+        """
+        Process the video stream until the drone quits.
+        """
         self.video_processor.start_video_stream()
+        if self.serial_listener is not None:
+            self.serial_listener.stop()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+
+class Main:
+    def __init__(self, headless=False, display_fps=DISPLAY_FPS, metrics_file=None, metrics_port=None,
+                 drone_controllers=None, decode_thread_type=DECODE_THREAD_TYPE, decode_thread_count=DECODE_THREAD_COUNT,
+                 record_dir=None, pose_budget=LATENCY_BUDGET, adaptive_quality=True,
+                 max_model_complexity=MAX_MODEL_COMPLEXITY, num_workers=NUM_WORKERS, profile_dir=PROFILE_DIR,
+                 profile=None, roi_mode=False, multi_person=False, person_detector="hog", landmarker_model=None,
+                 filter_type="moving_average"):
+        """
+        Initialize one session of drone, video processing and serial listener per drone.
+
+        With several drones, the pose estimations and appearance checks of all sessions share one
+        worker pool, the video of the first drone is displayed and the serial link controls it.
+
+        Args:
+            headless (bool, optional): Run without displaying the video. Default is False.
+            display_fps (float, optional): Maximum number of displayed frames per second. Default is DISPLAY_FPS.
+            metrics_file (str, optional): JSON-lines file the metrics are periodically appended to.
+            metrics_port (int, optional): Local port the metrics are served on in the Prometheus format.
+            drone_controllers (list, optional): Controller of every drone, e.g. connected to a
+                SimulatedTello. Default is one DroneController for the Tello.
+            decode_thread_type (str, optional): Threading of the video decoder. Default is DECODE_THREAD_TYPE.
+            decode_thread_count (int, optional): Number of decoder threads, 0 for automatic.
+                Default is DECODE_THREAD_COUNT.
+            record_dir (str, optional): Directory the flight is recorded to, in an own subdirectory per start.
+            pose_budget (float, optional): Time budget for one pose estimation in seconds. Default is LATENCY_BUDGET.
+            adaptive_quality (bool, optional): Adapt the pose inference resolution and model complexity to the
+                budget. Default is True.
+            max_model_complexity (int, optional): Highest model complexity of the pose estimation.
+                Default is MAX_MODEL_COMPLEXITY.
+            num_workers (int, optional): Size of the worker pool shared by several drones. Default is NUM_WORKERS.
+            profile_dir (str, optional): Directory of the saved appearance profiles. Default is PROFILE_DIR.
+            profile (str, optional): Name of a saved profile that is loaded at startup instead of calibrating.
+            roi_mode (bool, optional): Run pose estimation on a crop around the last known person. Default is False.
+            multi_person (bool, optional): Select the target among several people by appearance. Default is False.
+            person_detector (str, optional): Detector of the people in multi-person mode. Default is "hog".
+            landmarker_model (str, optional): Pose landmarker model bundle of the "landmarker" person detector.
+            filter_type (str, optional): Filter for shoulder position and torso size, one of FILTER_TYPES.
+                Default is "moving_average".
+        """
+        # Seconds from START_TIME to every startup milestone, in order
+        self.startup_times = {"imports": time.perf_counter() - START_TIME}
+        self.metrics = MetricsRegistry()
+        if not drone_controllers:
+            drone_controllers = [DroneController()]
+
+        # A single drone keeps its own inference and appearance threads
+        self.worker_pool = WorkerPool(num_workers) if len(drone_controllers) > 1 else None
+        if record_dir:
+            record_dir = os.path.join(record_dir, time.strftime("flight_%Y%m%d_%H%M%S"))
+
+        self.profile_store = ProfileStore(profile_dir)
+
+        self.sessions = []
+        for index, drone_controller in enumerate(drone_controllers):
+            name = f"drone{index + 1}"
+            metrics = self.metrics
+            session_record_dir = record_dir
+            if self.worker_pool is not None:
+                metrics = self.metrics.labeled(session=name)
+                session_record_dir = os.path.join(record_dir, name) if record_dir else None
+            self.sessions.append(DroneSession(
+                name, drone_controller, metrics, headless=headless or index > 0, display_fps=display_fps,
+                decode_thread_type=decode_thread_type, decode_thread_count=decode_thread_count,
+                record_dir=session_record_dir, pose_budget=pose_budget, adaptive_quality=adaptive_quality,
+                max_model_complexity=max_model_complexity, worker_pool=self.worker_pool,
+                serial_port=SERIAL_PORT if index == 0 else None, profile_store=self.profile_store,
+                roi_mode=roi_mode, multi_person=multi_person, person_detector=person_detector,
+                landmarker_model=landmarker_model, filter_type=filter_type))
+
+        # The first drone is displayed and controlled over serial
+        self.drone_controller = self.sessions[0].drone_controller
+        self.video_processor = self.sessions[0].video_processor
+        self.serial_listener = self.sessions[0].serial_listener
+
+        # A known person is trackable right away, without calibration
+        if profile:
+            self.load_profile(profile)
+
+        # Metrics exporters
+        self.metrics_exporters = []
+        if metrics_file:
+            self.metrics_exporters.append(MetricsFileWriter(self.metrics, metrics_file))
+        if metrics_port is not None:
+            self.metrics_exporters.append(MetricsServer(self.metrics, metrics_port))
+
+        self.video_processor.warmup.add_listener(self.on_warmup_status)
+        self.record_startup_time("initialized")
+
+    def load_profile(self, name):
+        """
+        Load a saved appearance profile into every session.
+
+        Args:
+            name (str): Name of the profile.
+        """
+        start_time = time.perf_counter()
+        try:
+            for session in self.sessions:
+                session.video_processor.load_profile(name)
+        except (KeyError, OSError) as e:
+            print(f"Profile {name} not loaded: {e.args[0] if isinstance(e, KeyError) else e}")
+            return
+        print(f"Profile {name} loaded in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+        self.record_startup_time("profile_loaded")
+
+    def record_startup_time(self, milestone):
+        self.startup_times[milestone] = time.perf_counter() - START_TIME
+
+    def on_warmup_status(self, status):
+        """
+        Print the startup breakdown once the models are ready.
+
+        Args:
+            status (dict): The warm-up status, see ModelWarmup.get_status.
+        """
+        if status["state"] != STATE_READY:
+            return
+        self.record_startup_time("models_ready")
+        milestones = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.startup_times.items())
+        steps = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in status["timings"].items())
+        print(f"Startup: {milestones} (warm-up: {steps})")
+
+    def start(self):
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+
+        # Connect to the drones, the models load in the background meanwhile
+        for session in self.sessions:
+            session.connect()
+        self.record_startup_time("drone_connecting")
+
+        for session in self.sessions:
+            session.start()
+        self.record_startup_time("serial_started")
+
+        for exporter in self.metrics_exporters:
+            exporter.start()
+
+        # The other drones are processed in own threads
+        session_threads = [threading.Thread(target=session.run) for session in self.sessions[1:]]
+        for thread in session_threads:
+            thread.start()
+
+        # Start video processing of the first drone in the main thread to ensure cv2.imshow works, also in
+        # headless mode
+        self.sessions[0].run()
+        for thread in session_threads:
+            thread.join()
+        for exporter in self.metrics_exporters:
+            exporter.stop()
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+
+        for session in self.sessions:
+            session.join()
+
+
+def parse_address(address):
+    host, separator, port = address.rpartition(":")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"expected host:port, got {address}")
+    return host, int(port)
+
 
-        control_thread.join()
-        serial_thread.join()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Track a person with a Tello drone.")
+    parser.add_argument("--headless", action="store_true",
+                        help="don't display the video, control the drone over serial port and keyboard only")
+    parser.add_argument("--display-fps", type=float, default=DISPLAY_FPS,
+                        help=f"maximum number of displayed frames per second (default: {DISPLAY_FPS:g})")
+    parser.add_argument("--drone-address", type=parse_address, action="append",
+                        help="host:port of the drone, e.g. of a simulated Tello (default: the Tello's Wi-Fi address), "
+                             "repeat for several drones")
+    parser.add_argument("--decode-thread-type", choices=("NONE", "SLICE", "FRAME", "AUTO"), default=DECODE_THREAD_TYPE,
+                        help=f"threading of the video decoder, FRAME adds a frame of delay per thread "
+                             f"(default: {DECODE_THREAD_TYPE})")
+    parser.add_argument("--decode-thread-count", type=int, default=DECODE_THREAD_COUNT,
+                        help="number of decoder threads, 0 for one per CPU core (default: 0)")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record the video without re-encoding, the poses and the commands to a new "
+                             "subdirectory of DIR")
+    parser.add_argument("--metrics-file", help="JSON-lines file the metrics are appended to every 10 s")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve the metrics in the Prometheus text format on this localhost port")
+    parser.add_argument("--pose-budget", type=float, default=LATENCY_BUDGET * 1000,
+                        help=f"time budget for one pose estimation in ms (default: {LATENCY_BUDGET * 1000:g})")
+    parser.add_argument("--fixed-quality", action="store_true",
+                        help="always run pose estimation on the full resolution instead of adapting it to the budget")
+    parser.add_argument("--max-model-complexity", type=int, choices=(0, 1, 2), default=MAX_MODEL_COMPLEXITY,
+                        help=f"highest complexity of the pose model, 2 downloads the heavy model "
+                             f"(default: {MAX_MODEL_COMPLEXITY})")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR,
+                        help=f"directory of the saved appearance profiles (default: {PROFILE_DIR})")
+    parser.add_argument("--profile", help="name of a saved appearance profile to track without calibration")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS,
+                        help=f"worker threads shared by the pose estimation of several drones (default: {NUM_WORKERS})")
+    parser.add_argument("--track-filter", choices=FILTER_TYPES, default="moving_average",
+                        help="filter for shoulder position and torso size (default: moving_average)")
+    parser.add_argument("--roi", action="store_true",
+                        help="run pose estimation on a crop around the last known person instead of the full frame")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="select the calibrated person among several people in the frame")
+    parser.add_argument("--person-detector", choices=PERSON_DETECTORS, default="hog",
+                        help="detector of the people in multi-person mode, landmarker needs --landmarker-model "
+                             "(default: hog)")
+    parser.add_argument("--landmarker-model", help="MediaPipe pose landmarker model bundle (.task file)")
+    args = parser.parse_args()
+    if args.person_detector == "landmarker":
+        # Checked before anything is loaded, mediapipe itself is imported in the background
+        if not args.landmarker_model:
+            parser.error("--person-detector landmarker requires --landmarker-model")
+        if not os.path.isfile(args.landmarker_model):
+            parser.error(f"pose landmarker model bundle {args.landmarker_model} not found")
+        if importlib.util.find_spec("mediapipe") is None:
+            parser.error("--person-detector landmarker requires the mediapipe package")
+    return args
 
 
 if __name__ == "__main__":
-    main_controller = Main()
+    args = parse_args()
+    # Every drone receives its replies and video on its own local ports
+    drone_controllers = [DroneController(address, port=COMMAND_PORT + index, video_port=VIDEO_PORT + index)
+                         for index, address in enumerate(args.drone_address or [None])]
+    main_controller = Main(headless=args.headless, display_fps=args.display_fps, metrics_file=args.metrics_file,
+                           metrics_port=args.metrics_port,
+                           drone_controllers=drone_controllers,
+                           decode_thread_type=args.decode_thread_type, decode_thread_count=args.decode_thread_count,
+                           record_dir=args.record, pose_budget=args.pose_budget / 1000,
+                           adaptive_quality=not args.fixed_quality, max_model_complexity=args.max_model_complexity,
+                           num_workers=args.workers, profile_dir=args.profile_dir, profile=args.profile,
+                           roi_mode=args.roi, multi_person=args.multi_person, person_detector=args.person_detector,
+                           landmarker_model=args.landmarker_model, filter_type=args.track_filter)
     main_controller.start()
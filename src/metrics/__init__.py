@@ -0,0 +1,4 @@
+# metrics/__init__.py
+
+from .registry import MetricsRegistry
+from .exporters import MetricsFileWriter, MetricsServer
@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds between two snapshots written to the metrics file
+METRICS_FILE_INTERVAL = 10.0
+# Only local clients can read the metrics
+METRICS_HOST = "127.0.0.1"
+
+
+class MetricsFileWriter:
+    """
+    Append a snapshot of all metrics as one JSON line to a file at a fixed interval.
+    """
+
+    def __init__(self, registry, path, interval=METRICS_FILE_INTERVAL):
+        """
+        Initialize the MetricsFileWriter.
+
+        Args:
+            registry (MetricsRegistry): The metrics to write.
+            path (str): The JSON-lines file, new snapshots are appended.
+            interval (float, optional): Seconds between two snapshots. Default is METRICS_FILE_INTERVAL.
+        """
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the writer after writing a last snapshot.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write_snapshot()
+        self.write_snapshot()
+
+    def write_snapshot(self):
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(self.registry.snapshot()) + "\n")
+        except OSError as e:
+            print(f"Writing metrics to {self.path} failed: {e}")
+
+
+class MetricsServer:
+    """
+    Serve all metrics in the Prometheus text format on a local port, under /metrics.
+    """
+
+    def __init__(self, registry, port, host=METRICS_HOST):
+        """
+        Initialize the MetricsServer.
+
+        Args:
+            registry (MetricsRegistry): The metrics to serve.
+            port (int): The TCP port, 0 picks a free one.
+            host (str, optional): The address to listen on. Default is METRICS_HOST.
+        """
+        self.registry = registry
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """
+        Start serving on a background thread.
+
+        Returns:
+            bool: True if the server is listening.
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are not logged to the console
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(self.address, Handler)
+        except OSError as e:
+            print(f"Serving metrics on {self.address[0]}:{self.address[1]} failed: {e}")
+            return False
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return True
+
+    @property
+    def port(self):
+        return self.server.server_address[1] if self.server is not None else None
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
@@ -0,0 +1,320 @@
+import threading
+import time
+
+import numpy as np
+
+# Sub-buckets per power of two of a histogram, the recorded values are exact to 1/32 (about 3 %)
+SUB_BUCKET_BITS = 5
+# Resolution of the histograms, values are recorded in microseconds
+HISTOGRAM_UNIT = 1e-6
+# Largest value in seconds a histogram distinguishes, larger values are counted in the last bucket
+HISTOGRAM_MAX_SECONDS = 60.0
+# Quantiles reported for every histogram
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def bucket_index(value, sub_bucket_bits=SUB_BUCKET_BITS):
+    """
+    Get the bucket of a value in a log-linear (HDR) histogram.
+
+    Values below 2 * 2^sub_bucket_bits have an own bucket, above, every power of two is split
+    into 2^sub_bucket_bits equally wide buckets.
+
+    Args:
+        value (int): The non-negative value.
+        sub_bucket_bits (int, optional): Log2 of the sub-buckets per power of two. Default is SUB_BUCKET_BITS.
+
+    Returns:
+        int: The index of the bucket.
+    """
+    shift = max(value.bit_length() - sub_bucket_bits - 1, 0)
+    return (shift << sub_bucket_bits) + (value >> shift)
+
+
+def bucket_bounds(index, sub_bucket_bits=SUB_BUCKET_BITS):
+    """
+    Get the range of values of a bucket, the inverse of bucket_index.
+
+    Args:
+        index (int): The index of the bucket.
+        sub_bucket_bits (int, optional): Log2 of the sub-buckets per power of two. Default is SUB_BUCKET_BITS.
+
+    Returns:
+        tuple: The lowest value of the bucket and the lowest value of the next bucket.
+    """
+    shift = max((index >> sub_bucket_bits) - 1, 0)
+    mantissa = index - (shift << sub_bucket_bits)
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+def metric_key(name, labels):
+    """
+    Get the key of a metric in Prometheus notation, e.g. 'stage_seconds{stage="pose"}'.
+
+    Args:
+        name (str): The name of the metric.
+        labels (tuple): Pairs of label name and value.
+
+    Returns:
+        str: The key.
+    """
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+
+class Counter:
+    """
+    Monotonically increasing count, e.g. of handled commands.
+    """
+
+    def __init__(self, function=None):
+        """
+        Initialize the Counter.
+
+        Args:
+            function (callable, optional): Returns the count, for counts already kept elsewhere.
+                Such a counter can't be increased.
+        """
+        self.function = function
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        if self.function is not None:
+            return self.function()
+        return self._value
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations with a constant relative error, like an HDR histogram.
+
+    Recording a value only increments one bucket, quantiles are computed from the buckets on
+    request. Recording takes no lock, every histogram must be recorded by a single thread, e.g.
+    the thread of its pipeline stage. Readers may see a recording that is not complete yet.
+    """
+
+    def __init__(self, unit=HISTOGRAM_UNIT, max_seconds=HISTOGRAM_MAX_SECONDS, sub_bucket_bits=SUB_BUCKET_BITS):
+        """
+        Initialize the LatencyHistogram.
+
+        Args:
+            unit (float, optional): Resolution in seconds. Default is HISTOGRAM_UNIT.
+            max_seconds (float, optional): Largest distinguished value in seconds. Default is HISTOGRAM_MAX_SECONDS.
+            sub_bucket_bits (int, optional): Log2 of the sub-buckets per power of two. Default is SUB_BUCKET_BITS.
+        """
+        self.unit = unit
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_value = int(max_seconds / unit)
+        self._buckets = [0] * (bucket_index(self.max_value, sub_bucket_bits) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        """
+        Record one duration.
+
+        Args:
+            seconds (float): The duration, negative values are counted as 0.
+        """
+        value = min(max(int(seconds / self.unit), 0), self.max_value)
+        # Inlined bucket_index
+        shift = max(value.bit_length() - self.sub_bucket_bits - 1, 0)
+        self._buckets[(shift << self.sub_bucket_bits) + (value >> shift)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        """
+        Get quantiles of the recorded durations.
+
+        Args:
+            quantiles (tuple, optional): The quantiles from 0 to 1. Default is QUANTILES.
+
+        Returns:
+            list: The durations in seconds, the middle of the bucket of each quantile, or None if nothing was recorded.
+        """
+        buckets = np.array(self._buckets)
+        maximum = self.maximum
+        cumulative = np.cumsum(buckets)
+        if cumulative[-1] == 0:
+            return [None] * len(quantiles)
+
+        values = []
+        for quantile in quantiles:
+            rank = max(int(np.ceil(quantile * cumulative[-1])), 1)
+            lower, upper = bucket_bounds(int(np.searchsorted(cumulative, rank)), self.sub_bucket_bits)
+            values.append(min((lower + upper) / 2 * self.unit, maximum))
+        return values
+
+    def summary(self, quantiles=QUANTILES):
+        """
+        Get the number of durations, their average, maximum, total and quantiles.
+
+        Args:
+            quantiles (tuple, optional): The reported quantiles. Default is QUANTILES.
+
+        Returns:
+            dict: The summary, quantiles keyed as "p50", "p95" etc.
+        """
+        count, total, maximum = self.count, self.total, self.maximum
+        summary = {"count": count, "avg": total / count if count else None, "max": maximum, "total": total}
+        for quantile, value in zip(quantiles, self.quantiles(quantiles)):
+            summary[f"p{quantile * 100:g}"] = value
+        return summary
+
+
+class MetricsRegistry:
+    """
+    Named counters and latency histograms shared by all parts of the program.
+
+    Metrics are created once and then updated directly, so recording never goes through the
+    registry. A metric is identified by its name and labels, e.g. the stage of a pipeline timing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Per metric key: name, labels and the metric, in registration order
+        self._metrics = {}
+        # Description of every metric name
+        self._help = {}
+
+    def counter(self, name, help_text="", function=None, **labels):
+        """
+        Get or create a counter.
+
+        Args:
+            name (str): The name of the counter, e.g. "serial_commands_total".
+            help_text (str, optional): Description of the counter.
+            function (callable, optional): Returns the count, see Counter.
+            **labels: Labels of the counter.
+
+        Returns:
+            Counter: The counter.
+        """
+        return self._get_or_create(name, help_text, labels, lambda: Counter(function))
+
+    def histogram(self, name, help_text="", **labels):
+        """
+        Get or create a latency histogram.
+
+        Args:
+            name (str): The name of the histogram, e.g. "stage_seconds".
+            help_text (str, optional): Description of the histogram.
+            **labels: Labels of the histogram, e.g. stage="pose".
+
+        Returns:
+            LatencyHistogram: The histogram.
+        """
+        return self._get_or_create(name, help_text, labels, LatencyHistogram)
+
+    def labeled(self, **labels):
+        """
+        Get a view of the registry that adds labels to every metric created through it.
+
+        Args:
+            **labels: The labels, e.g. session="drone1".
+
+        Returns:
+            LabeledMetrics: The view.
+        """
+        return LabeledMetrics(self, labels)
+
+    def _get_or_create(self, name, help_text, labels, factory):
+        labels = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        key = metric_key(name, labels)
+        with self._lock:
+            entry = self._metrics.get(key)
+            if entry is None:
+                entry = (name, labels, factory())
+                self._metrics[key] = entry
+                if help_text:
+                    self._help.setdefault(name, help_text)
+            return entry[2]
+
+    def entries(self):
+        with self._lock:
+            return list(self._metrics.items())
+
+    def snapshot(self):
+        """
+        Get the current values of all metrics.
+
+        Returns:
+            dict: The time, the counter values and the histogram summaries, keyed as in metric_key.
+        """
+        counters = {}
+        histograms = {}
+        for key, (name, labels, metric) in self.entries():
+            if isinstance(metric, Counter):
+                counters[key] = metric.value
+            else:
+                histograms[key] = {field: round(value, 6) if isinstance(value, float) else value
+                                   for field, value in metric.summary().items()}
+        return {"time": time.time(), "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        """
+        Format all metrics in the Prometheus text exposition format.
+
+        Histograms are exposed as summaries with the QUANTILES, a sum and a count.
+
+        Returns:
+            str: The metrics.
+        """
+        families = {}
+        for key, (name, labels, metric) in self.entries():
+            families.setdefault(name, []).append((labels, metric))
+
+        lines = []
+        for name, metrics in families.items():
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            if isinstance(metrics[0][1], Counter):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{metric_key(name, labels)} {metric.value}" for labels, metric in metrics)
+                continue
+
+            lines.append(f"# TYPE {name} summary")
+            for labels, metric in metrics:
+                summary = metric.summary()
+                for quantile in QUANTILES:
+                    value = summary[f"p{quantile * 100:g}"]
+                    quantile_labels = labels + (("quantile", f"{quantile:g}"),)
+                    lines.append(f"{metric_key(name, quantile_labels)} {value if value is not None else 'NaN'}")
+                lines.append(f"{metric_key(name + '_sum', labels)} {summary['total']}")
+                lines.append(f"{metric_key(name + '_count', labels)} {summary['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class LabeledMetrics:
+    """
+    View of a MetricsRegistry that adds fixed labels, e.g. the session, to every metric created through it.
+
+    Everything else, like snapshots and the exporters, works on the whole registry.
+    """
+
+    def __init__(self, registry, labels):
+        self.registry = registry
+        self.labels = labels
+
+    def counter(self, name, help_text="", function=None, **labels):
+        return self.registry.counter(name, help_text, function, **self.labels, **labels)
+
+    def histogram(self, name, help_text="", **labels):
+        return self.registry.histogram(name, help_text, **self.labels, **labels)
+
+    def labeled(self, **labels):
+        return LabeledMetrics(self.registry, {**self.labels, **labels})
+
+    def __getattr__(self, name):
+        return getattr(self.registry, name)
@@ -0,0 +1,209 @@
+import struct
+import threading
+import zlib
+
+import cv2
+
+# Start of every binary frame
+FRAME_MAGIC = b"\xaa\x55"
+# Header: magic, frame type, flags, image id, sequence number, number of chunks, payload length
+FRAME_HEADER = struct.Struct(">2sBBHHHH")
+# CRC32 of header and payload, appended to every frame
+FRAME_CRC = struct.Struct(">I")
+
+# Frame types
+FRAME_TYPE_IMAGE = 1
+# Flags of an image frame: low-resolution image sent ahead of the full one, grayscale image
+FLAG_PREVIEW = 0x01
+FLAG_GRAYSCALE = 0x02
+
+# Payload bytes per chunk, a command waits for at most one chunk on the serial line
+CHUNK_SIZE = 256
+# Seconds an image transfer should take at most, determines the byte budget of an image
+IMAGE_TRANSFER_SECONDS = 5.0
+# Fraction of the byte budget for the preview image of a progressive transfer
+PREVIEW_BUDGET_FRACTION = 0.15
+# Encodings from the highest to the lowest size, as (image width in pixels, JPEG quality)
+IMAGE_LADDER = [
+    (1280, 85),
+    (960, 80),
+    (640, 75),
+    (480, 65),
+    (320, 55),
+    (240, 45),
+    (160, 35),
+]
+
+
+def encode_frame(frame_type, flags, image_id, seq, total, payload):
+    """
+    Build a binary frame with header and CRC.
+
+    Args:
+        frame_type (int): Type of the frame, e.g. FRAME_TYPE_IMAGE.
+        flags (int): Flags of the frame.
+        image_id (int): Id of the image the chunk belongs to.
+        seq (int): Sequence number of the chunk.
+        total (int): Number of chunks of the image.
+        payload (bytes): The chunk data.
+
+    Returns:
+        bytes: The frame.
+    """
+    header = FRAME_HEADER.pack(FRAME_MAGIC, frame_type, flags, image_id & 0xffff, seq, total, len(payload))
+    return header + payload + FRAME_CRC.pack(zlib.crc32(payload, zlib.crc32(header)))
+
+
+def decode_frame(data):
+    """
+    Parse a binary frame, the counterpart of encode_frame for the receiving side.
+
+    Args:
+        data (bytes): The frame.
+
+    Returns:
+        tuple: Frame type, flags, image id, sequence number, number of chunks and payload.
+
+    Raises:
+        ValueError: If the frame is truncated or corrupted.
+    """
+    if len(data) < FRAME_HEADER.size + FRAME_CRC.size:
+        raise ValueError("Frame is truncated")
+    magic, frame_type, flags, image_id, seq, total, length = FRAME_HEADER.unpack_from(data)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Frame does not start with the frame magic")
+    end = FRAME_HEADER.size + length
+    if len(data) < end + FRAME_CRC.size:
+        raise ValueError("Frame is truncated")
+    crc, = FRAME_CRC.unpack_from(data, end)
+    if crc != zlib.crc32(data[:end]):
+        raise ValueError("CRC mismatch")
+    return frame_type, flags, image_id, seq, total, data[FRAME_HEADER.size:end]
+
+
+def byte_budget(baud_rate, seconds=IMAGE_TRANSFER_SECONDS):
+    """
+    Get the number of bytes that can be sent in the given time.
+
+    Args:
+        baud_rate (int): The baud rate of the serial connection, 10 bits are sent per byte.
+        seconds (float, optional): The transfer time. Default is IMAGE_TRANSFER_SECONDS.
+
+    Returns:
+        int: The byte budget, without the framing overhead.
+    """
+    frame_bytes = FRAME_HEADER.size + FRAME_CRC.size + CHUNK_SIZE
+    return int(baud_rate / 10 * seconds * CHUNK_SIZE / frame_bytes)
+
+
+def encode_image(image, budget, grayscale=False, ladder=IMAGE_LADDER):
+    """
+    JPEG-encode an image with the largest size and quality of the ladder that fits into the byte budget.
+
+    Args:
+        image (numpy.ndarray): The BGR image.
+        budget (int): Maximum number of bytes.
+        grayscale (bool, optional): Encode a grayscale image. Default is False.
+        ladder (list, optional): Pairs of image width and JPEG quality. Default is IMAGE_LADDER.
+
+    Returns:
+        tuple: The JPEG data and the (width, quality) pair used. The lowest rung is used if nothing fits.
+    """
+    if grayscale:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = image.shape[:2]
+
+    data, rung = None, None
+    for rung in ladder:
+        target_width, quality = rung
+        if target_width > width:
+            continue
+        scaled = image
+        if target_width < width:
+            scaled = cv2.resize(image, (target_width, height * target_width // width), interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', scaled, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ret:
+            continue
+        data = buffer.tobytes()
+        if len(data) <= budget:
+            break
+    return data, rung
+
+
+class ImageTransfer:
+    """
+    Chunked transfer of one encoded image.
+
+    The image is encoded on the first request for a chunk, i.e. by the writer thread. Chunks
+    reported missing by the receiver are queued again and sent before the remaining ones.
+    """
+
+    def __init__(self, image_id, image, budget, flags=0, chunk_size=CHUNK_SIZE):
+        """
+        Initialize the ImageTransfer.
+
+        Args:
+            image_id (int): Id of the image, part of every frame.
+            image (numpy.ndarray): The BGR image, which must not be changed afterwards.
+            budget (int): Maximum number of bytes of the encoded image.
+            flags (int, optional): Flags of the frames, e.g. FLAG_PREVIEW. Default is 0.
+            chunk_size (int, optional): Payload bytes per chunk. Default is CHUNK_SIZE.
+        """
+        self.image_id = image_id
+        self.image = image
+        self.budget = budget
+        self.flags = flags
+        self.chunk_size = chunk_size
+
+        self.lock = threading.Lock()
+        self.chunks = None
+        self.encoding = None
+        self.pending = []
+        self.sent = 0
+        self.resent = 0
+
+    def prepare(self):
+        """
+        Encode the image and split it into chunks.
+        """
+        data, self.encoding = encode_image(self.image, self.budget, self.flags & FLAG_GRAYSCALE)
+        self.image = None
+        if data is None:
+            self.chunks = []
+            return
+        self.chunks = [data[i:i + self.chunk_size] for i in range(0, len(data), self.chunk_size)]
+        self.pending = list(range(len(self.chunks)))
+
+    def done(self):
+        with self.lock:
+            return self.chunks is not None and not self.pending
+
+    def next_frame(self):
+        """
+        Get the frame of the next pending chunk.
+
+        Returns:
+            bytes or None: The frame or None if all chunks were sent.
+        """
+        with self.lock:
+            if self.chunks is None:
+                self.prepare()
+            if not self.pending:
+                return None
+            seq = self.pending.pop(0)
+            self.sent += 1
+        return encode_frame(FRAME_TYPE_IMAGE, self.flags, self.image_id, seq, len(self.chunks), self.chunks[seq])
+
+    def resend(self, seqs):
+        """
+        Queue chunks again, e.g. after they were lost or corrupted.
+
+        Args:
+            seqs (list): Sequence numbers of the chunks.
+        """
+        with self.lock:
+            if self.chunks is None:
+                return
+            missing = [seq for seq in seqs if 0 <= seq < len(self.chunks) and seq not in self.pending]
+            self.pending = missing + self.pending
+            self.resent += len(missing)
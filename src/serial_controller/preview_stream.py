@@ -0,0 +1,289 @@
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .image_transfer import encode_frame, CHUNK_SIZE
+
+# Frame type of preview frames
+FRAME_TYPE_PREVIEW = 2
+# Flag of a preview frame that contains all tiles
+FLAG_KEYFRAME = 0x01
+# Preview header: flags, width, height, tile size
+PREVIEW_HEADER = struct.Struct(">BHHB")
+
+# Size of the grayscale preview in pixels
+PREVIEW_WIDTH = 128
+PREVIEW_HEIGHT = 72
+# Side length of a tile in pixels, only changed tiles are sent
+TILE_SIZE = 8
+# Gray levels of the preview, two pixels are packed into one byte
+GRAY_LEVELS = 16
+# Minimum mean difference in gray levels for a tile to count as changed
+TILE_CHANGE_THRESHOLD = 0.5
+# Every this many previews, all tiles are sent to recover from lost frames
+KEYFRAME_INTERVAL = 20
+# Maximum number of previews per second
+PREVIEW_MAX_FPS = 5.0
+# Fraction of the serial bandwidth left for command replies and image transfers
+PREVIEW_HEADROOM = 0.5
+
+
+def quantize_preview(frame, width=PREVIEW_WIDTH, height=PREVIEW_HEIGHT):
+    """
+    Scale a frame down to the grayscale preview.
+
+    Args:
+        frame (numpy.ndarray): The BGR frame.
+        width (int, optional): Width of the preview. Default is PREVIEW_WIDTH.
+        height (int, optional): Height of the preview. Default is PREVIEW_HEIGHT.
+
+    Returns:
+        numpy.ndarray: The preview with values from 0 to GRAY_LEVELS - 1.
+    """
+    small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return (gray // (256 // GRAY_LEVELS)).astype(np.uint8)
+
+
+def split_tiles(preview, tile_size=TILE_SIZE):
+    """
+    Get the tiles of a preview.
+
+    Args:
+        preview (numpy.ndarray): The preview, its size must be a multiple of the tile size.
+        tile_size (int, optional): Side length of a tile. Default is TILE_SIZE.
+
+    Returns:
+        numpy.ndarray: Array of shape (tiles, tile_size * tile_size), row by row.
+    """
+    height, width = preview.shape
+    tiles = preview.reshape(height // tile_size, tile_size, width // tile_size, tile_size).swapaxes(1, 2)
+    return tiles.reshape(-1, tile_size * tile_size)
+
+
+def encode_preview(preview, reference, keyframe, threshold=TILE_CHANGE_THRESHOLD, tile_size=TILE_SIZE):
+    """
+    Delta-encode a preview against the preview the receiver already has.
+
+    The payload is the zlib-compressed PREVIEW_HEADER, a bitmap of the sent tiles and their
+    pixels, two 4-bit pixels per byte.
+
+    Args:
+        preview (numpy.ndarray): The new preview.
+        reference (numpy.ndarray or None): The preview of the receiver.
+        keyframe (bool): Send all tiles.
+        threshold (float, optional): Minimum mean difference of a changed tile. Default is TILE_CHANGE_THRESHOLD.
+        tile_size (int, optional): Side length of a tile. Default is TILE_SIZE.
+
+    Returns:
+        tuple: The payload (None if no tile changed) and the preview of the receiver after decoding it.
+    """
+    tiles = split_tiles(preview, tile_size)
+    if keyframe or reference is None:
+        changed = np.ones(len(tiles), dtype=bool)
+        keyframe = True
+    else:
+        difference = np.abs(tiles.astype(np.int16) - split_tiles(reference, tile_size))
+        changed = difference.mean(axis=1) >= threshold
+        if not changed.any():
+            return None, reference
+
+    pixels = tiles[changed].reshape(-1)
+    packed = (pixels[0::2] << 4) | pixels[1::2]
+    height, width = preview.shape
+    header = PREVIEW_HEADER.pack(FLAG_KEYFRAME if keyframe else 0, width, height, tile_size)
+    payload = zlib.compress(header + np.packbits(changed).tobytes() + packed.tobytes())
+
+    if keyframe:
+        return payload, preview.copy()
+    # The receiver keeps the unchanged tiles of its preview
+    updated = split_tiles(reference, tile_size).copy()
+    updated[changed] = tiles[changed]
+    rows, columns = height // tile_size, width // tile_size
+    updated = updated.reshape(rows, columns, tile_size, tile_size).swapaxes(1, 2).reshape(height, width)
+    return payload, updated
+
+
+def decode_preview(payload, reference):
+    """
+    Decode a preview payload, the counterpart of encode_preview for the receiving side.
+
+    Args:
+        payload (bytes): The payload of the preview frames.
+        reference (numpy.ndarray or None): The last decoded preview, needed unless the payload is a keyframe.
+
+    Returns:
+        numpy.ndarray: The decoded preview with values from 0 to GRAY_LEVELS - 1.
+
+    Raises:
+        ValueError: If a delta preview is decoded without matching reference.
+    """
+    data = zlib.decompress(payload)
+    flags, width, height, tile_size = PREVIEW_HEADER.unpack_from(data)
+    rows, columns = height // tile_size, width // tile_size
+    bitmap_size = (rows * columns + 7) // 8
+    changed = np.unpackbits(np.frombuffer(data, np.uint8, bitmap_size, PREVIEW_HEADER.size))[:rows * columns]
+    changed = changed.astype(bool)
+    packed = np.frombuffer(data, np.uint8, offset=PREVIEW_HEADER.size + bitmap_size)
+    pixels = np.empty(len(packed) * 2, dtype=np.uint8)
+    pixels[0::2] = packed >> 4
+    pixels[1::2] = packed & 0x0f
+
+    if flags & FLAG_KEYFRAME:
+        tiles = np.zeros((rows * columns, tile_size * tile_size), dtype=np.uint8)
+    elif reference is None or reference.shape != (height, width):
+        raise ValueError("Delta preview without matching reference")
+    else:
+        tiles = split_tiles(reference, tile_size).copy()
+    tiles[changed] = pixels.reshape(-1, tile_size * tile_size)
+    return tiles.reshape(rows, columns, tile_size, tile_size).swapaxes(1, 2).reshape(height, width)
+
+
+class PreviewStream:
+    """
+    Continuous low-resolution preview of the video stream under a bytes-per-second cap.
+
+    Previews are produced by the serial writer thread when it has nothing else to send. Only
+    tiles that changed against the last sent preview are transmitted. A preview is handed out one
+    chunk at a time, so queued command replies are written between its chunks.
+    """
+
+    def __init__(self, get_frame, bytes_per_second, max_fps=PREVIEW_MAX_FPS, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        Initialize the PreviewStream.
+
+        Args:
+            get_frame (callable): Returns the current BGR frame or None.
+            bytes_per_second (float): Maximum average number of bytes per second.
+            max_fps (float, optional): Maximum number of previews per second. Default is PREVIEW_MAX_FPS.
+            keyframe_interval (int, optional): Every this many previews all tiles are sent. Default is KEYFRAME_INTERVAL.
+        """
+        self.get_frame = get_frame
+        self.bytes_per_second = bytes_per_second
+        self.min_period = 1.0 / max_fps
+        self.keyframe_interval = keyframe_interval
+
+        self.lock = threading.Lock()
+        self.active = False
+        self.reference = None
+        self.preview_id = 0
+        self.force_keyframe = True
+        # Encoded chunks of the current preview that were not handed out yet
+        self.pending_chunks = deque()
+        # Byte budget, negative after a preview was sent until the cap allows the next one
+        self.budget = 0.0
+        self.last_time = None
+        self.next_time = 0.0
+
+        self.sent_previews = 0
+        self.sent_bytes = 0
+        self.unchanged = 0
+
+    def start(self, bytes_per_second=None):
+        """
+        Start streaming, beginning with a keyframe.
+
+        Args:
+            bytes_per_second (float, optional): New bytes-per-second cap.
+        """
+        with self.lock:
+            if bytes_per_second is not None:
+                self.bytes_per_second = bytes_per_second
+            self.active = True
+            self.force_keyframe = True
+            self.budget = 0.0
+            self.last_time = None
+            self.next_time = 0.0
+
+    def stop(self):
+        with self.lock:
+            self.active = False
+
+    def request_keyframe(self):
+        with self.lock:
+            self.force_keyframe = True
+
+    def delay(self, now=None):
+        """
+        Get the seconds until the next preview may be sent.
+
+        Args:
+            now (float, optional): The current time. Default is time.monotonic().
+
+        Returns:
+            float or None: The delay or None if the stream is stopped.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if self.pending_chunks:
+                return 0.0
+            if not self.active:
+                return None
+            budget = self.refill(now)
+            return max(self.next_time - now, -budget / self.bytes_per_second, 0.0)
+
+    def refill(self, now):
+        if self.last_time is not None:
+            # Unused budget is not saved up beyond one second
+            self.budget = min(self.budget + (now - self.last_time) * self.bytes_per_second, self.bytes_per_second)
+        self.last_time = now
+        return self.budget
+
+    def next_message(self, now=None):
+        """
+        Get the next chunk of the current preview or encode the next preview if the cap allows it.
+
+        The chunks of a started preview are handed out even after the stream was stopped, so the
+        receiver never keeps half a preview.
+
+        Args:
+            now (float, optional): The current time. Default is time.monotonic().
+
+        Returns:
+            bytes or None: The frame of one chunk or None if nothing is sent.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if self.pending_chunks:
+                return self.pending_chunks.popleft()
+            if not self.active or now < self.next_time or self.refill(now) < 0:
+                return None
+            self.next_time = now + self.min_period
+
+            frame = self.get_frame()
+            if frame is None:
+                return None
+            keyframe = self.force_keyframe or self.preview_id % self.keyframe_interval == 0
+            payload, reference = encode_preview(quantize_preview(frame), self.reference, keyframe)
+            if payload is None:
+                self.unchanged += 1
+                return None
+            self.reference = reference
+            self.force_keyframe = False
+
+            chunks = [payload[i:i + CHUNK_SIZE] for i in range(0, len(payload), CHUNK_SIZE)]
+            self.pending_chunks.extend(encode_frame(FRAME_TYPE_PREVIEW, 0, self.preview_id, seq, len(chunks), chunk)
+                                       for seq, chunk in enumerate(chunks))
+            size = sum(len(frame) for frame in self.pending_chunks)
+            self.preview_id = (self.preview_id + 1) & 0xffff
+            # The whole preview is charged at once, its chunks follow without waiting for the cap
+            self.budget -= size
+            self.sent_previews += 1
+            self.sent_bytes += size
+            return self.pending_chunks.popleft()
+
+    def get_stats(self):
+        """
+        Get the number of sent previews and bytes and the number of skipped unchanged previews.
+
+        Returns:
+            dict: The counters.
+        """
+        return {"previews": self.sent_previews, "bytes": self.sent_bytes, "unchanged": self.unchanged}
@@ -1,10 +1,25 @@
-import base64
-import cv2
+import collections
+import json
+import threading
+import time
+
 import serial
 
+from metrics import MetricsRegistry
+from .image_transfer import ImageTransfer, byte_budget, FLAG_PREVIEW, PREVIEW_BUDGET_FRACTION
+from .preview_stream import PreviewStream, PREVIEW_HEADROOM
+
+# Seconds a read waits for data before the listener checks whether it should stop
+READ_TIMEOUT = 0.1
+# Maximum number of pending outgoing messages, the oldest one is dropped if the queue is full
+WRITE_QUEUE_SIZE = 4
+# Number of sent images whose chunks can still be requested again
+RECENT_TRANSFERS = 4
+
 
 class SerialListener:
-    def __init__(self, port, baud_rate, drone_controller, video_processor):
+    def __init__(self, port, baud_rate, drone_controller, video_processor, read_timeout=READ_TIMEOUT,
+                 write_queue_size=WRITE_QUEUE_SIZE, preview_bytes_per_second=None, metrics=None):
         """
         Initialize the SerialListener with the given parameters.
 
@@ -13,35 +28,124 @@ class SerialListener:
             baud_rate (int): The baud rate for the serial communication.
             drone_controller (DroneController): An instance of the DroneController class.
             video_processor (VideoProcessor): An instance of the VideoProcessor class.
+            read_timeout (float, optional): Seconds a read blocks waiting for data. Default is READ_TIMEOUT.
+            write_queue_size (int, optional): Maximum number of pending outgoing messages. Default is WRITE_QUEUE_SIZE.
+            preview_bytes_per_second (float, optional): Bandwidth cap of the preview stream. By default,
+                PREVIEW_HEADROOM of the serial bandwidth is left for other messages.
+            metrics (MetricsRegistry, optional): Registry of the command latencies, also sent on request.
+                Default is an own registry.
         """
         self.serial_port = None
+        self.baud_rate = baud_rate
         self.drone_controller = drone_controller
         self.video_processor = video_processor
 
+        # Handler of every command
+        self.handlers = {
+            "<COMMAND>TAKEOFF": self.takeoff,
+            "<COMMAND>LAND": self.land,
+            "<COMMAND>START_TRACK": self.start_tracking,
+            "<COMMAND>STOP_TRACK": self.stop_tracking,
+            "<COMMAND>CALIBRATE": self.calibrate,
+            "<IMAGE>REQUEST_IMAGE": self.request_image,
+            "<IMAGE>REQUEST_IMAGE_PROGRESSIVE": self.request_image_progressive,
+            "<PREVIEW>START": self.start_preview,
+            "<PREVIEW>STOP": self.stop_preview,
+            "<PREVIEW>KEYFRAME": self.request_preview_keyframe,
+            "<METRICS>REQUEST": self.request_metrics,
+            "<STATUS>REQUEST": self.request_status,
+            "<PROFILE>LIST": self.list_profiles,
+            "<COMMAND>PANIC_BUTTON": self.panic,
+        }
+        # Handler of every command with an argument, sent as "<command>:<argument>"
+        self.argument_handlers = {
+            "<IMAGE>RESEND": self.resend_image_chunks,
+            "<PREVIEW>START": self.start_preview,
+            "<PROFILE>SAVE": self.save_profile,
+            "<PROFILE>LOAD": self.load_profile,
+        }
+
+        # Outgoing messages are written by an own thread, so large replies never delay reading commands
+        self.write_queue = collections.deque(maxlen=write_queue_size)
+        self.write_condition = threading.Condition()
+        self.writer_thread = None
+        self.running = False
+        self.dropped_writes = 0
+
+        # Image transfers are sent chunk by chunk, queued messages are written between two chunks
+        self.transfers = collections.deque()
+        self.recent_transfers = collections.OrderedDict()
+        self.next_image_id = 0
+
+        # Preview stream, sent when there is nothing else to write
+        if preview_bytes_per_second is None:
+            preview_bytes_per_second = baud_rate / 10 * (1 - PREVIEW_HEADROOM)
+        self.preview_stream = PreviewStream(self.video_processor.get_current_frame, preview_bytes_per_second)
+
+        # Time from receiving to handling every command
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.command_histograms = {}
+        self.unknown_commands = self.metrics.counter("serial_unknown_commands_total", "Unknown serial commands")
+        self.metrics.counter("serial_dropped_writes_total", "Outgoing serial messages dropped from the full queue",
+                             lambda: self.dropped_writes)
+
         try:
-            self.serial_port = serial.Serial(port, baud_rate)
+            self.serial_port = serial.Serial(port, baud_rate, timeout=read_timeout)
         except serial.SerialException as e:
             print(f"Error opening serial port {port}: {e}")
 
     def listen(self):
         """
-        Continuously listen for incoming serial commands and handle them.
+        Listen for incoming serial commands and handle them until the listener is stopped.
+
+        Reads block until data arrives or the read timeout expires, so no CPU is used while waiting.
         """
         if self.serial_port is None:
             print("Serial port not initialized correctly.")
             return
 
         print("Listening to serial port...\n")
-        while True:
-            if self.serial_port.in_waiting > 0:
-                # Read and handle the incoming command
-                try:
-                    command = self.serial_port.readline().strip().decode('utf-8')
-                    self.handle_command(command)
-                except UnicodeDecodeError as e:
-                    print(f"Error decoding command: {e}")
-                except serial.SerialException as e:
-                    print(f"Error opening serial port {e}")
+        self.running = True
+        self.writer_thread = threading.Thread(target=self.write_outgoing, daemon=True)
+        self.writer_thread.start()
+        # The models may still be loading, later state changes are reported by report_status
+        self.request_status()
+
+        line = bytearray()
+        while self.running:
+            try:
+                line += self.serial_port.read_until(b"\n")
+            except serial.SerialException as e:
+                print(f"Error opening serial port {e}")
+                break
+            if not line.endswith(b"\n"):
+                # Read timed out in the middle of a line or without data
+                continue
+
+            receive_time = time.perf_counter()
+            try:
+                command = line.strip().decode('utf-8')
+                handled = self.handle_command(command)
+            except UnicodeDecodeError as e:
+                print(f"Error decoding command: {e}")
+            else:
+                if handled is not None:
+                    self.record_latency(handled, time.perf_counter() - receive_time)
+                else:
+                    self.unknown_commands.inc()
+            line = bytearray()
+
+        self.stop()
+
+    def stop(self):
+        """
+        Stop listening and writing.
+        """
+        self.running = False
+        with self.write_condition:
+            self.write_condition.notify_all()
+        if self.writer_thread is not None and self.writer_thread is not threading.current_thread():
+            self.writer_thread.join()
 
     def handle_command(self, command):
         """
@@ -49,50 +153,309 @@ class SerialListener:
 
         Args:
             command (str): The command received via the serial port.
+
+        A failing handler doesn't end the listener, the error is sent as reply instead.
+
+        Returns:
+            str or None: The name of the handled command or None if the command is unknown.
         """
         print("Serial port command: ", command)
-        
-        if command == "<COMMAND>TAKEOFF": #'takeoff':
-            print("Taking off...")
-            self.drone_controller.takeoff()
 
-        elif command == '<COMMAND>LAND': #'land':
-            print("Landing...")
-            self.drone_controller.land()
+        handler = self.handlers.get(command)
+        if handler is not None:
+            self.call_handler(command, handler)
+            return command
+
+        name, separator, argument = command.partition(":")
+        handler = self.argument_handlers.get(name)
+        if separator and handler is not None:
+            self.call_handler(name, handler, argument)
+            return name
+        return None
+
+    def call_handler(self, name, handler, *args):
+        try:
+            handler(*args)
+        except Exception as e:
+            print(f"Command {name} failed: {e}")
+            self.enqueue_write(b"<ERROR>" + json.dumps({"command": name, "error": str(e)},
+                                                        separators=(",", ":")).encode() + b"\n")
+
+    def record_latency(self, command, seconds):
+        histogram = self.command_histograms.get(command)
+        if histogram is None:
+            histogram = self.metrics.histogram("serial_command_seconds",
+                                               "Time from receiving to handling a serial command", command=command)
+            self.command_histograms[command] = histogram
+        histogram.record(seconds)
+
+    def get_stats(self):
+        """
+        Get the handling latency of every command and the number of dropped outgoing messages.
+
+        Returns:
+            dict: Calls, average, maximum and quantiles of the seconds per command and the dropped writes.
+        """
+        commands = {command: histogram.summary() for command, histogram in self.command_histograms.items()}
+        return {"commands": commands, "dropped_writes": self.dropped_writes}
+
+    def takeoff(self):
+        print("Taking off...")
+        self.drone_controller.takeoff()
+
+    def land(self):
+        print("Landing...")
+        self.drone_controller.land()
+
+    def start_tracking(self):
+        print("Starting tracking...")
+        self.video_processor.start_tracking()
+
+    def stop_tracking(self):
+        print("Stopping tracking...")
+        self.video_processor.stop_tracking()
+
+    def calibrate(self):
+        print("Calibrating colors...")
+        self.video_processor.calibrate_colors()
+
+    def save_profile(self, name):
+        """
+        Save the calibrated appearance as a named profile and confirm it.
+
+        Args:
+            name (str): Name of the profile.
+        """
+        print(f"Saving profile {name}...")
+        try:
+            self.video_processor.save_profile(name)
+        except (ValueError, OSError) as e:
+            print(f"Saving profile failed: {e}")
+            self.send_profile_reply({"error": str(e)})
+            return
+        self.send_profile_reply({"saved": name})
+
+    def load_profile(self, name):
+        """
+        Load a saved profile as calibrated appearance and confirm it.
+
+        Args:
+            name (str): Name of the profile.
+        """
+        print(f"Loading profile {name}...")
+        try:
+            self.video_processor.load_profile(name)
+        except (KeyError, ValueError, OSError) as e:
+            # The message of a KeyError is quoted by str()
+            message = e.args[0] if isinstance(e, KeyError) else str(e)
+            print(f"Loading profile failed: {message}")
+            self.send_profile_reply({"error": message})
+            return
+        self.send_profile_reply({"loaded": name})
+
+    def list_profiles(self):
+        """
+        Send the saved profiles as one JSON line.
+        """
+        self.send_profile_reply({"profiles": self.video_processor.profile_store.list_profiles()})
+
+    def send_profile_reply(self, reply):
+        self.enqueue_write(b"<PROFILE>" + json.dumps(reply, separators=(",", ":")).encode() + b"\n")
+
+    def request_image(self):
+        print("Send image...")
+        self.send_image()
+
+    def request_image_progressive(self):
+        print("Send image progressively...")
+        self.send_image(progressive=True)
 
-        elif command == '<COMMAND>START_TRACK': #'start_track':
-            print("Starting tracking...")
-            self.video_processor.start_tracking()
+    def resend_image_chunks(self, argument):
+        """
+        Send chunks of a recent image again.
+
+        Args:
+            argument (str): The image id and the comma-separated sequence numbers, e.g. "12:3,7".
+        """
+        try:
+            image_id, seqs = argument.split(":")
+            image_id = int(image_id)
+            seqs = [int(seq) for seq in seqs.split(",") if seq]
+        except ValueError:
+            print(f"Invalid resend request: {argument}")
+            return
+
+        with self.write_condition:
+            transfer = self.recent_transfers.get(image_id)
+            if transfer is None:
+                print(f"Image {image_id} is not available anymore.")
+                return
+            transfer.resend(seqs)
+            if transfer not in self.transfers:
+                self.transfers.append(transfer)
+            self.write_condition.notify()
+
+    def start_preview(self, argument=None):
+        """
+        Start the preview stream.
+
+        Args:
+            argument (str, optional): The bytes-per-second cap of the stream.
+        """
+        bytes_per_second = None
+        if argument:
+            try:
+                bytes_per_second = float(argument)
+            except ValueError:
+                print(f"Invalid preview bandwidth: {argument}")
+                return
+            if bytes_per_second <= 0:
+                print(f"Invalid preview bandwidth: {argument}")
+                return
+        print("Starting preview...")
+        self.preview_stream.start(bytes_per_second)
+        with self.write_condition:
+            self.write_condition.notify()
+
+    def stop_preview(self):
+        print("Stopping preview...")
+        self.preview_stream.stop()
+
+    def request_preview_keyframe(self):
+        self.preview_stream.request_keyframe()
 
-        elif command == '<COMMAND>STOP_TRACK': #'stop_track':
-            print("Stopping tracking...")
+    def request_metrics(self):
+        """
+        Send a snapshot of all metrics as one JSON line.
+        """
+        self.enqueue_write(lambda: b"<METRICS>" + json.dumps(self.metrics.snapshot(), separators=(",", ":")).encode()
+                           + b"\n")
+
+    def request_status(self):
+        """
+        Send the readiness of the models as one JSON line, see ModelWarmup.get_status.
+        """
+        self.report_status(self.video_processor.warmup.get_status())
+
+    def report_status(self, status):
+        """
+        Send a readiness status, e.g. on every state change of the model warm-up.
+
+        Args:
+            status (dict): The status, see ModelWarmup.get_status.
+        """
+        if not self.running:
+            return
+        self.enqueue_write(b"<STATUS>" + json.dumps(status, separators=(",", ":")).encode() + b"\n")
+
+    def panic(self):
+        """
+        Stop tracking, which releases the sticks, and land the drone.
+        """
+        print("Panic button activated!")
+        try:
             self.video_processor.stop_tracking()
+        finally:
+            # Landing must not depend on the tracking being stopped successfully
+            self.drone_controller.land()
+
+    def enqueue_write(self, message):
+        """
+        Queue an outgoing message for the writer thread.
+
+        Args:
+            message (bytes or callable): The data to write or a function returning the data (or None)
+                that is called by the writer thread.
+        """
+        with self.write_condition:
+            if len(self.write_queue) == self.write_queue.maxlen:
+                self.dropped_writes += 1
+            self.write_queue.append(message)
+            self.write_condition.notify()
+
+    def write_outgoing(self):
+        """
+        Write the queued outgoing messages, image chunks and previews until the listener is stopped.
+
+        Queued messages are written first, previews only if nothing else is pending.
+        """
+        while True:
+            transfer = None
+            message = None
+            with self.write_condition:
+                while self.running and not self.write_queue and not self.transfers:
+                    delay = self.preview_stream.delay()
+                    if delay == 0:
+                        break
+                    self.write_condition.wait(delay)
+                if not self.running:
+                    return
+                if self.write_queue:
+                    message = self.write_queue.popleft()
+                elif self.transfers:
+                    transfer = self.transfers[0]
 
-        elif command == '<COMMAND>CALIBRATE': #'calibrate':
-            print("Calibrating colors...")
-            self.video_processor.calibrate_colors()
+            if transfer is None and message is None:
+                message = self.preview_stream.next_message()
+            elif transfer is not None:
+                message = transfer.next_frame()
+                if transfer.done():
+                    with self.write_condition:
+                        if self.transfers and self.transfers[0] is transfer:
+                            self.transfers.popleft()
+            elif callable(message):
+                message = message()
+            if message is None:
+                continue
+            try:
+                self.serial_port.write(message)
+            except serial.SerialException as e:
+                print(f"Error writing to serial port: {e}")
 
-        elif command == '<IMAGE>REQUEST_IMAGE':
-            print("Send image...")
-            self.send_image()
+    def send_image(self, progressive=False):
+        """
+        Send the current frame as chunked binary image, sized to be transferred in a few seconds.
 
-        elif command == '<COMMAND>PANIC_BUTTON':
-            print("Pannic button activated!")
-            raise NameError("ToDo") # ToDo
+        Pending image transfers are replaced. The image is encoded by the writer thread.
 
-    def send_image(self):
+        Args:
+            progressive (bool, optional): Send a low-resolution preview of the image first. Default is False.
+        """
         frame = self.video_processor.get_current_frame()
-        if frame is not None:
-            # Encode the image as jpg
-            ret, buffer = cv2.imencode('.jpg', frame) #convert to streaming data
-            if ret:
-                # Convert buffer to base64 string
-                data = base64.b64encode(buffer).decode('utf-8')
-                # Format as a string with "<IMAGE>..."
-                formatted_data = "<IMAGE>" + data
-                # Send the image as bytes
-                self.serial_port.write(formatted_data.encode('utf-8'))
-            else:
-                print("Failed to encode frame to JPEG.")
-        else:
+        if frame is None:
             print("No frame available to send.")
+            return
+        # The frame buffer is reused by the decoder
+        frame = frame.copy()
+
+        budget = byte_budget(self.baud_rate)
+        transfers = []
+        if progressive:
+            transfers.append(self.create_transfer(frame, int(budget * PREVIEW_BUDGET_FRACTION), FLAG_PREVIEW))
+        transfers.append(self.create_transfer(frame, budget))
+
+        with self.write_condition:
+            self.transfers.clear()
+            self.transfers.extend(transfers)
+            self.write_condition.notify()
+
+    def create_transfer(self, frame, budget, flags=0):
+        """
+        Create an image transfer and remember it for resend requests.
+
+        Args:
+            frame (numpy.ndarray): The BGR image.
+            budget (int): Maximum number of bytes of the encoded image.
+            flags (int, optional): Flags of the frames. Default is 0.
+
+        Returns:
+            ImageTransfer: The transfer.
+        """
+        with self.write_condition:
+            image_id = self.next_image_id
+            self.next_image_id = (self.next_image_id + 1) & 0xffff
+            transfer = ImageTransfer(image_id, frame, budget, flags)
+            self.recent_transfers[image_id] = transfer
+            while len(self.recent_transfers) > RECENT_TRANSFERS:
+                self.recent_transfers.popitem(last=False)
+        return transfer
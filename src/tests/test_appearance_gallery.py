@@ -0,0 +1,115 @@
+import numpy as np
+
+from video_processing.appearance_gallery import AppearanceGallery
+from video_processing.histogram_engine import NUM_BINS
+
+COLORS = np.array([[200, 0, 0], [0, 200, 0], [0, 0, 200]], dtype=np.float32)
+
+
+def make_histograms(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.random(NUM_BINS).astype(np.float32) for _ in range(count)]
+
+
+def variant(base, other, mix=0.5):
+    # Similar enough to be learned (score of about 0.87), but not redundant
+    return ((1 - mix) * base + mix * other).astype(np.float32)
+
+
+def contains(gallery, histogram):
+    histograms, _ = gallery.get_templates()
+    return any(np.allclose(template, histogram) for template in histograms)
+
+
+def test_empty_gallery_matches_nothing():
+    gallery = AppearanceGallery()
+    base, = make_histograms(1)
+    assert gallery.is_empty()
+    assert gallery.match(base, COLORS) is None
+    assert gallery.score_candidates(base[None], COLORS[None]) is None
+
+
+def test_confident_new_appearance_is_learned():
+    base, other = make_histograms(2)
+    gallery = AppearanceGallery()
+    gallery.reset(base, COLORS)
+
+    score = gallery.match(variant(base, other), COLORS)
+    assert gallery.add_threshold <= score < gallery.redundancy_threshold
+    assert len(gallery) == 2
+    assert gallery.added == 1
+
+
+def test_redundant_and_unknown_appearances_are_not_learned():
+    base, other = make_histograms(2)
+    gallery = AppearanceGallery()
+    gallery.reset(base, COLORS)
+
+    assert gallery.match(base, COLORS) >= gallery.redundancy_threshold
+    assert gallery.match(other, COLORS) < gallery.add_threshold
+    assert len(gallery) == 1
+
+
+def test_least_recently_matched_template_is_evicted():
+    base, first, second, third = make_histograms(4)
+    gallery = AppearanceGallery(max_templates=3)
+    gallery.reset(base, COLORS)
+    first, second, third = variant(base, first), variant(base, second), variant(base, third)
+    gallery.match(first, COLORS)
+    gallery.match(second, COLORS)
+    assert len(gallery) == 3
+
+    # The first learned template is matched again, so the second one is the least recently matched
+    gallery.match(first, COLORS)
+    gallery.match(third, COLORS)
+    assert len(gallery) == 3
+    assert gallery.evicted == 1
+    assert contains(gallery, base)
+    assert contains(gallery, first)
+    assert not contains(gallery, second)
+    assert contains(gallery, third)
+
+
+def test_calibrated_template_is_never_evicted():
+    histograms = make_histograms(6, seed=1)
+    base = histograms[0]
+    gallery = AppearanceGallery(max_templates=2)
+    gallery.reset(base, COLORS)
+    for other in histograms[1:]:
+        gallery.match(variant(base, other), COLORS)
+    assert gallery.evicted == len(histograms) - 2
+    np.testing.assert_allclose(gallery.calibrated_histogram, base)
+
+
+def test_every_template_change_increments_the_generation():
+    base, other = make_histograms(2)
+    gallery = AppearanceGallery()
+    generations = [gallery.generation]
+    gallery.reset(base, COLORS)
+    generations.append(gallery.generation)
+    gallery.match(variant(base, other), COLORS)
+    generations.append(gallery.generation)
+    gallery.set_templates(np.stack([base, other]), np.stack([COLORS, COLORS]))
+    generations.append(gallery.generation)
+    gallery.clear()
+    generations.append(gallery.generation)
+    assert generations == sorted(set(generations))
+
+
+def test_match_ignores_scores_of_replaced_templates():
+    base, other, replacement = make_histograms(3)
+    gallery = AppearanceGallery()
+    gallery.reset(base, COLORS)
+    compute_scores = gallery.scores_with_generation
+
+    def replaced_meanwhile(histogram, colors):
+        # Another thread loads a profile between scoring and learning, with as many templates as scores
+        result = compute_scores(histogram, colors)
+        gallery.set_templates(replacement[None], COLORS[None])
+        return result
+
+    gallery.scores_with_generation = replaced_meanwhile
+    gallery.match(variant(base, other), COLORS)
+    assert gallery.added == 0
+    assert len(gallery) == 1
+    assert contains(gallery, replacement)
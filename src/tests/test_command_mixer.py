@@ -0,0 +1,60 @@
+from video_processing.command_mixer import CommandMixer
+
+
+class FakeDrone:
+    def __init__(self):
+        self.sticks = {}
+
+    def set_throttle(self, value):
+        self.sticks["throttle"] = value
+
+    def set_pitch(self, value):
+        self.sticks["pitch"] = value
+
+    def set_yaw(self, value):
+        self.sticks["yaw"] = value
+
+
+def test_first_update_is_clamped():
+    drone = FakeDrone()
+    mixer = CommandMixer(drone, max_stick=50)
+    assert mixer.update(80, -120, 10, now=0.0)
+    assert mixer.state == (50, -50, 10)
+    assert drone.sticks == {"throttle": 0.5, "pitch": -0.5, "yaw": 0.1}
+
+
+def test_update_is_slew_limited():
+    mixer = CommandMixer(FakeDrone(), max_rate=400.0)
+    mixer.update(0, 0, 0, now=0.0)
+    mixer.update(60, -60, 10, now=0.05)
+    # 400 % per second allow 20 % in 50 ms
+    assert mixer.state == (20, -20, 10)
+    mixer.update(60, -60, 10, now=0.1)
+    assert mixer.state == (40, -40, 10)
+
+
+def test_unchanged_state_is_suppressed_until_keepalive():
+    mixer = CommandMixer(FakeDrone(), keepalive_interval=1.0)
+    assert mixer.update(10, 0, 0, now=0.0)
+    assert not mixer.update(10, 0, 0, now=0.5)
+    assert mixer.update(10, 0, 0, now=1.0)
+    assert mixer.get_stats() == {"sent": 2, "suppressed": 1}
+
+
+def test_release_zeroes_the_sticks_at_once():
+    drone = FakeDrone()
+    mixer = CommandMixer(drone)
+    mixer.update(60, 60, 60, now=0.0)
+    assert mixer.release(now=0.05)
+    assert mixer.state == (0, 0, 0)
+    assert drone.sticks == {"throttle": 0.0, "pitch": 0.0, "yaw": 0.0}
+
+
+def test_listeners_get_every_sent_state():
+    mixer = CommandMixer(FakeDrone())
+    states = []
+    mixer.add_listener(states.append)
+    mixer.update(30, 0, 0, now=0.0)
+    mixer.update(30, 0, 0, now=0.1)
+    mixer.release(now=0.2)
+    assert states == [(30, 0, 0), (0, 0, 0)]
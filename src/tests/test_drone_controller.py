@@ -0,0 +1,69 @@
+import socket
+import threading
+
+from drone_controller import DroneController
+from drone_controller.tello import decode_video_port, encode_video_port
+
+# Local ports of the two controllers, away from tellopy's defaults so a running program doesn't interfere
+COMMAND_PORTS = (19000, 19001)
+VIDEO_PORTS = (7038, 7039)
+TIMEOUT = 5.0
+
+
+def create_fake_drone():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(TIMEOUT)
+    return sock
+
+
+def receive_conn_req(sock):
+    while True:
+        data, client = sock.recvfrom(2048)
+        if data.startswith(b"conn_req:"):
+            return data, client
+
+
+def test_video_port_encoding():
+    for port in (1, 6038, 7039, 9999):
+        assert decode_video_port(encode_video_port(port)) == port
+    assert encode_video_port(6038) == b"\x60\x38"
+
+
+def test_two_controllers_in_one_process():
+    fake_drones = [create_fake_drone(), create_fake_drone()]
+    controllers = [DroneController(sock.getsockname(), port=port, video_port=video_port)
+                   for sock, port, video_port in zip(fake_drones, COMMAND_PORTS, VIDEO_PORTS)]
+    frames = [[], []]
+    received = [threading.Event(), threading.Event()]
+    try:
+        for index, controller in enumerate(controllers):
+            def handle_frame(event, sender, data, index=index, **args):
+                frames[index].append(data)
+                received[index].set()
+            controller.drone.subscribe(controller.drone.EVENT_VIDEO_FRAME, handle_frame)
+
+        for sock, controller, port, video_port in zip(fake_drones, controllers, COMMAND_PORTS, VIDEO_PORTS):
+            controller.drone.connect()
+            data, client = receive_conn_req(sock)
+            # Replies and video go to the ports of this controller
+            assert client[1] == port
+            assert decode_video_port(data[9:11]) == video_port
+            sock.sendto(b"conn_ack:" + data[9:11], client)
+            controller.drone.wait_for_connection(TIMEOUT)
+            controller.drone.start_video()
+
+        video_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for index, video_port in enumerate(VIDEO_PORTS):
+            video_sock.sendto(bytes([0, 0x80]) + b"frame%d" % index, ("127.0.0.1", video_port))
+        video_sock.close()
+
+        for event in received:
+            assert event.wait(TIMEOUT)
+        # Each controller only sees the video of its own drone
+        assert frames == [[b"frame0"], [b"frame1"]]
+    finally:
+        for controller in controllers:
+            controller.quit()
+        for sock in fake_drones:
+            sock.close()
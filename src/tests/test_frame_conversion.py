@@ -0,0 +1,35 @@
+import numpy as np
+
+from video_processing.frame_conversion import FrameBufferPool, POOL_SIZE
+
+SHAPE = (4, 6, 3)
+
+
+def test_held_buffer_is_not_reused():
+    pool = FrameBufferPool()
+    held = pool.acquire(SHAPE)
+    held[:] = 200
+    # Consumers hold read-only views, like the frames of the pipeline
+    view = held.view()
+    view.flags.writeable = False
+    del held
+
+    for value in range(POOL_SIZE * 2 + 1):
+        buffer = pool.acquire(SHAPE)
+        assert not np.shares_memory(buffer, view)
+        buffer[:] = value
+    assert (view == 200).all()
+
+
+def test_free_buffers_are_reused_without_allocations():
+    pool = FrameBufferPool()
+    for _ in range(POOL_SIZE * 3):
+        pool.acquire(SHAPE)[:] = 1
+    assert pool.allocations == POOL_SIZE
+
+
+def test_buffer_is_allocated_when_all_are_held():
+    pool = FrameBufferPool(2)
+    held = [pool.acquire(SHAPE) for _ in range(3)]
+    assert pool.allocations == 3
+    assert len({id(buffer) for buffer in held}) == 3
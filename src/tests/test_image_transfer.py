@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+import pytest
+
+from serial_controller.image_transfer import (encode_frame, decode_frame, encode_image, ImageTransfer, FRAME_HEADER,
+                                              FRAME_CRC, FRAME_TYPE_IMAGE, FLAG_PREVIEW, IMAGE_LADDER)
+
+
+def create_image(width=640, height=360):
+    rng = np.random.default_rng(0)
+    return cv2.resize(rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+
+
+def test_frame_round_trip():
+    frame = encode_frame(FRAME_TYPE_IMAGE, FLAG_PREVIEW, 0x12345, 3, 7, b"payload")
+    assert len(frame) == FRAME_HEADER.size + len(b"payload") + FRAME_CRC.size
+    # The image id wraps around at 16 bits
+    assert decode_frame(frame) == (FRAME_TYPE_IMAGE, FLAG_PREVIEW, 0x2345, 3, 7, b"payload")
+
+
+def test_corrupted_frames_are_rejected():
+    frame = bytearray(encode_frame(FRAME_TYPE_IMAGE, 0, 1, 0, 1, b"payload"))
+    with pytest.raises(ValueError):
+        decode_frame(bytes(frame[:-1]))
+    corrupted = frame.copy()
+    corrupted[FRAME_HEADER.size] ^= 0x01
+    with pytest.raises(ValueError, match="CRC"):
+        decode_frame(bytes(corrupted))
+    corrupted = frame.copy()
+    corrupted[0] = 0
+    with pytest.raises(ValueError, match="magic"):
+        decode_frame(bytes(corrupted))
+
+
+def test_image_is_encoded_within_the_budget():
+    image = create_image()
+    data, (width, quality) = encode_image(image, 8000)
+    assert len(data) <= 8000
+    # Rungs wider than the image are skipped
+    assert width <= 640
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[1] == width
+
+
+def test_lowest_rung_is_used_if_nothing_fits():
+    _, rung = encode_image(create_image(), 1)
+    assert rung == IMAGE_LADDER[-1]
+
+
+def test_transfer_chunks_reassemble_the_image():
+    transfer = ImageTransfer(5, create_image(), 20000, chunk_size=100)
+    payloads = {}
+    while (frame := transfer.next_frame()) is not None:
+        _, _, image_id, seq, total, payload = decode_frame(frame)
+        assert image_id == 5
+        payloads[seq] = payload
+    assert transfer.done()
+    assert sorted(payloads) == list(range(total))
+    data = b"".join(payloads[seq] for seq in range(total))
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) is not None
+
+
+def test_missing_chunks_are_sent_again_first():
+    transfer = ImageTransfer(1, create_image(), 20000, chunk_size=100)
+    for _ in range(2):
+        transfer.next_frame()
+    transfer.resend([0, 999])
+    assert decode_frame(transfer.next_frame())[3] == 0
+    assert decode_frame(transfer.next_frame())[3] == 2
+    assert transfer.resent == 1
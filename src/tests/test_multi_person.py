@@ -0,0 +1,25 @@
+import pytest
+
+from video_processing import multi_person
+from video_processing.multi_person import create_person_detector
+
+
+class FakeHogPeopleDetector:
+    pass
+
+
+def test_landmarker_falls_back_to_hog_if_it_cannot_be_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(multi_person, "HogPeopleDetector", FakeHogPeopleDetector)
+    # Fails on the missing model file, or on the import if mediapipe isn't installed
+    detector = create_person_detector("landmarker", str(tmp_path / "missing.task"))
+    assert isinstance(detector, FakeHogPeopleDetector)
+
+
+def test_landmarker_needs_a_model():
+    with pytest.raises(ValueError):
+        create_person_detector("landmarker")
+
+
+def test_unknown_person_detector():
+    with pytest.raises(ValueError):
+        create_person_detector("yolo")
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from serial_controller.image_transfer import decode_frame
+from serial_controller.preview_stream import (encode_preview, decode_preview, quantize_preview, PreviewStream,
+                                              GRAY_LEVELS, PREVIEW_WIDTH, PREVIEW_HEIGHT, TILE_SIZE)
+
+
+def create_preview(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, GRAY_LEVELS, (PREVIEW_HEIGHT, PREVIEW_WIDTH), dtype=np.uint8)
+
+
+def test_quantized_preview_has_the_preview_size_and_levels():
+    frame = np.full((720, 1280, 3), 255, dtype=np.uint8)
+    preview = quantize_preview(frame)
+    assert preview.shape == (PREVIEW_HEIGHT, PREVIEW_WIDTH)
+    assert preview.max() == GRAY_LEVELS - 1
+
+
+def test_keyframe_round_trip():
+    preview = create_preview()
+    payload, reference = encode_preview(preview, None, keyframe=False)
+    np.testing.assert_array_equal(reference, preview)
+    np.testing.assert_array_equal(decode_preview(payload, None), preview)
+
+
+def test_only_changed_tiles_are_sent():
+    first = create_preview()
+    keyframe, reference = encode_preview(first, None, keyframe=True)
+    second = first.copy()
+    second[:TILE_SIZE, :TILE_SIZE] = (second[:TILE_SIZE, :TILE_SIZE] + 8) % GRAY_LEVELS
+    delta, updated = encode_preview(second, reference, keyframe=False)
+    assert len(delta) < len(keyframe)
+    np.testing.assert_array_equal(updated, second)
+    np.testing.assert_array_equal(decode_preview(delta, decode_preview(keyframe, None)), second)
+
+
+def test_unchanged_preview_is_not_sent():
+    preview = create_preview()
+    payload, reference = encode_preview(preview, preview.copy(), keyframe=False)
+    assert payload is None
+    np.testing.assert_array_equal(reference, preview)
+
+
+def test_delta_without_reference_is_rejected():
+    first, second = create_preview(0), create_preview(1)
+    delta, _ = encode_preview(second, first, keyframe=False)
+    with pytest.raises(ValueError):
+        decode_preview(delta, None)
+
+
+def test_stream_hands_out_one_chunk_per_call_and_keeps_the_cap():
+    frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    stream = PreviewStream(lambda: frame, bytes_per_second=100000, max_fps=5.0)
+    stream.start()
+    frames = []
+    while (message := stream.next_message(now=0.0)) is not None:
+        frames.append(decode_frame(message))
+    total = frames[0][4]
+    assert total > 1
+    assert [seq for _, _, _, seq, _, _ in frames] == list(range(total))
+    np.testing.assert_array_equal(decode_preview(b"".join(frame[5] for frame in frames), None), stream.reference)
+    # The next preview follows after the frame interval
+    assert stream.delay(now=0.0) == pytest.approx(0.2)
+
+
+def test_started_preview_is_completed_after_a_stop():
+    frame = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    stream = PreviewStream(lambda: frame, bytes_per_second=100000)
+    stream.start()
+    first = decode_frame(stream.next_message(now=0.0))
+    stream.stop()
+    remaining = []
+    while (message := stream.next_message(now=0.0)) is not None:
+        remaining.append(message)
+    assert len(remaining) == first[4] - 1
+    assert stream.delay(now=0.0) is None
@@ -0,0 +1,54 @@
+import pytest
+
+from video_processing.state_estimation import ConstantVelocityKalman, TrackState, MAX_EXTRAPOLATION
+
+
+def test_kalman_without_measurements_predicts_nothing():
+    assert ConstantVelocityKalman(1.0, 1.0).predict(0.0) is None
+
+
+def test_kalman_estimates_the_velocity_of_a_linear_movement():
+    kalman = ConstantVelocityKalman(0.01, 0.0001)
+    for step in range(30):
+        kalman.update(0.1 + 0.2 * step / 30, step / 30)
+    # 29/30 s after the start, moving with 0.2 per second
+    assert kalman.predict(29 / 30) == pytest.approx(0.1 + 0.2 * 29 / 30, abs=1e-3)
+    assert kalman.predict(29 / 30 + 0.1) == pytest.approx(0.1 + 0.2 * (29 / 30 + 0.1), abs=2e-3)
+
+
+def test_kalman_extrapolates_at_most_max_extrapolation():
+    kalman = ConstantVelocityKalman(0.01, 0.0001)
+    for step in range(30):
+        kalman.update(step / 30, step / 30)
+    last_time = 29 / 30
+    assert kalman.predict(last_time + 10.0) == pytest.approx(kalman.predict(last_time + MAX_EXTRAPOLATION))
+
+
+def test_kalman_applies_late_measurements_as_current():
+    kalman = ConstantVelocityKalman(0.01, 0.0001)
+    kalman.update(0.5, 1.0)
+    kalman.update(0.5, 0.5)
+    assert kalman.timestamp == 1.0
+    assert kalman.predict(1.0) == pytest.approx(0.5)
+
+
+def test_track_state_predicts_all_signals():
+    state = TrackState()
+    assert state.predict(0.0) is None
+    state.update(0.0, 0.5, 0.4, 1.2)
+    assert state.predict(0.0) == pytest.approx((0.5, 0.4, 1.2))
+
+
+def test_track_state_rejects_old_measurements():
+    state = TrackState()
+    state.update(0.0, 0.5, 0.4, 1.2)
+    assert state.predict(0.9, max_age=1.0) is not None
+    assert state.predict(1.1, max_age=1.0) is None
+
+
+def test_track_state_reset_forgets_the_person():
+    state = TrackState()
+    state.update(0.0, 0.5, 0.4, 1.2)
+    state.reset()
+    assert state.last_measurement_time is None
+    assert state.predict(0.0) is None
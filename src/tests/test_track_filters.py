@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from video_processing.track_filters import (RingBuffer, MovingAverageFilter, ExponentialFilter, OneEuroFilter,
+                                            TrackFilter, create_filter, FILTER_TYPES)
+
+
+def test_ring_buffer_keeps_the_mean_of_the_last_values():
+    buffer = RingBuffer(3, 2)
+    for value in range(1, 6):
+        buffer.push(np.array([value, -value], dtype=float))
+    assert len(buffer) == 3
+    np.testing.assert_allclose(buffer.mean(), [4.0, -4.0])
+
+
+def test_ring_buffer_mean_of_a_partly_filled_buffer():
+    buffer = RingBuffer(4, 1)
+    buffer.push(np.array([2.0]))
+    buffer.push(np.array([4.0]))
+    np.testing.assert_allclose(buffer.mean(), [3.0])
+    buffer.reset()
+    assert len(buffer) == 0
+    buffer.push(np.array([5.0]))
+    np.testing.assert_allclose(buffer.mean(), [5.0])
+
+
+def test_moving_average_filter():
+    moving_average = MovingAverageFilter(1, size=2)
+    np.testing.assert_allclose(moving_average.update(np.array([1.0])), [1.0])
+    np.testing.assert_allclose(moving_average.update(np.array([3.0])), [2.0])
+    np.testing.assert_allclose(moving_average.update(np.array([7.0])), [5.0])
+
+
+def test_exponential_filter():
+    exponential = ExponentialFilter(1, alpha=0.5)
+    np.testing.assert_allclose(exponential.update(np.array([4.0])), [4.0])
+    np.testing.assert_allclose(exponential.update(np.array([8.0])), [6.0])
+    exponential.reset()
+    np.testing.assert_allclose(exponential.update(np.array([2.0])), [2.0])
+
+
+def test_one_euro_filter_follows_fast_movements_more_closely():
+    def lag(beta):
+        one_euro = OneEuroFilter(1, beta=beta)
+        for step in range(30):
+            filtered = one_euro.update(np.array([step * 10.0]), step / 30)
+        return 29 * 10.0 - filtered[0]
+
+    assert 0 < lag(1.0) < lag(0.0)
+
+
+def test_one_euro_filter_holds_a_constant_signal():
+    one_euro = OneEuroFilter(2)
+    for step in range(10):
+        filtered = one_euro.update(np.array([0.5, 2.0]), step / 30)
+    np.testing.assert_allclose(filtered, [0.5, 2.0])
+
+
+@pytest.mark.parametrize("filter_type", FILTER_TYPES)
+def test_track_filter_is_reset(filter_type):
+    track_filter = TrackFilter(filter_type)
+    track_filter.update(0.2, 0.3, 1.0, timestamp=0.0)
+    track_filter.update(0.25, 0.3, 1.1, timestamp=0.033)
+    track_filter.reset()
+    # After a reset, the first measurement is returned unfiltered
+    assert track_filter.update(0.8, 0.6, 0.5, timestamp=1.0) == pytest.approx((0.8, 0.6, 0.5))
+
+
+def test_unknown_filter_type():
+    with pytest.raises(ValueError):
+        create_filter("kalman", 3)
@@ -0,0 +1,231 @@
+import threading
+
+import numpy as np
+
+from .color_quantization import color_distances, color_distance_matrix, MAX_COLOR_DISTANCE
+from .histogram_engine import NUM_BINS, ReferenceHistograms
+
+# Maximum number of appearance templates of the tracked person
+MAX_TEMPLATES = 8
+# Minimum similarity of a check for its appearance to be added as a new template
+ADD_THRESHOLD = 0.7
+# A new appearance at least this similar to an existing template is redundant and not added
+REDUNDANCY_THRESHOLD = 0.92
+
+
+class AppearanceGallery:
+    """
+    Bounded set of appearance templates (color histogram and dominant colors) of the tracked person.
+
+    The gallery starts with the calibrated appearance, which is never evicted. Appearances that
+    were recognized with high confidence but differ from all templates (e.g. other lighting or
+    the person turned around) are added automatically. If the gallery is full, the least
+    recently matched template is evicted. A query is matched against all templates at once.
+    """
+
+    def __init__(self, max_templates=MAX_TEMPLATES, add_threshold=ADD_THRESHOLD,
+                 redundancy_threshold=REDUNDANCY_THRESHOLD, num_colors=3):
+        """
+        Initialize the AppearanceGallery.
+
+        Args:
+            max_templates (int, optional): Maximum number of templates. Default is MAX_TEMPLATES.
+            add_threshold (float, optional): Minimum similarity for a new template. Default is ADD_THRESHOLD.
+            redundancy_threshold (float, optional): Similarity above which a new template is redundant.
+            num_colors (int, optional): Number of dominant colors per template. Default is 3.
+        """
+        self.max_templates = max_templates
+        self.add_threshold = add_threshold
+        self.redundancy_threshold = redundancy_threshold
+
+        self.histograms = np.zeros((0, NUM_BINS), dtype=np.float32)
+        self.colors = np.zeros((0, num_colors, 3), dtype=np.float32)
+        self.last_used = np.zeros(0, dtype=np.int64)
+        self.references = None
+
+        self.lock = threading.Lock()
+        # Incremented whenever the templates are replaced or changed, so stale scores are detected
+        self.generation = 0
+        self.clock = 0
+        self.added = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.histograms)
+
+    def is_empty(self):
+        """
+        Check if the gallery contains no templates, i.e. no person was calibrated.
+
+        Returns:
+            bool: True if the gallery is empty.
+        """
+        return len(self.histograms) == 0
+
+    def reset(self, histogram, colors):
+        """
+        Replace all templates with a newly calibrated appearance.
+
+        Args:
+            histogram (numpy.ndarray): The flat color histogram.
+            colors (numpy.ndarray): The dominant colors.
+        """
+        with self.lock:
+            self.histograms = np.asarray(histogram, dtype=np.float32)[None].copy()
+            self.colors = np.asarray(colors, dtype=np.float32)[None].copy()
+            self.last_used = np.array([self.clock], dtype=np.int64)
+            self.references = ReferenceHistograms(self.histograms)
+            self.generation += 1
+
+    def set_templates(self, histograms, colors):
+        """
+        Replace all templates, e.g. with those of a saved profile. The first one is the calibrated appearance.
+
+        Args:
+            histograms (numpy.ndarray): The histograms of shape (n, NUM_BINS).
+            colors (numpy.ndarray): The dominant colors of shape (n, k, 3).
+        """
+        histograms = np.array(histograms[:self.max_templates], dtype=np.float32)
+        colors = np.array(colors[:self.max_templates], dtype=np.float32)
+        if len(histograms) == 0:
+            self.clear()
+            return
+        with self.lock:
+            self.histograms = histograms
+            self.colors = colors
+            self.last_used = np.full(len(histograms), self.clock, dtype=np.int64)
+            self.references = ReferenceHistograms(self.histograms)
+            self.generation += 1
+
+    def get_templates(self):
+        """
+        Get a copy of all templates.
+
+        Returns:
+            tuple: The histograms of shape (n, NUM_BINS) and the dominant colors of shape (n, k, 3).
+        """
+        with self.lock:
+            return self.histograms.copy(), self.colors.copy()
+
+    def clear(self):
+        """
+        Remove all templates.
+        """
+        with self.lock:
+            self.histograms = self.histograms[:0]
+            self.colors = self.colors[:0]
+            self.last_used = self.last_used[:0]
+            self.references = None
+            self.generation += 1
+
+    @property
+    def calibrated_histogram(self):
+        return self.histograms[0] if len(self.histograms) else None
+
+    @property
+    def calibrated_colors(self):
+        return self.colors[0] if len(self.colors) else None
+
+    def scores(self, histogram, colors):
+        """
+        Compare an appearance with all templates.
+
+        Args:
+            histogram (numpy.ndarray): The flat color histogram.
+            colors (numpy.ndarray): The dominant colors.
+
+        Returns:
+            numpy.ndarray: The similarity with every template, the average of histogram and color similarity.
+        """
+        return self.scores_with_generation(histogram, colors)[0]
+
+    def scores_with_generation(self, histogram, colors):
+        """
+        Compare an appearance with all templates, see scores.
+
+        Returns:
+            tuple: The similarity with every template and the generation of the templates they refer to.
+        """
+        with self.lock:
+            if self.references is None:
+                return np.zeros(0), self.generation
+            histogram_similarities = self.references.correlate(histogram)
+            color_similarities = 1 - color_distances(colors, self.colors) / MAX_COLOR_DISTANCE
+            generation = self.generation
+        return (histogram_similarities + color_similarities) / 2, generation
+
+    def score_candidates(self, histograms, color_sets):
+        """
+        Compare the appearances of several candidates with all templates in one batch.
+
+        Args:
+            histograms (numpy.ndarray): Candidate histograms stacked into a matrix of shape (m, NUM_BINS).
+            color_sets (numpy.ndarray): Candidate dominant colors stacked into an array of shape (m, k, 3).
+
+        Returns:
+            numpy.ndarray or None: The best template similarity of every candidate or None if the gallery is empty.
+        """
+        with self.lock:
+            if self.references is None:
+                return None
+            histogram_similarities = self.references.correlate_many(histograms)
+            color_similarities = 1 - color_distance_matrix(color_sets, self.colors) / MAX_COLOR_DISTANCE
+        return np.max((histogram_similarities + color_similarities) / 2, axis=1)
+
+    def match(self, histogram, colors):
+        """
+        Match an appearance against the gallery and learn it if it is a confident, new appearance.
+
+        Args:
+            histogram (numpy.ndarray): The flat color histogram.
+            colors (numpy.ndarray): The dominant colors.
+
+        Returns:
+            float or None: The similarity of the best matching template or None if the gallery is empty.
+        """
+        scores, generation = self.scores_with_generation(histogram, colors)
+        if len(scores) == 0:
+            return None
+
+        best = int(np.argmax(scores))
+        best_score = float(scores[best])
+        with self.lock:
+            # The templates might have been replaced in the meantime, even by as many other ones
+            if self.generation != generation:
+                return best_score
+            self.clock += 1
+            self.last_used[best] = self.clock
+
+            if best_score >= self.add_threshold and best_score < self.redundancy_threshold:
+                self.add(histogram, colors)
+        return best_score
+
+    def add(self, histogram, colors):
+        """
+        Add a template, evicting the least recently matched one if the gallery is full.
+
+        The lock has to be held by the caller.
+
+        Args:
+            histogram (numpy.ndarray): The flat color histogram.
+            colors (numpy.ndarray): The dominant colors.
+        """
+        histogram = np.asarray(histogram, dtype=np.float32)[None]
+        colors = np.asarray(colors, dtype=np.float32)[None]
+
+        if self.max_templates < 2:
+            return
+        if len(self.histograms) >= self.max_templates:
+            # Never evict the calibrated template at index 0
+            oldest = 1 + int(np.argmin(self.last_used[1:]))
+            self.histograms[oldest] = histogram[0]
+            self.colors[oldest] = colors[0]
+            self.last_used[oldest] = self.clock
+            self.evicted += 1
+        else:
+            self.histograms = np.concatenate([self.histograms, histogram])
+            self.colors = np.concatenate([self.colors, colors])
+            self.last_used = np.append(self.last_used, self.clock)
+        self.references = ReferenceHistograms(self.histograms)
+        self.generation += 1
+        self.added += 1
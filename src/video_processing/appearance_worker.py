@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .person_color_detection import are_torso_colors_calibrated, extract_torso_region, check_torso_similarity
+
+# Maximum number of pending appearance checks, the oldest is dropped if a new one arrives
+QUEUE_SIZE = 2
+
+
+class SimilarityResult:
+    """
+    Result of an appearance check together with the frame it was computed on.
+    """
+
+    def __init__(self, score, frame_id, timestamp):
+        """
+        Initialize the SimilarityResult.
+
+        Args:
+            score (float or None): The similarity score or None if it could not be computed.
+            frame_id (int): Running number of the frame the score was computed on.
+            timestamp (float): Capture time of that frame.
+        """
+        self.score = score
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.computed_at = time.time()
+
+    def age(self, now=None):
+        """
+        Get the age of the score.
+
+        Args:
+            now (float, optional): The current time. Default is time.time().
+
+        Returns:
+            float: Seconds since the frame of the score was captured.
+        """
+        if now is None:
+            now = time.time()
+        return now - self.timestamp
+
+
+class AppearanceWorker:
+    """
+    Run the appearance checks on a background thread.
+
+    The torso region is cropped and copied when a check is submitted, so the worker never
+    touches the pooled frame buffers. Pending checks wait in a small queue that drops the
+    oldest entry when it is full, so a slow check never backs up the video loop. With a
+    pool session, the checks run in its "appearance" lane of a shared WorkerPool instead of
+    an own thread.
+    """
+
+    def __init__(self, publish, queue_size=QUEUE_SIZE, histogram=None, appearance_gallery=None, pool_session=None):
+        """
+        Initialize the AppearanceWorker.
+
+        Args:
+            publish (callable): Called with every SimilarityResult from the worker thread.
+            queue_size (int, optional): Maximum number of pending checks. Default is QUEUE_SIZE.
+            histogram (LatencyHistogram, optional): Records the duration of every check.
+            appearance_gallery (AppearanceGallery, optional): Appearance of the calibrated person.
+                Default is the gallery of person_color_detection.
+            pool_session (PoolSession, optional): Session of a shared WorkerPool the checks run in.
+        """
+        self.publish = publish
+        self.histogram = histogram
+        self.gallery = appearance_gallery
+        self.pool_session = pool_session
+        if pool_session is not None:
+            pool_session.add_lane("appearance", queue_size)
+        self.queue = deque(maxlen=queue_size)
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        self.submitted = 0
+        self.queue_dropped = 0
+        self.completed = 0
+
+    @property
+    def dropped(self):
+        """
+        Number of checks dropped from the full queue.
+        """
+        if self.pool_session is not None:
+            return self.pool_session.lanes["appearance"].dropped
+        return self.queue_dropped
+
+    def start(self):
+        """
+        Start the worker thread, unless the checks run in a worker pool.
+        """
+        if self.pool_session is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the worker thread after the current check.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, frame_id, timestamp, frame_rgb, pose_landmarks):
+        """
+        Submit an appearance check of the person in the frame.
+
+        Args:
+            frame_id (int): Running number of the frame.
+            timestamp (float): Capture time of the frame.
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            pose_landmarks (numpy.ndarray): Landmark array of the person in the frame, see landmarks_to_array.
+        """
+        self.submitted += 1
+        if not are_torso_colors_calibrated(self.gallery):
+            self.publish(SimilarityResult(None, frame_id, timestamp))
+            return
+
+        try:
+            # Copy only the torso, the frame buffer is reused by the decoder
+            torso_region = np.array(extract_torso_region(frame_rgb, pose_landmarks))
+        except ValueError:
+            print(f"Calibration did not work: Torso not fully in frame")
+            self.publish(SimilarityResult(None, frame_id, timestamp))
+            return
+
+        if self.pool_session is not None:
+            self.pool_session.submit("appearance", self.check, frame_id, timestamp, torso_region)
+            return
+
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.queue_dropped += 1
+            self.queue.append((frame_id, timestamp, torso_region))
+            self.condition.notify()
+
+    def run(self):
+        """
+        Process the queued appearance checks until the worker is stopped.
+        """
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                frame_id, timestamp, torso_region = self.queue.popleft()
+            self.check(frame_id, timestamp, torso_region)
+
+    def check(self, frame_id, timestamp, torso_region):
+        """
+        Check the appearance of a torso region and publish the result.
+
+        Args:
+            frame_id (int): Running number of the frame.
+            timestamp (float): Capture time of the frame.
+            torso_region (numpy.ndarray): Copy of the torso region of the frame.
+        """
+        start_time = time.time()
+        try:
+            score = check_torso_similarity(torso_region, appearance_gallery=self.gallery)
+        except (ValueError, cv2.error) as e:
+            print(f"Appearance check failed: {e}")
+            score = None
+        if self.histogram is not None:
+            self.histogram.record(time.time() - start_time)
+        self.completed += 1
+        self.publish(SimilarityResult(score, frame_id, timestamp))
+
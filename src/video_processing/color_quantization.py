@@ -0,0 +1,172 @@
+import itertools
+
+import numpy as np
+
+# Maximum number of pixels used for the clustering
+MAX_SAMPLES = 2048
+# Maximum number of k-means iterations
+MAX_ITERATIONS = 10
+# Iterations stop once no center moves more than this distance (RGB units)
+TOLERANCE = 1.0
+# Seed for the initialization without calibrated centers, so results are reproducible
+RANDOM_SEED = 0
+# Largest possible distance between two RGB colors, used for normalization
+MAX_COLOR_DISTANCE = 441.67
+
+
+def subsample_pixels(image, max_samples=MAX_SAMPLES):
+    """
+    Take a regular grid of pixels from the image.
+
+    Args:
+        image (numpy.ndarray): The input image.
+        max_samples (int, optional): Maximum number of pixels. Default is MAX_SAMPLES.
+
+    Returns:
+        numpy.ndarray: The pixels as float32 array of shape (n, 3).
+    """
+    height, width = image.shape[:2]
+    step = max(1, int(np.ceil(np.sqrt(height * width / max_samples))))
+    return image[::step, ::step].reshape(-1, 3).astype(np.float32)
+
+
+def init_centers(pixels, k, rng):
+    """
+    Choose initial centers with the k-means++ seeding.
+
+    Args:
+        pixels (numpy.ndarray): The pixels of shape (n, 3).
+        k (int): Number of centers.
+        rng (numpy.random.Generator): The random number generator.
+
+    Returns:
+        numpy.ndarray: The initial centers of shape (k, 3).
+    """
+    centers = np.empty((k, 3), dtype=np.float32)
+    centers[0] = pixels[rng.integers(len(pixels))]
+    distances = np.sum((pixels - centers[0]) ** 2, axis=1)
+    for i in range(1, k):
+        total = distances.sum()
+        if total == 0:
+            # Fewer distinct colors than clusters
+            centers[i:] = centers[0]
+            break
+        centers[i] = pixels[rng.choice(len(pixels), p=distances / total)]
+        distances = np.minimum(distances, np.sum((pixels - centers[i]) ** 2, axis=1))
+    return centers
+
+
+def assign_pixels(pixels, centers):
+    """
+    Assign every pixel to its nearest center.
+
+    Args:
+        pixels (numpy.ndarray): The pixels of shape (n, 3).
+        centers (numpy.ndarray): The centers of shape (k, 3).
+
+    Returns:
+        numpy.ndarray: The index of the nearest center for every pixel.
+    """
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, |p|^2 is the same for all centers
+    distances = np.sum(centers ** 2, axis=1) - 2 * pixels @ centers.T
+    return np.argmin(distances, axis=1)
+
+
+def quantize_colors(image, k=3, initial_centers=None, max_samples=MAX_SAMPLES, max_iterations=MAX_ITERATIONS):
+    """
+    Find the dominant colors of an image with a bounded, vectorized k-means.
+
+    Args:
+        image (numpy.ndarray): The input image.
+        k (int, optional): Number of colors. Default is 3.
+        initial_centers (numpy.ndarray, optional): Centers to start from, e.g. the calibrated colors.
+        max_samples (int, optional): Maximum number of pixels used. Default is MAX_SAMPLES.
+        max_iterations (int, optional): Maximum number of iterations. Default is MAX_ITERATIONS.
+
+    Returns:
+        numpy.ndarray: The dominant colors of shape (k, 3), sorted by the number of pixels.
+
+    Raises:
+        ValueError: If the image has fewer pixels than colors are requested.
+    """
+    pixels = subsample_pixels(image, max_samples)
+    if len(pixels) < k:
+        raise ValueError(f"n_samples={len(pixels)} should be >= n_clusters={k}.")
+
+    if initial_centers is not None and len(initial_centers) == k:
+        centers = np.array(initial_centers, dtype=np.float32)
+    else:
+        centers = init_centers(pixels, k, np.random.default_rng(RANDOM_SEED))
+
+    counts = np.zeros(k)
+    for _ in range(max_iterations):
+        labels = assign_pixels(pixels, centers)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, channel], minlength=k) for channel in range(3)],
+                        axis=1)
+
+        # Keep the previous center for clusters without pixels
+        filled = counts > 0
+        new_centers = centers.copy()
+        new_centers[filled] = sums[filled] / counts[filled, None]
+
+        shift = np.max(np.linalg.norm(new_centers - centers, axis=1))
+        centers = new_centers
+        if shift < TOLERANCE:
+            break
+
+    return centers[np.argsort(-counts, kind='stable')]
+
+
+def color_distance(colors1, colors2):
+    """
+    Calculate the mean distance between two color sets, independent of their order.
+
+    Every color of the first set is matched to a different color of the second set, so that
+    the mean distance of the pairs is minimal.
+
+    Args:
+        colors1 (numpy.ndarray): The first colors of shape (k, 3).
+        colors2 (numpy.ndarray): The second colors of shape (k, 3).
+
+    Returns:
+        float: The mean distance of the best matching.
+    """
+    return float(color_distances(colors1, np.asarray(colors2)[None])[0])
+
+
+def color_distances(colors, references):
+    """
+    Calculate the order-independent mean distance between a color set and several reference sets.
+
+    Args:
+        colors (numpy.ndarray): The colors of shape (k, 3).
+        references (numpy.ndarray): Reference color sets stacked into an array of shape (n, k, 3).
+
+    Returns:
+        numpy.ndarray: The mean distance of the best matching for every reference set.
+    """
+    return color_distance_matrix(np.asarray(colors)[None], references)[0]
+
+
+def color_distance_matrix(color_sets, references):
+    """
+    Calculate the order-independent mean distance between several color sets and several reference sets.
+
+    Args:
+        color_sets (numpy.ndarray): Color sets stacked into an array of shape (m, k, 3).
+        references (numpy.ndarray): Reference color sets stacked into an array of shape (n, k, 3).
+
+    Returns:
+        numpy.ndarray: The mean distance of the best matching for every pair, shape (m, n).
+    """
+    color_sets = np.asarray(color_sets, dtype=np.float32)
+    references = np.asarray(references, dtype=np.float32)
+    # Distances between all pairs of colors, shape (m, n, k, k)
+    distances = np.linalg.norm(color_sets[:, None, :, None, :] - references[None, :, None, :, :], axis=4)
+
+    # Brute force over all matchings, fine for the few dominant colors
+    k = color_sets.shape[1]
+    permutations = np.array(list(itertools.permutations(range(k))))
+    costs = distances[:, :, np.arange(k), permutations].mean(axis=3)
+    return costs.min(axis=2)
@@ -0,0 +1,151 @@
+import threading
+import time
+
+# Maximum stick deflection in percent
+MAX_STICK = 100
+# Maximum change of a stick per second in percent, limits jerky movements
+MAX_STICK_RATE = 400.0
+# Seconds after which an unchanged stick state is sent again
+KEEPALIVE_INTERVAL = 1.0
+
+
+def clamp(value, limit):
+    return max(-limit, min(limit, value))
+
+
+class CommandMixer:
+    """
+    Combine the throttle, pitch and yaw outputs of the tracking into one stick state of the drone.
+
+    All axes are applied together, so the drone always gets a consistent state and an axis is set
+    back to zero once its error is within the threshold. The stick values are clamped and
+    slew-limited. Unchanged states are suppressed and only repeated every keep-alive interval.
+    """
+
+    def __init__(self, drone, max_stick=MAX_STICK, max_rate=MAX_STICK_RATE, keepalive_interval=KEEPALIVE_INTERVAL):
+        """
+        Initialize the CommandMixer.
+
+        Args:
+            drone (object): The drone control object.
+            max_stick (int, optional): Maximum stick deflection in percent. Default is MAX_STICK.
+            max_rate (float, optional): Maximum stick change per second in percent. Default is MAX_STICK_RATE.
+            keepalive_interval (float, optional): Seconds after which an unchanged state is sent again.
+        """
+        self.drone = drone
+        self.max_stick = max_stick
+        self.max_rate = max_rate
+        self.keepalive_interval = keepalive_interval
+
+        self.lock = threading.Lock()
+        # Last sent stick state (throttle, pitch, yaw) in percent
+        self.state = (0, 0, 0)
+        self.last_update_time = None
+        self.last_send_time = None
+
+        self.sent = 0
+        self.suppressed = 0
+        # Called with every sent stick state, e.g. to record it
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """
+        Add a function that is called with every sent stick state (throttle, pitch, yaw in percent).
+
+        Args:
+            listener (callable): The function, called while the mixer is locked.
+        """
+        self.listeners.append(listener)
+
+    def slew(self, current, target, max_step):
+        return current + clamp(target - current, max_step)
+
+    def update(self, throttle, pitch, yaw, now=None):
+        """
+        Set the stick state of the drone.
+
+        Args:
+            throttle (int): Upward (positive) or downward speed in percent.
+            pitch (int): Forward (positive) or backward speed in percent.
+            yaw (int): Clockwise (positive) or counter-clockwise rotation speed in percent.
+            now (float, optional): The current time. Default is time.monotonic().
+
+        Returns:
+            bool: True if the state was sent to the drone, False if it was suppressed.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self.lock:
+            if self.last_update_time is None:
+                max_step = self.max_stick
+            else:
+                max_step = max(int(self.max_rate * (now - self.last_update_time)), 1)
+            self.last_update_time = now
+
+            target = [clamp(int(value), self.max_stick) for value in (throttle, pitch, yaw)]
+            state = tuple(self.slew(current, value, max_step) for current, value in zip(self.state, target))
+            return self.apply(state, now)
+
+    def apply(self, state, now):
+        """
+        Send a stick state unless it is unchanged and no keep-alive is due. The lock has to be held by the caller.
+
+        Args:
+            state (tuple): Throttle, pitch and yaw in percent.
+            now (float): The current time.
+
+        Returns:
+            bool: True if the state was sent to the drone, False if it was suppressed.
+        """
+        keepalive_due = self.last_send_time is None or now - self.last_send_time >= self.keepalive_interval
+        if state == self.state and not keepalive_due:
+            self.suppressed += 1
+            return False
+
+        self.send(state)
+        for listener in self.listeners:
+            listener(state)
+        self.state = state
+        self.last_send_time = now
+        self.sent += 1
+        return True
+
+    def send(self, state):
+        """
+        Apply a stick state to the drone.
+
+        Args:
+            state (tuple): Throttle, pitch and yaw in percent.
+        """
+        throttle, pitch, yaw = state
+        self.drone.set_throttle(throttle / 100)
+        self.drone.set_pitch(pitch / 100)
+        self.drone.set_yaw(yaw / 100)
+
+    def release(self, now=None):
+        """
+        Set all sticks back to zero at once, e.g. when the person is lost or the tracking is stopped.
+
+        The slew limit doesn't apply, the drone keeps moving as long as a stick is deflected.
+
+        Args:
+            now (float, optional): The current time. Default is time.monotonic().
+
+        Returns:
+            bool: True if the state was sent to the drone, False if it was suppressed.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            self.last_update_time = now
+            return self.apply((0, 0, 0), now)
+
+    def get_stats(self):
+        """
+        Get the number of sent and suppressed stick states.
+
+        Returns:
+            dict: The counters.
+        """
+        return {"sent": self.sent, "suppressed": self.suppressed}
@@ -1,38 +1,42 @@
-def adjust_drone_height(drone, avg_shoulder_y):
+# Similarity scores older than this many seconds are not trusted for the decision to follow
+MAX_SIMILARITY_AGE = 5.0
+
+
+def calculate_height_command(avg_shoulder_y):
     """
-    Adjust the drone's height based on the average Y-position of the shoulders.
+    Calculate the drone's vertical speed based on the average Y-position of the shoulders.
 
     Args:
-        drone (object): The drone control object.
-        avg_shoulder_y (float): The average Y-coordinate of the shoulders.
+        avg_shoulder_y (float): The average Y-coordinate of the shoulders, normalized to the frame height.
+
+    Returns:
+        int: Upward (positive) or downward speed in percent, 0 if the error is within the threshold.
     """
     # Constants for drone height adjustments
-    target_position_ratio = 1 / 3  # Ratio of the shoulder's target Y-position in the frame
-    frame_height = 720  # 720p video
-    target_y_position = frame_height * target_position_ratio  # Y-coordinate of the target position in the frame
-    threshold_y = 40  # Threshold for Y-coordinate error
+    target_y_position = 1 / 3  # Shoulder's target Y-position relative to the frame height
+    threshold_y = 40 / 720  # Threshold for Y-coordinate error, 40 pixels of the 720p video
 
-    # Proportional constant for height control
-    p_y = 0.15  # Higher value -> faster drone movements
+    # Proportional constant for height control, speed in percent per frame height
+    p_y = 108  # Higher value -> faster drone movements
 
     # Calculate the error between the target Y-position and the Y-position of the shoulders
     height_error = target_y_position - avg_shoulder_y
     height_adjustment = int(p_y * height_error)
     # If height error exceeds THRESHOLD_Y, the drone adjusts its height
     if abs(height_error) > threshold_y:
-        if height_adjustment > 0:
-            drone.up(min(height_adjustment, 100))
-        else:
-            drone.down(min(-height_adjustment, 100))
+        return height_adjustment
+    return 0
 
 
-def adjust_drone_forward_backward(drone, torso_size):
+def calculate_forward_backward_command(torso_size):
     """
-    Adjust the drone's forward/backward position based on the torso size.
+    Calculate the drone's forward/backward speed based on the torso size.
 
     Args:
-        drone (object): The drone control object.
         torso_size (float): The detected size of the torso.
+
+    Returns:
+        int: Forward (positive) or backward speed in percent, 0 if the error is within the threshold.
     """
     # Constants for torso size to estimate distance
     target_torso_size = 0.6  # Target size of the torso, used to estimate the drone's forward/backward position
@@ -46,75 +50,100 @@ def adjust_drone_forward_backward(drone, torso_size):
     torso_adjustment = int(p_torso * torso_error * 100)
     # If torso size error exceeds THRESHOLD_TORSO_SIZE, the drone adjusts its position
     if abs(torso_error) > threshold_torso_size:
-        if torso_adjustment > 0:
-            drone.forward(min(torso_adjustment, 100))
-        else:
-            drone.backward(min(-torso_adjustment, 100))
+        return torso_adjustment
+    return 0
 
 
-def adjust_drone_yaw(drone, avg_shoulder_x, torso_size):
+def calculate_yaw_command(avg_shoulder_x, torso_size):
     """
-    Adjust the drone's yaw based on the average X-position of the shoulders.
+    Calculate the drone's rotation speed based on the average X-position of the shoulders.
 
     Args:
-        drone (object): The drone control object.
-        avg_shoulder_x (float): The average X-coordinate of the shoulders.
+        avg_shoulder_x (float): The average X-coordinate of the shoulders, normalized to the frame width.
         torso_size (float): The detected size of the torso.
+
+    Returns:
+        int: Clockwise (positive) or counter-clockwise rotation speed in percent, 0 if the error is within the threshold.
     """
     # Constants for drone yaw adjustments
-    frame_width = 1280  # 720p video
-    target_x_position = frame_width / 2  # X-coordinate of the target position in the frame
-    threshold_x = 50  # Threshold for X-coordinate error
+    target_x_position = 0.5  # Shoulder's target X-position relative to the frame width
+    threshold_x = 50 / 1280  # Threshold for X-coordinate error, 50 pixels of the 720p video
 
-    # Proportional constant for yaw control
-    p_x = 0.11  # Higher value -> faster drone movements
+    # Proportional constant for yaw control, speed in percent per frame width
+    p_x = 140.8  # Higher value -> faster drone movements
 
     horizontal_error = avg_shoulder_x - target_x_position
     horizontal_adjustment = int(p_x * horizontal_error * (1 + 0.3*torso_size))
     if abs(horizontal_error) > threshold_x:
-        if horizontal_adjustment > 0:
-            drone.clockwise(min(horizontal_adjustment, 100))
-        else:
-            drone.counter_clockwise(min(-horizontal_adjustment, 100))
+        return horizontal_adjustment
+    return 0
 
 
-def adjust_drone(drone, avg_shoulder_x, avg_shoulder_y, torso_size):
+def adjust_drone(mixer, avg_shoulder_x, avg_shoulder_y, torso_size):
     """
-    Adjust the drone's height, forward/backward position, and yaw.
+    Adjust the drone's height, forward/backward position, and yaw with one stick state.
 
     Args:
-        drone (object): The drone control object.
+        mixer (CommandMixer): Combines the axes into the stick state of the drone.
         avg_shoulder_x (float): The average X-coordinate of the shoulders.
         avg_shoulder_y (float): The average Y-coordinate of the shoulders.
         torso_size (float): The detected size of the torso.
+
+    Returns:
+        bool: True if the drone was adjusted, False if the input values were invalid.
     """
     # Check if input values are valid
     if avg_shoulder_x and avg_shoulder_y and torso_size:
-        # Adjust drone height
-        adjust_drone_height(drone, avg_shoulder_y)
+        # Adjust drone height, forward/backward position and yaw at once
+        mixer.update(calculate_height_command(avg_shoulder_y),
+                     calculate_forward_backward_command(torso_size),
+                     calculate_yaw_command(avg_shoulder_x, torso_size))
+        return True
+    return False
+
+
+def should_follow(last_similarity, similarity_age=None):
+    """
+    Decide whether the person in the frame should be followed based on the similarity score.
+
+    Args:
+        last_similarity (float): The similarity score of the detected person.
+        similarity_age (float, optional): Seconds since the frame of the similarity score was captured.
 
-        # Adjust drone forward/backward position
-        adjust_drone_forward_backward(drone, torso_size)
+    Returns:
+        bool: True if the person should be followed.
+    """
+    # Don't decide based on an outdated similarity score
+    if last_similarity is not None and similarity_age is not None and similarity_age > MAX_SIMILARITY_AGE:
+        print(f"Person not recognized because the similarity score is outdated ({similarity_age:.1f} s).")
+        return False
 
-        # Adjust drone yaw
-        adjust_drone_yaw(drone, avg_shoulder_x, torso_size)
+    # Check if drone should follow person in frame
+    if last_similarity is not None and last_similarity > 0.4:
+        return True
+    elif last_similarity is None:
+        return True
+    else:
+        print("Person not recognized because of low similarity score.")
+        return False
 
 
-def track_person(last_similarity, drone, avg_shoulder_x, avg_shoulder_y, torso_size):
+def track_person(last_similarity, mixer, avg_shoulder_x, avg_shoulder_y, torso_size, similarity_age=None):
     """
     Track a person and adjust the drone's position accordingly.
 
     Args:
         last_similarity (float): The similarity score of the detected person.
-        drone (object): The drone control object.
+        mixer (CommandMixer): Combines the axes into the stick state of the drone.
         avg_shoulder_x (float): The average X-coordinate of the shoulders.
         avg_shoulder_y (float): The average Y-coordinate of the shoulders.
         torso_size (float): The detected size of the torso.
+        similarity_age (float, optional): Seconds since the frame of the similarity score was captured.
+
+    Returns:
+        bool: True if commands were sent to the drone, False otherwise.
     """
-    # Check if drone should follow person in frame
-    if last_similarity is not None and last_similarity > 0.4:
-        adjust_drone(drone, avg_shoulder_x, avg_shoulder_y, torso_size)
-    elif last_similarity is None:
-        adjust_drone(drone, avg_shoulder_x, avg_shoulder_y, torso_size)
-    else:
-        print("Person not recognized because of low similarity score.")
+    if should_follow(last_similarity, similarity_age):
+        return adjust_drone(mixer, avg_shoulder_x, avg_shoulder_y, torso_size)
+    mixer.release()
+    return False
@@ -0,0 +1,370 @@
+import os
+import threading
+import time
+from collections import deque
+from fractions import Fraction
+
+import numpy as np
+
+from .pose_estimation import NUM_LANDMARKS
+
+# Seconds of video per segment, a new segment starts at the first keyframe after this time
+SEGMENT_SECONDS = 60.0
+# Container of the segments, Matroska stays readable up to the last written packet if the program dies
+RECORDING_FORMAT = "mkv"
+# Maximum number of packets, poses and commands waiting for the writer thread
+RECORDER_QUEUE_SIZE = 300
+# Time base of the segments of a stream without timestamps, like the raw H.264 stream of the Tello
+RAW_TIME_BASE = Fraction(1, 90000)
+
+# Sidecar index records, each kind is appended to an own file next to the segment and can be
+# memory-mapped with numpy. Times are time.time() seconds, segment_time is the presentation time in the segment.
+FRAME_DTYPE = np.dtype([("time", "<f8"), ("segment_time", "<f8"), ("stream_index", "<i8"), ("size", "<u4"),
+                        ("keyframe", "u1")])
+POSE_DTYPE = np.dtype([("time", "<f8"), ("stream_index", "<i8"), ("landmarks", "<f4", (NUM_LANDMARKS, 4))])
+COMMAND_DTYPE = np.dtype([("time", "<f8"), ("command", "u1"), ("throttle", "i1"), ("pitch", "i1"), ("yaw", "i1")])
+# Kinds of the command records, stick states are in percent
+COMMAND_STICKS = 0
+COMMAND_TAKEOFF = 1
+COMMAND_LAND = 2
+# File extensions of the sidecar index files
+INDEX_FILES = {"frames": FRAME_DTYPE, "poses": POSE_DTYPE, "commands": COMMAND_DTYPE}
+
+
+def segment_name(number):
+    return f"segment_{number:04d}"
+
+
+class FlightRecorder:
+    """
+    Record the raw H.264 packets of the drone's video stream without decoding or encoding them.
+
+    The packets are copied when they are demuxed and remuxed by a writer thread into segment files
+    that start at a keyframe, so every segment can be played on its own. Next to every segment, the
+    arrival time of its frames, the estimated poses and the issued commands are written as
+    fixed-size binary records, see FRAME_DTYPE, POSE_DTYPE and COMMAND_DTYPE.
+    """
+
+    def __init__(self, directory, segment_seconds=SEGMENT_SECONDS, container_format=RECORDING_FORMAT,
+                 queue_size=RECORDER_QUEUE_SIZE):
+        """
+        Initialize the FlightRecorder.
+
+        Args:
+            directory (str): Directory of the recording, created if needed.
+            segment_seconds (float, optional): Seconds of video per segment. Default is SEGMENT_SECONDS.
+            container_format (str, optional): "mkv" or "mp4". MP4 files are only readable once they are
+                closed. Default is RECORDING_FORMAT.
+            queue_size (int, optional): Maximum number of waiting records. Default is RECORDER_QUEUE_SIZE.
+        """
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.container_format = container_format
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        self.input_stream = None
+        self.output = None
+        self.output_stream = None
+        self.index_files = {}
+        self.segment_number = -1
+        self.segment_start_time = None
+        self.segment_first_dts = None
+        self.last_dts = None
+        # The video can only start at a keyframe, also after a packet was dropped or couldn't be written
+        self.wait_for_keyframe = True
+        self.packet_dropped = False
+
+        self.recorded_packets = 0
+        self.dropped = 0
+        self.segments = 0
+
+    def start(self, stream):
+        """
+        Start the writer thread.
+
+        Args:
+            stream (av.video.stream.VideoStream): The demuxed video stream, the template of the recorded stream.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self.input_stream = stream
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Write the waiting records, close the segment and stop the writer thread.
+        """
+        with self.condition:
+            if not self.running:
+                return
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join()
+
+    def enqueue(self, record, keyframe=False):
+        with self.condition:
+            if not self.running:
+                return
+            if record[0] == "packet":
+                if len(self.queue) >= self.queue_size or (self.packet_dropped and not keyframe):
+                    # The frames after a dropped packet can't be decoded until the next keyframe
+                    self.packet_dropped = True
+                    self.dropped += 1
+                    return
+                self.packet_dropped = False
+            elif len(self.queue) >= self.queue_size:
+                self.dropped += 1
+                return
+            self.queue.append(record)
+            self.condition.notify()
+
+    def record_packet(self, packet, arrival_time=None):
+        """
+        Record a demuxed packet, called by the demuxer.
+
+        Args:
+            packet (av.packet.Packet): The packet, its opaque attribute is the stream index.
+            arrival_time (float, optional): Time the packet was demuxed. Default is time.time().
+        """
+        if arrival_time is None:
+            arrival_time = time.time()
+        # Copy the data, the packet itself is decoded meanwhile
+        self.enqueue(("packet", arrival_time, bytes(packet), packet.pts, packet.dts, packet.time_base,
+                      packet.is_keyframe, packet.opaque), packet.is_keyframe)
+
+    def record_pose(self, capture_time, stream_index, landmarks):
+        """
+        Record the landmarks of the tracked person.
+
+        Args:
+            capture_time (float): Capture time of the frame.
+            stream_index (int): Number of the frame in the stream, see FramePacket.
+            landmarks (numpy.ndarray): Landmark array, see landmarks_to_array.
+        """
+        self.enqueue(("poses", (capture_time, stream_index, landmarks)))
+
+    def record_sticks(self, state):
+        """
+        Record a stick state sent to the drone, e.g. as listener of the CommandMixer.
+
+        Args:
+            state (tuple): Throttle, pitch and yaw in percent.
+        """
+        throttle, pitch, yaw = state
+        self.enqueue(("commands", (time.time(), COMMAND_STICKS, throttle, pitch, yaw)))
+
+    def record_command(self, command):
+        """
+        Record a discrete command, e.g. as listener of the DroneController.
+
+        Args:
+            command (str): "takeoff" or "land", other commands are ignored.
+        """
+        kinds = {"takeoff": COMMAND_TAKEOFF, "land": COMMAND_LAND}
+        if command in kinds:
+            self.enqueue(("commands", (time.time(), kinds[command], 0, 0, 0)))
+
+    def run(self):
+        """
+        Writer thread: remux the packets and write the index records until the recorder is stopped.
+        """
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.queue:
+                    break
+                records = list(self.queue)
+                self.queue.clear()
+
+            for record in records:
+                try:
+                    if record[0] == "packet":
+                        self.write_packet(*record[1:])
+                    elif self.index_files:
+                        # Poses and commands before the first keyframe have no segment
+                        self.index_files[record[0]].write(np.array([record[1]], dtype=INDEX_FILES[record[0]]))
+                except Exception as e:
+                    print(f"Recording failed: {e}")
+                    self.wait_for_keyframe = True
+
+        self.close_segment()
+
+    def write_packet(self, arrival_time, data, pts, dts, time_base, keyframe, stream_index):
+        """
+        Remux one packet into the current segment, starting a new segment at a keyframe if it's due.
+        """
+        import av
+
+        if self.wait_for_keyframe and not keyframe:
+            return
+        if keyframe and (self.output is None or arrival_time - self.segment_start_time >= self.segment_seconds):
+            self.open_segment(arrival_time, dts if dts is not None else pts)
+        self.wait_for_keyframe = False
+
+        packet = av.Packet(data)
+        packet.is_keyframe = keyframe
+        if dts is None or pts is None:
+            # Raw stream without timestamps, the arrival time is the presentation time
+            packet.time_base = RAW_TIME_BASE
+            dts = max(int((arrival_time - self.segment_start_time) / RAW_TIME_BASE), self.last_dts + 1)
+            packet.pts = packet.dts = dts
+            segment_time = float(dts * RAW_TIME_BASE)
+        else:
+            packet.time_base = time_base
+            packet.pts = pts - self.segment_first_dts
+            packet.dts = max(dts - self.segment_first_dts, self.last_dts + 1)
+            dts = packet.dts
+            segment_time = float(packet.pts * time_base)
+        self.last_dts = dts
+        packet.stream = self.output_stream
+        self.output.mux(packet)
+        self.recorded_packets += 1
+
+        self.index_files["frames"].write(np.array([(arrival_time, segment_time, stream_index, len(data), keyframe)],
+                                                  dtype=FRAME_DTYPE))
+
+    def open_segment(self, start_time, first_dts):
+        """
+        Close the current segment and open the next one.
+
+        Args:
+            start_time (float): Arrival time of the first packet of the segment.
+            first_dts (int or None): Decoding time stamp of the first packet, None for a raw stream.
+        """
+        import av
+
+        self.close_segment()
+        self.segment_number += 1
+        path = os.path.join(self.directory, segment_name(self.segment_number))
+        self.output = av.open(f"{path}.{self.container_format}", "w")
+        self.output_stream = self.output.add_stream_from_template(self.input_stream)
+        if first_dts is None:
+            self.output_stream.time_base = RAW_TIME_BASE
+        self.index_files = {kind: open(f"{path}.{kind}", "wb") for kind in INDEX_FILES}
+        self.segment_start_time = start_time
+        self.segment_first_dts = first_dts
+        self.last_dts = -1
+        self.segments += 1
+
+    def close_segment(self):
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+        for index_file in self.index_files.values():
+            index_file.close()
+        self.index_files = {}
+
+    def get_stats(self):
+        """
+        Get the number of recorded packets and segments and the records dropped from the full queue.
+
+        Returns:
+            dict: The recorder statistics.
+        """
+        return {"recorded_packets": self.recorded_packets, "segments": self.segments, "dropped": self.dropped}
+
+
+class FlightRecording:
+    """
+    Read a recording of the FlightRecorder.
+
+    The index files are memory-mapped, so looking up the frames, poses and commands around a time
+    doesn't read the whole recording.
+    """
+
+    def __init__(self, directory):
+        """
+        Initialize the FlightRecording.
+
+        Args:
+            directory (str): Directory of the recording.
+        """
+        self.directory = directory
+        self.segments = sorted(name.rsplit(".", 1)[0] for name in os.listdir(directory)
+                               if name.startswith("segment_") and name.endswith(".frames"))
+        self.index = [{kind: self.load_index(segment, kind) for kind in INDEX_FILES} for segment in self.segments]
+
+    def load_index(self, segment, kind):
+        """
+        Memory-map an index file, without a record that was cut off at the end.
+
+        Returns:
+            numpy.ndarray: The records, see INDEX_FILES.
+        """
+        dtype = INDEX_FILES[kind]
+        path = os.path.join(self.directory, f"{segment}.{kind}")
+        count = os.path.getsize(path) // dtype.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def segment_path(self, segment_number):
+        segment = self.segments[segment_number]
+        for name in os.listdir(self.directory):
+            if name.startswith(segment + ".") and name.rsplit(".", 1)[1] not in INDEX_FILES:
+                return os.path.join(self.directory, name)
+        return None
+
+    def find_frame(self, timestamp):
+        """
+        Find the last frame that arrived at or before a time.
+
+        Args:
+            timestamp (float): The time (time.time()).
+
+        Returns:
+            tuple or None: Segment number and frame record, None if the time is before the recording.
+        """
+        for segment_number in range(len(self.segments) - 1, -1, -1):
+            frames = self.index[segment_number]["frames"]
+            position = np.searchsorted(frames["time"], timestamp, side="right")
+            if position > 0:
+                return segment_number, frames[position - 1]
+        return None
+
+    def records_between(self, kind, start_time, end_time):
+        """
+        Get the poses or commands of a time range.
+
+        Args:
+            kind (str): "poses" or "commands".
+            start_time (float): Start of the range (time.time()).
+            end_time (float): End of the range, exclusive.
+
+        Returns:
+            numpy.ndarray: The records, in time order.
+        """
+        parts = []
+        for index in self.index:
+            records = index[kind]
+            start, end = np.searchsorted(records["time"], (start_time, end_time))
+            parts.append(records[start:end])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=INDEX_FILES[kind])
+
+    def open_at(self, timestamp):
+        """
+        Open the segment with the frame of a time, positioned at the keyframe before it.
+
+        Args:
+            timestamp (float): The time (time.time()).
+
+        Returns:
+            tuple or None: The opened av.container.InputContainer and the segment time of the frame
+                to decode up to, None if the time is before the recording.
+        """
+        import av
+
+        found = self.find_frame(timestamp)
+        if found is None:
+            return None
+        segment_number, frame = found
+        container = av.open(self.segment_path(segment_number))
+        stream = container.streams.video[0]
+        container.seek(int(frame["segment_time"] / stream.time_base), stream=stream, backward=True)
+        return container, float(frame["segment_time"])
@@ -0,0 +1,172 @@
+import sys
+
+import cv2
+import numpy as np
+
+# Number of RGB buffers preallocated in the pool. It should be larger than the number of frames held
+# at once by the pipeline stages (decode, inference slot + worker, render slot + display, current
+# frame), otherwise further buffers are allocated while all are held.
+POOL_SIZE = 8
+# References to a pooled buffer that is not held by anyone: the pool's list and getrefcount's argument
+FREE_REFERENCES = 2
+
+
+class FrameBufferPool:
+    """
+    Preallocated image buffers that are reused for the decoded frames.
+
+    A buffer is only handed out again once nothing references it anymore, neither the buffer
+    itself nor a view or slice of it, e.g. the frame of a pending inference or appearance check.
+    If all buffers are held, another one is allocated and added to the pool.
+    """
+
+    def __init__(self, size=POOL_SIZE, dtype=np.uint8):
+        """
+        Initialize the FrameBufferPool.
+
+        Args:
+            size (int, optional): Number of preallocated buffers. Default is POOL_SIZE.
+            dtype (numpy.dtype, optional): Data type of the buffers. Default is numpy.uint8.
+        """
+        self.size = size
+        self.dtype = dtype
+        self.shape = None
+        self.buffers = []
+        # Index the search for a free buffer starts at, so the buffers are used in turn
+        self.index = 0
+
+        # Number of buffers allocated since the pool was created
+        self.allocations = 0
+
+    def is_free(self, index):
+        """
+        Check whether a buffer is referenced outside the pool.
+
+        Views of a numpy array reference it through their base, so a held view keeps its buffer in use.
+
+        Args:
+            index (int): Index of the buffer.
+
+        Returns:
+            bool: True if the buffer can be overwritten.
+        """
+        return sys.getrefcount(self.buffers[index]) <= FREE_REFERENCES
+
+    def acquire(self, shape):
+        """
+        Get a buffer nobody holds, (re)allocating the pool if the frame shape changed.
+
+        Args:
+            shape (tuple): Shape of the requested buffer.
+
+        Returns:
+            numpy.ndarray: A writable buffer of the requested shape.
+        """
+        if shape != self.shape:
+            self.shape = shape
+            # Buffers of the old shape that are still held stay valid for their holders
+            self.buffers = [np.empty(shape, dtype=self.dtype) for _ in range(self.size)]
+            self.allocations += self.size
+            self.index = 0
+
+        count = len(self.buffers)
+        for offset in range(count):
+            index = (self.index + offset) % count
+            if self.is_free(index):
+                self.index = (index + 1) % count
+                return self.buffers[index]
+
+        # All buffers are held, e.g. by a slow inference
+        self.buffers.append(np.empty(shape, dtype=self.dtype))
+        self.allocations += 1
+        self.index = 0
+        return self.buffers[-1]
+
+
+class FrameConverter:
+    """
+    Convert decoded PyAV frames into RGB images without per-frame allocations.
+
+    RGB is the canonical pixel format of the pipeline, since pose estimation and the color
+    detection work on RGB. Consumers that need BGR (OpenCV display and encoding) get a
+    read-only view with the channel axis reversed via bgr_view.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE):
+        """
+        Initialize the FrameConverter.
+
+        Args:
+            pool_size (int, optional): Number of RGB buffers in the pool. Default is POOL_SIZE.
+        """
+        self.rgb_pool = FrameBufferPool(pool_size)
+        # Scratch buffer for the packed I420 planes, only used during a conversion
+        self.yuv_pool = FrameBufferPool(1)
+        self.fallback_conversions = 0
+
+    @property
+    def allocations(self):
+        """
+        Number of frame buffers allocated by the converter.
+        """
+        return self.rgb_pool.allocations + self.yuv_pool.allocations
+
+    def convert(self, frame):
+        """
+        Convert a frame to a read-only RGB image backed by a pooled buffer.
+
+        Args:
+            frame (av.video.frame.VideoFrame): The decoded frame.
+
+        Returns:
+            numpy.ndarray: The read-only RGB image.
+        """
+        height, width = frame.height, frame.width
+        rgb = self.rgb_pool.acquire((height, width, 3))
+
+        if frame.format.name == 'yuv420p' and width % 2 == 0 and height % 2 == 0:
+            # Pack the planes into one I420 image and convert it straight into the pooled buffer
+            yuv = self.yuv_pool.acquire((height * 3 // 2, width))
+            self.copy_plane(frame.planes[0], yuv[:height])
+            chroma = yuv[height:].reshape(2, height // 2, width // 2)
+            self.copy_plane(frame.planes[1], chroma[0])
+            self.copy_plane(frame.planes[2], chroma[1])
+            cv2.cvtColor(yuv, cv2.COLOR_YUV2RGB_I420, dst=rgb)
+        else:
+            # Other pixel formats are converted by FFmpeg, which allocates a temporary image
+            np.copyto(rgb, frame.to_ndarray(format='rgb24'))
+            self.fallback_conversions += 1
+
+        view = rgb.view()
+        view.flags.writeable = False
+        return view
+
+    @staticmethod
+    def copy_plane(plane, destination):
+        """
+        Copy a frame plane into a destination array, skipping the line padding.
+
+        Args:
+            plane (av.video.plane.VideoPlane): The source plane.
+            destination (numpy.ndarray): 2D destination array of the visible plane size.
+        """
+        height, width = destination.shape
+        source = np.frombuffer(plane, dtype=np.uint8).reshape(-1, plane.line_size)
+        np.copyto(destination, source[:height, :width])
+
+
+def bgr_view(frame_rgb):
+    """
+    Get a read-only BGR view of an RGB image without copying it.
+
+    Args:
+        frame_rgb (numpy.ndarray): The RGB image.
+
+    Returns:
+        numpy.ndarray or None: The BGR view or None if no image is given.
+    """
+    if frame_rgb is None:
+        return None
+    view = frame_rgb[..., ::-1]
+    view.flags.writeable = False
+    return view
@@ -0,0 +1,182 @@
+import threading
+import time
+from collections import deque
+
+from .frame_conversion import bgr_view
+
+# Number of glass-to-command latency samples kept for the running average
+LATENCY_WINDOW_SIZE = 30
+
+
+class FramePacket:
+    """
+    A decoded frame travelling from the decode stage to the inference and render stages.
+    """
+
+    def __init__(self, frame_id, capture_time, frame_rgb, stream_index=None):
+        """
+        Initialize the FramePacket.
+
+        Args:
+            frame_id (int): Running number of the decoded frame.
+            capture_time (float): Time (time.time()) at which the frame left the decoder.
+            frame_rgb (numpy.ndarray): The read-only RGB frame image.
+            stream_index (int, optional): Number of the frame in the stream in decoding order, starting at 0.
+                Unlike frame_id, it counts the frames skipped by the decoder.
+        """
+        self.frame_id = frame_id
+        self.capture_time = capture_time
+        self.frame_rgb = frame_rgb
+        self.stream_index = stream_index
+
+    @property
+    def image(self):
+        """
+        Read-only BGR view of the frame.
+        """
+        return bgr_view(self.frame_rgb)
+
+
+class LatestFrameSlot:
+    """
+    Bounded single-item handoff between two pipeline stages.
+
+    The producer never blocks: putting a new item replaces an item that has not been
+    taken yet, and the replaced item is counted as dropped. The consumer therefore always
+    works on the freshest frame.
+    """
+
+    def __init__(self, name):
+        """
+        Initialize the LatestFrameSlot.
+
+        Args:
+            name (str): Name of the slot, used for reporting.
+        """
+        self.name = name
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+
+        self.published = 0
+        self.dropped = 0
+
+    def put(self, item):
+        """
+        Publish an item, replacing (and dropping) a stale one.
+
+        Args:
+            item (object): The item to publish.
+        """
+        with self._condition:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self.published += 1
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Take the latest item, waiting for one if the slot is empty.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Default is to wait forever.
+
+        Returns:
+            object or None: The latest item or None if the timeout expired or the slot was closed.
+        """
+        with self._condition:
+            if self._item is None and not self._closed:
+                self._condition.wait(timeout)
+            item = self._item
+            self._item = None
+            self._condition.notify_all()
+            return item
+
+    def wait_empty(self, timeout=None):
+        """
+        Wait until the consumer took the current item, so that no item is dropped.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Default is to wait forever.
+
+        Returns:
+            bool: True if the slot is empty or closed, False if the timeout expired.
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._item is None or self._closed, timeout)
+
+    def close(self):
+        """
+        Close the slot and wake up a waiting consumer.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class LatencyTracker:
+    """
+    Keep the glass-to-command latency of the most recent drone commands.
+    """
+
+    def __init__(self, window_size=LATENCY_WINDOW_SIZE, histogram=None):
+        """
+        Initialize the LatencyTracker.
+
+        Args:
+            window_size (int, optional): Number of samples used for the average. Default is LATENCY_WINDOW_SIZE.
+            histogram (LatencyHistogram, optional): Also records every latency for the quantiles.
+        """
+        self._samples = deque(maxlen=window_size)
+        self.histogram = histogram
+        self._lock = threading.Lock()
+        self.count = 0
+        self.last = None
+
+    def record(self, capture_time, command_time=None):
+        """
+        Record the latency between a frame leaving the decoder and the resulting drone command.
+
+        Args:
+            capture_time (float): Time at which the frame left the decoder.
+            command_time (float, optional): Time at which the command was sent. Default is now.
+        """
+        if command_time is None:
+            command_time = time.time()
+        latency = command_time - capture_time
+        with self._lock:
+            self._samples.append(latency)
+            self.count += 1
+            self.last = latency
+        if self.histogram is not None:
+            self.histogram.record(latency)
+
+    def average(self):
+        """
+        Get the average latency of the recent commands.
+
+        Returns:
+            float or None: The average latency in seconds or None if no command was sent yet.
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            return sum(self._samples) / len(self._samples)
+
+    def maximum(self):
+        """
+        Get the maximum latency of the recent commands.
+
+        Returns:
+            float or None: The maximum latency in seconds or None if no command was sent yet.
+        """
+        with self._lock:
+            if not self._samples:
+                return None
+            return max(self._samples)
+
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Number of histogram bins per color channel
+BINS_PER_CHANNEL = 8
+NUM_BINS = BINS_PER_CHANNEL ** 3
+# Maximum number of pixels used for a histogram
+MAX_SAMPLES = 4096
+
+# Lookup tables from a channel value to its share of the flat bin index, in the same bin order
+# as cv2.calcHist with channels [0, 1, 2] and ranges [0, 256]
+_CHANNEL_BINS = np.arange(256) * BINS_PER_CHANNEL // 256
+BIN_LUTS = (
+    (_CHANNEL_BINS * BINS_PER_CHANNEL * BINS_PER_CHANNEL).astype(np.uint16),
+    (_CHANNEL_BINS * BINS_PER_CHANNEL).astype(np.uint16),
+    _CHANNEL_BINS.astype(np.uint16),
+)
+
+
+def subsample_step(height, width, max_samples=MAX_SAMPLES):
+    """
+    Get the stride in both directions, so at most max_samples pixels are used.
+
+    Args:
+        height (int): Height of the image.
+        width (int): Width of the image.
+        max_samples (int, optional): Maximum number of pixels. Default is MAX_SAMPLES.
+
+    Returns:
+        int: The stride.
+    """
+    return max(1, int(np.ceil(np.sqrt(height * width / max_samples))))
+
+
+def calculate_histogram(image, max_samples=MAX_SAMPLES):
+    """
+    Compute an L2-normalized 3D color histogram from a strided subsample of the pixels.
+
+    Args:
+        image (numpy.ndarray): The input image with three uint8 channels.
+        max_samples (int, optional): Maximum number of pixels used. Default is MAX_SAMPLES.
+
+    Returns:
+        numpy.ndarray: The flat histogram of NUM_BINS float32 values.
+    """
+    step = subsample_step(image.shape[0], image.shape[1], max_samples)
+    pixels = image[::step, ::step]
+
+    bins = BIN_LUTS[0][pixels[..., 0]] + BIN_LUTS[1][pixels[..., 1]] + BIN_LUTS[2][pixels[..., 2]]
+    hist = np.bincount(bins.ravel(), minlength=NUM_BINS).astype(np.float32)
+
+    norm = np.linalg.norm(hist)
+    if norm > 0:
+        hist /= norm
+    return hist
+
+
+def center_histograms(histograms):
+    """
+    Subtract the mean of every histogram and calculate the norms of the results.
+
+    Args:
+        histograms (numpy.ndarray): Histograms stacked into a matrix of shape (n, NUM_BINS).
+
+    Returns:
+        tuple: The centered histograms and their L2 norms.
+    """
+    centered = histograms - histograms.mean(axis=1, keepdims=True)
+    return centered, np.sqrt(np.einsum('ij,ij->i', centered, centered))
+
+
+def correlate_centered(query, centered_references, reference_norms):
+    """
+    Correlate a histogram with already centered reference histograms.
+
+    Args:
+        query (numpy.ndarray): The flat query histogram.
+        centered_references (numpy.ndarray): Centered reference histograms of shape (n, NUM_BINS).
+        reference_norms (numpy.ndarray): L2 norms of the centered references.
+
+    Returns:
+        numpy.ndarray: The correlation with every reference, values from -1 to 1.
+    """
+    query = query - query.mean()
+    numerator = centered_references @ query
+    denominator = reference_norms * np.sqrt(np.dot(query, query))
+    # Like OpenCV, two constant histograms count as fully correlated
+    return np.divide(numerator, denominator, out=np.ones(len(centered_references), dtype=numerator.dtype),
+                     where=denominator > 1e-12)
+
+
+def correlate_histograms(query, references):
+    """
+    Compare a histogram with several reference histograms in one vectorized operation.
+
+    The score is the correlation as computed by cv2.compareHist with cv2.HISTCMP_CORREL.
+
+    Args:
+        query (numpy.ndarray): The flat query histogram.
+        references (numpy.ndarray): Reference histograms stacked into a matrix of shape (n, NUM_BINS).
+
+    Returns:
+        numpy.ndarray: The correlation with every reference, values from -1 to 1.
+    """
+    centered_references, reference_norms = center_histograms(np.atleast_2d(references))
+    return correlate_centered(query, centered_references, reference_norms)
+
+
+class ReferenceHistograms:
+    """
+    Stacked reference histograms, centered once so every comparison is a single matrix product.
+    """
+
+    def __init__(self, histograms):
+        """
+        Initialize the ReferenceHistograms.
+
+        Args:
+            histograms (numpy.ndarray): Histograms stacked into a matrix of shape (n, NUM_BINS).
+        """
+        self.histograms = np.atleast_2d(np.asarray(histograms, dtype=np.float32))
+        self.centered, self.norms = center_histograms(self.histograms)
+
+    def __len__(self):
+        return len(self.histograms)
+
+    def correlate(self, query):
+        """
+        Compare a histogram with all references.
+
+        Args:
+            query (numpy.ndarray): The flat query histogram.
+
+        Returns:
+            numpy.ndarray: The correlation with every reference, values from -1 to 1.
+        """
+        return correlate_centered(query, self.centered, self.norms)
+
+    def correlate_many(self, queries):
+        """
+        Compare several histograms with all references.
+
+        Args:
+            queries (numpy.ndarray): Query histograms stacked into a matrix of shape (m, NUM_BINS).
+
+        Returns:
+            numpy.ndarray: The correlations of shape (m, n), values from -1 to 1.
+        """
+        centered_queries, query_norms = center_histograms(np.atleast_2d(queries))
+        numerator = centered_queries @ self.centered.T
+        denominator = query_norms[:, None] * self.norms[None, :]
+        return np.divide(numerator, denominator, out=np.ones_like(numerator), where=denominator > 1e-12)
@@ -0,0 +1,256 @@
+import json
+import threading
+from collections import deque
+
+import numpy as np
+
+# Frame intervals between two pose estimations
+MIN_POSE_INTERVAL = 3
+MAX_POSE_INTERVAL = 15
+
+# Frame intervals between two appearance (color similarity) checks
+MIN_APPEARANCE_INTERVAL = 15
+MAX_APPEARANCE_INTERVAL = 60
+
+# Mean absolute difference of the downsampled frames (0 to 1) that counts as scene motion
+MOTION_THRESHOLD = 0.02
+# Shoulder velocity in frame sizes per second that counts as a moving person
+VELOCITY_THRESHOLD = 0.15
+# Torso size change per second that counts as a person moving towards or away from the drone
+TORSO_VELOCITY_THRESHOLD = 0.1
+
+# Time budget for one pose estimation in seconds
+LATENCY_BUDGET = 0.05
+# Weight of a new measurement in the exponential moving average of the pose latency
+LATENCY_SMOOTHING = 0.2
+
+# Only every n-th pixel in both directions is used for the frame differencing
+MOTION_DOWNSAMPLING = 16
+
+# Number of decisions kept for replay analysis
+DECISION_LOG_SIZE = 10000
+
+
+class InferenceScheduler:
+    """
+    Decide per frame whether pose estimation and the appearance check should run.
+
+    Instead of a fixed cadence, inference runs more often while the scene or the tracked
+    person moves and less often while everything is still. The decision is based on cheap
+    signals: the difference of heavily downsampled frames, the velocity of the shoulders and
+    torso size between the last pose estimations and the measured pose latency.
+    """
+
+    def __init__(self, min_pose_interval=MIN_POSE_INTERVAL, max_pose_interval=MAX_POSE_INTERVAL,
+                 min_appearance_interval=MIN_APPEARANCE_INTERVAL, max_appearance_interval=MAX_APPEARANCE_INTERVAL,
+                 motion_threshold=MOTION_THRESHOLD, velocity_threshold=VELOCITY_THRESHOLD,
+                 latency_budget=LATENCY_BUDGET, log_size=DECISION_LOG_SIZE):
+        """
+        Initialize the InferenceScheduler.
+
+        Args:
+            min_pose_interval (int, optional): Minimum number of frames between two pose estimations.
+            max_pose_interval (int, optional): Maximum number of frames between two pose estimations.
+            min_appearance_interval (int, optional): Minimum number of frames between two appearance checks.
+            max_appearance_interval (int, optional): Maximum number of frames between two appearance checks.
+            motion_threshold (float, optional): Frame difference that triggers an inference.
+            velocity_threshold (float, optional): Shoulder velocity that triggers an inference.
+            latency_budget (float, optional): Time budget for one pose estimation in seconds.
+            log_size (int, optional): Number of decisions kept in the decision log.
+        """
+        self.min_pose_interval = min_pose_interval
+        self.max_pose_interval = max_pose_interval
+        self.min_appearance_interval = min_appearance_interval
+        self.max_appearance_interval = max_appearance_interval
+        self.motion_threshold = motion_threshold
+        self.velocity_threshold = velocity_threshold
+        self.latency_budget = latency_budget
+
+        self.previous_thumbnail = None
+        self.motion = 0.0
+
+        self.last_measurement = None
+        self.velocity = 0.0
+        self.torso_velocity = 0.0
+        self.person_detected = False
+
+        self.pose_latency = None
+        self.last_pose_frame_id = None
+        self.last_appearance_frame_id = None
+
+        self.decision_log = deque(maxlen=log_size)
+        self._log_lock = threading.Lock()
+
+    def measure_motion(self, frame_rgb):
+        """
+        Measure the scene motion as the mean absolute difference to the previous frame.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+
+        Returns:
+            float: The motion between 0 (still) and 1.
+        """
+        # Strided view of the green channel, only the small thumbnail is copied
+        thumbnail = frame_rgb[::MOTION_DOWNSAMPLING, ::MOTION_DOWNSAMPLING, 1].astype(np.int16)
+        if self.previous_thumbnail is None or self.previous_thumbnail.shape != thumbnail.shape:
+            self.motion = 0.0
+        else:
+            self.motion = float(np.mean(np.abs(thumbnail - self.previous_thumbnail))) / 255
+        self.previous_thumbnail = thumbnail
+        return self.motion
+
+    def update_pose(self, timestamp, avg_shoulder_x=None, avg_shoulder_y=None, torso_size=None,
+                    inference_time=None):
+        """
+        Update the scheduler with the result of a pose estimation.
+
+        Args:
+            timestamp (float): Capture time of the frame the pose was estimated on.
+            avg_shoulder_x (float, optional): The average X-coordinate of the shoulders, None if no person was found.
+            avg_shoulder_y (float, optional): The average Y-coordinate of the shoulders.
+            torso_size (float, optional): The detected size of the torso.
+            inference_time (float, optional): Duration of the pose estimation in seconds.
+        """
+        if inference_time is not None:
+            if self.pose_latency is None:
+                self.pose_latency = inference_time
+            else:
+                self.pose_latency += LATENCY_SMOOTHING * (inference_time - self.pose_latency)
+
+        if avg_shoulder_x is None:
+            self.person_detected = False
+            self.last_measurement = None
+            self.velocity = 0.0
+            self.torso_velocity = 0.0
+            return
+
+        self.person_detected = True
+        measurement = (timestamp, avg_shoulder_x, avg_shoulder_y, torso_size)
+        if self.last_measurement is not None:
+            last_timestamp, last_x, last_y, last_torso_size = self.last_measurement
+            time_delta = timestamp - last_timestamp
+            if time_delta > 0:
+                self.velocity = float(np.hypot(measurement[1] - last_x, measurement[2] - last_y)) / time_delta
+                self.torso_velocity = abs(torso_size - last_torso_size) / time_delta
+        self.last_measurement = measurement
+
+    def pose_interval_limits(self):
+        """
+        Get the pose intervals adapted to the latency budget.
+
+        If a pose estimation takes longer than the budget, the minimum interval is stretched
+        by the same factor, so the inference can't take up more time than planned.
+
+        Returns:
+            tuple: The minimum and maximum number of frames between two pose estimations.
+        """
+        min_interval = self.min_pose_interval
+        if self.pose_latency is not None and self.pose_latency > self.latency_budget:
+            min_interval = int(np.ceil(min_interval * self.pose_latency / self.latency_budget))
+        return min(min_interval, self.max_pose_interval), self.max_pose_interval
+
+    def is_moving(self):
+        """
+        Check whether the scene or the tracked person moves.
+
+        Returns:
+            bool: True if any motion signal exceeds its threshold.
+        """
+        return (self.motion > self.motion_threshold or self.velocity > self.velocity_threshold or
+                self.torso_velocity > TORSO_VELOCITY_THRESHOLD)
+
+    def should_run_pose(self, frame_id, frame_rgb, timestamp):
+        """
+        Decide whether pose estimation should run on the frame.
+
+        Args:
+            frame_id (int): Running number of the frame.
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            timestamp (float): Capture time of the frame.
+
+        Returns:
+            bool: True if pose estimation should run.
+        """
+        self.measure_motion(frame_rgb)
+        min_interval, max_interval = self.pose_interval_limits()
+
+        if self.last_pose_frame_id is None:
+            run, reason = True, "first_frame"
+        else:
+            frames_since_pose = frame_id - self.last_pose_frame_id
+            if frames_since_pose < min_interval:
+                run, reason = False, "min_interval"
+            elif frames_since_pose >= max_interval:
+                run, reason = True, "max_interval"
+            elif not self.person_detected:
+                run, reason = True, "searching"
+            elif self.is_moving():
+                run, reason = True, "motion"
+            else:
+                run, reason = False, "still"
+
+        if run:
+            self.last_pose_frame_id = frame_id
+        self.log_decision("pose", frame_id, timestamp, run, reason, min_interval)
+        return run
+
+    def should_run_appearance(self, frame_id, timestamp):
+        """
+        Decide whether the appearance check should run on a frame with a detected person.
+
+        Args:
+            frame_id (int): Running number of the frame.
+            timestamp (float): Capture time of the frame.
+
+        Returns:
+            bool: True if the appearance check should run.
+        """
+        if self.last_appearance_frame_id is None:
+            run, reason = True, "first_frame"
+        else:
+            frames_since_check = frame_id - self.last_appearance_frame_id
+            if frames_since_check < self.min_appearance_interval:
+                run, reason = False, "min_interval"
+            elif frames_since_check >= self.max_appearance_interval:
+                run, reason = True, "max_interval"
+            elif self.is_moving():
+                run, reason = True, "motion"
+            else:
+                run, reason = False, "still"
+
+        if run:
+            self.last_appearance_frame_id = frame_id
+        self.log_decision("appearance", frame_id, timestamp, run, reason, self.min_appearance_interval)
+        return run
+
+    def log_decision(self, stage, frame_id, timestamp, run, reason, min_interval):
+        """
+        Append a decision with the signals it was based on to the decision log.
+        """
+        with self._log_lock:
+            self.decision_log.append({
+                "stage": stage,
+                "frame_id": frame_id,
+                "timestamp": timestamp,
+                "run": run,
+                "reason": reason,
+                "motion": round(self.motion, 5),
+                "velocity": round(self.velocity, 5),
+                "torso_velocity": round(self.torso_velocity, 5),
+                "pose_latency": self.pose_latency,
+                "min_interval": min_interval,
+            })
+
+    def save_decision_log(self, path):
+        """
+        Write the decision log to a file with one JSON object per line.
+
+        Args:
+            path (str): Path of the log file.
+        """
+        with self._log_lock:
+            decisions = list(self.decision_log)
+        with open(path, 'w') as log_file:
+            for decision in decisions:
+                log_file.write(json.dumps(decision) + "\n")
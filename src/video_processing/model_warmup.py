@@ -0,0 +1,112 @@
+import threading
+import time
+
+# Readiness states of the models, in the order they are passed
+STATE_STARTING = "STARTING"
+STATE_LOADING = "LOADING"
+STATE_READY = "READY"
+STATE_FAILED = "FAILED"
+
+
+class ModelWarmup:
+    """
+    Load and warm up the models on a background thread.
+
+    Importing MediaPipe, building the pose graph and the first inference take seconds, which
+    would otherwise delay the connection to the drone and the serial link or stall the first
+    frames. The steps run one after another, their durations are kept as startup breakdown and
+    every state change is passed to the listeners, e.g. to report it over serial.
+    """
+
+    def __init__(self, steps):
+        """
+        Initialize the ModelWarmup.
+
+        Args:
+            steps (list): Pairs of step name and function, run in this order.
+        """
+        self.steps = steps
+        self.lock = threading.Lock()
+        self.ready_event = threading.Event()
+        self.thread = None
+        self.listeners = []
+
+        self.state = STATE_STARTING
+        self.step = None
+        self.error = None
+        # Seconds per finished step, in order
+        self.timings = {}
+
+    def add_listener(self, listener):
+        """
+        Add a function that is called with the status (see get_status) on every state change.
+
+        Args:
+            listener (callable): The function, called from the warm-up thread.
+        """
+        with self.lock:
+            self.listeners.append(listener)
+
+    def start(self):
+        """
+        Start the warm-up thread, unless it was already started.
+        """
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """
+        Run the warm-up steps and set the state.
+        """
+        for name, function in self.steps:
+            self.set_state(STATE_LOADING, name)
+            start_time = time.perf_counter()
+            try:
+                function()
+            except Exception as e:
+                print(f"Warm-up step {name} failed: {e}")
+                self.error = f"{name}: {e}"
+                self.set_state(STATE_FAILED, name)
+                self.ready_event.set()
+                return
+            self.timings[name] = time.perf_counter() - start_time
+        self.set_state(STATE_READY, None)
+        self.ready_event.set()
+
+    def set_state(self, state, step):
+        with self.lock:
+            self.state = state
+            self.step = step
+            listeners = list(self.listeners)
+        status = self.get_status()
+        for listener in listeners:
+            listener(status)
+
+    def wait(self, timeout=None):
+        """
+        Wait until the warm-up is finished.
+
+        Args:
+            timeout (float, optional): Maximum time to wait in seconds. Default is to wait forever.
+
+        Returns:
+            bool: True if the warm-up finished, successfully or not, False if the timeout expired.
+        """
+        return self.ready_event.wait(timeout)
+
+    @property
+    def ready(self):
+        return self.state == STATE_READY
+
+    def get_status(self):
+        """
+        Get the readiness state, the current step and the durations of the finished steps.
+
+        Returns:
+            dict: The status.
+        """
+        with self.lock:
+            return {"state": self.state, "step": self.step, "error": self.error, "timings": dict(self.timings)}
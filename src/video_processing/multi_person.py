@@ -0,0 +1,451 @@
+import time
+
+import cv2
+import numpy as np
+
+from .pose_estimation import create_pose, landmarks_to_array, load_mediapipe, TORSO_INDICES, DEFAULT_MODEL_COMPLEXITY
+from .person_color_detection import (gallery, extract_torso_region, calculate_color_histogram,
+                                     find_dominant_colors)
+from .roi_pose import RoiPoseEstimator, compute_roi, map_landmarks_to_frame, torso_confidence, ROI_INPUT_SIZE
+
+# Maximum number of candidates that get a pose estimation per selection
+MAX_CANDIDATES = 4
+# Seconds after which the target is selected again among all people in the frame
+REDETECT_INTERVAL = 2.0
+# Minimum appearance similarity for a candidate to be selected as target
+MIN_TARGET_SIMILARITY = 0.4
+# Width the frame is downscaled to for the people detector
+DETECTOR_WIDTH = 640
+# Padding around a detected person box, relative to the box size
+CANDIDATE_PADDING = 0.15
+# Minimum torso confidence of a candidate pose
+MIN_CANDIDATE_CONFIDENCE = 0.5
+# Maximum distance of the torso centers, normalized to the frame, for a selected target to count as the previous one
+SAME_TARGET_DISTANCE = 0.1
+# Detectors of the candidates, see create_person_detector
+PERSON_DETECTORS = ("hog", "landmarker")
+
+
+class PoseCandidateResults:
+    """
+    Pose results of a single candidate, compatible with the results of a MediaPipe Pose estimator.
+    """
+
+    def __init__(self, landmarks):
+        """
+        Initialize the PoseCandidateResults.
+
+        Args:
+            landmarks (list or None): Landmarks with x, y, z and visibility in normalized full-frame
+                coordinates or None if no person was found.
+        """
+        self.pose_landmarks = None
+        if landmarks is not None:
+            landmark_pb2 = load_mediapipe().framework.formats.landmark_pb2
+            self.pose_landmarks = landmark_pb2.NormalizedLandmarkList(landmark=[
+                landmark_pb2.NormalizedLandmark(x=lm.x, y=lm.y, z=lm.z, visibility=lm.visibility)
+                for lm in landmarks
+            ])
+
+
+class HogPeopleDetector:
+    """
+    Detect people with OpenCV's HOG people detector and estimate the pose of every person on a crop.
+    """
+
+    def __init__(self, detector_width=DETECTOR_WIDTH, input_size=ROI_INPUT_SIZE):
+        """
+        Initialize the HogPeopleDetector.
+
+        Args:
+            detector_width (int, optional): Width the frame is downscaled to. Default is DETECTOR_WIDTH.
+            input_size (int, optional): Side length the person crops are rescaled to. Default is ROI_INPUT_SIZE.
+        """
+        self.detector_width = detector_width
+        self.input_size = input_size
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+        # Without tracking, every crop is a new image, built on first use per model complexity
+        self.model_complexity = DEFAULT_MODEL_COMPLEXITY
+        self.poses = {}
+        self.crop_input = np.empty((input_size, input_size, 3), dtype=np.uint8)
+
+    @property
+    def pose(self):
+        """
+        The crop estimator of the current model complexity, None until it's built.
+        """
+        return self.poses.get(self.model_complexity)
+
+    def build_models(self, model_complexities=None):
+        """
+        Build the pose estimator of the crops, which loads MediaPipe and its model.
+
+        Args:
+            model_complexities (list, optional): Model complexities to build. Default is the current one.
+        """
+        for model_complexity in model_complexities or [self.model_complexity]:
+            if model_complexity not in self.poses:
+                self.poses[model_complexity] = create_pose(static_image_mode=True, model_complexity=model_complexity)
+
+    def set_model_complexity(self, model_complexity):
+        self.model_complexity = model_complexity
+
+    def detect_boxes(self, frame_rgb):
+        """
+        Detect people boxes in the frame.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+
+        Returns:
+            list: The boxes (x_min, y_min, x_max, y_max) in full-frame pixels, largest first.
+        """
+        frame_height, frame_width = frame_rgb.shape[:2]
+        scale = min(1.0, self.detector_width / frame_width)
+        small = cv2.resize(frame_rgb, (int(frame_width * scale), int(frame_height * scale)),
+                           interpolation=cv2.INTER_AREA)
+        rects, _ = self.hog.detectMultiScale(cv2.cvtColor(small, cv2.COLOR_RGB2GRAY), winStride=(8, 8))
+        boxes = [(int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale)) for x, y, w, h in rects]
+        return sorted(boxes, key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), reverse=True)
+
+    def estimate_pose(self, frame_rgb, box):
+        """
+        Estimate the pose of the person in a box.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            box (tuple): The box (x_min, y_min, x_max, y_max) in pixels.
+
+        Returns:
+            list or None: The landmarks in normalized full-frame coordinates or None if no pose was found.
+        """
+        frame_height, frame_width = frame_rgb.shape[:2]
+        x_min, y_min, x_max, y_max = box
+        size = max(x_max - x_min, y_max - y_min) * (1 + 2 * CANDIDATE_PADDING)
+        size = min(size, frame_width, frame_height)
+        left = int(min(max((x_min + x_max - size) / 2, 0), frame_width - size))
+        top = int(min(max((y_min + y_max - size) / 2, 0), frame_height - size))
+        roi = (left, top, left + int(size), top + int(size))
+
+        cv2.resize(frame_rgb[roi[1]:roi[3], roi[0]:roi[2]], (self.input_size, self.input_size),
+                   dst=self.crop_input, interpolation=cv2.INTER_AREA)
+        self.build_models()
+        pose_results = self.pose.process(self.crop_input)
+        if not pose_results.pose_landmarks:
+            return None
+        landmarks = pose_results.pose_landmarks.landmark
+        map_landmarks_to_frame(landmarks, roi, frame_width, frame_height)
+        return landmarks
+
+    def detect(self, frame_rgb, max_candidates=MAX_CANDIDATES):
+        """
+        Detect people and estimate their poses.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            max_candidates (int, optional): Maximum number of people. Default is MAX_CANDIDATES.
+
+        Returns:
+            list: The landmarks of every person in normalized full-frame coordinates.
+        """
+        candidates = []
+        for box in self.detect_boxes(frame_rgb)[:max_candidates]:
+            landmarks = self.estimate_pose(frame_rgb, box)
+            if landmarks is not None:
+                candidates.append(landmarks)
+        return candidates
+
+
+class PoseLandmarkerDetector:
+    """
+    Detect several poses at once with the MediaPipe Tasks PoseLandmarker.
+
+    Needs a pose landmarker model bundle (.task file), which is not part of the mediapipe package.
+    """
+
+    def __init__(self, model_path, max_candidates=MAX_CANDIDATES):
+        """
+        Initialize the PoseLandmarkerDetector.
+
+        Args:
+            model_path (str): Path of the pose landmarker model bundle.
+            max_candidates (int, optional): Maximum number of detected poses. Default is MAX_CANDIDATES.
+        """
+        import mediapipe as mp
+        from mediapipe.tasks import python as mp_tasks
+        from mediapipe.tasks.python import vision
+
+        self.mp = mp
+        options = vision.PoseLandmarkerOptions(base_options=mp_tasks.BaseOptions(model_asset_path=model_path),
+                                               running_mode=vision.RunningMode.IMAGE,
+                                               num_poses=max_candidates)
+        self.landmarker = vision.PoseLandmarker.create_from_options(options)
+
+    def detect(self, frame_rgb, max_candidates=MAX_CANDIDATES):
+        """
+        Detect people and estimate their poses.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            max_candidates (int, optional): Maximum number of people. Default is MAX_CANDIDATES.
+
+        Returns:
+            list: The landmarks of every person in normalized full-frame coordinates.
+        """
+        image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=np.ascontiguousarray(frame_rgb))
+        return self.landmarker.detect(image).pose_landmarks[:max_candidates]
+
+
+def create_person_detector(person_detector, landmarker_model=None):
+    """
+    Create a candidate detector by name.
+
+    Args:
+        person_detector (str): One of PERSON_DETECTORS.
+        landmarker_model (str, optional): Path of the pose landmarker model bundle, needed for "landmarker".
+
+    Returns:
+        object: The detector, the HOG people detector if the landmarker can't be loaded.
+
+    Raises:
+        ValueError: If the detector is unknown or the landmarker has no model.
+    """
+    if person_detector == "hog":
+        return HogPeopleDetector()
+    if person_detector == "landmarker":
+        if not landmarker_model:
+            raise ValueError("The landmarker person detector needs a pose landmarker model bundle")
+        try:
+            return PoseLandmarkerDetector(landmarker_model)
+        except (ImportError, OSError, RuntimeError, ValueError) as e:
+            # mediapipe is missing or can't load the model bundle
+            print(f"Pose landmarker not available, using the HOG people detector: {e}")
+            return HogPeopleDetector()
+    raise ValueError(f"Unknown person detector '{person_detector}', expected one of {', '.join(PERSON_DETECTORS)}")
+
+
+class MultiPersonTracker:
+    """
+    Select the target among all people in the frame by appearance and follow only that person.
+
+    The candidates of all detected people are scored against the appearance gallery in one
+    batch. After the selection, the target is followed with ROI pose estimation around its last
+    landmarks, so other people are ignored. The selection is repeated every REDETECT_INTERVAL
+    seconds and whenever the target is lost. A selection of another person than the previous
+    target increments target_id.
+    """
+
+    def __init__(self, detector=None, redetect_interval=REDETECT_INTERVAL, max_candidates=MAX_CANDIDATES,
+                 appearance_gallery=None):
+        """
+        Initialize the MultiPersonTracker.
+
+        Args:
+            detector (object, optional): Candidate detector with a detect(frame_rgb, max_candidates) method.
+                Default is a HogPeopleDetector.
+            redetect_interval (float, optional): Seconds between two target selections. Default is REDETECT_INTERVAL.
+            max_candidates (int, optional): Maximum number of candidates per selection. Default is MAX_CANDIDATES.
+            appearance_gallery (AppearanceGallery, optional): Appearance of the calibrated person.
+                Default is the gallery of person_color_detection.
+        """
+        self.detector = detector if detector is not None else HogPeopleDetector()
+        self.redetect_interval = redetect_interval
+        self.max_candidates = max_candidates
+        self.gallery = appearance_gallery if appearance_gallery is not None else gallery
+
+        self.roi_estimator = RoiPoseEstimator(roi_enabled=True)
+        self.last_selection_time = None
+        self.target_score = None
+        # Incremented whenever another person becomes the target, e.g. to reset filters of the previous one
+        self.target_id = 0
+
+        # Selection time per number of candidates: {count: [total seconds, selections]}
+        self.selection_costs = {}
+
+    def build_models(self, model_complexities=None):
+        """
+        Build the pose estimators of the detector and the target tracking.
+
+        Args:
+            model_complexities (list, optional): Model complexities to build. Default is the current one.
+        """
+        if hasattr(self.detector, "build_models"):
+            self.detector.build_models(model_complexities)
+        self.roi_estimator.build_models(model_complexities)
+
+    def set_quality(self, inference_width, model_complexity):
+        """
+        Change the inference width of the full frame and the model complexity of all pose estimators.
+
+        Args:
+            inference_width (int or None): Width the full frame is downscaled to, None for the frame width.
+            model_complexity (int): Complexity of the pose model, 0, 1 or 2.
+        """
+        self.roi_estimator.set_quality(inference_width, model_complexity)
+        if hasattr(self.detector, "set_model_complexity"):
+            self.detector.set_model_complexity(model_complexity)
+
+    def process(self, frame_rgb, now=None):
+        """
+        Estimate the pose of the target person.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            now (float, optional): The current time. Default is time.time().
+
+        Returns:
+            object: Pose results with the target's pose_landmarks, which are None if no target was found.
+        """
+        if now is None:
+            now = time.time()
+
+        # Follow the selected target in its region of interest
+        last_landmarks = self.roi_estimator.last_landmarks
+        if (last_landmarks is not None and self.last_selection_time is not None and
+                now - self.last_selection_time < self.redetect_interval):
+            frame_height, frame_width = frame_rgb.shape[:2]
+            roi = compute_roi(last_landmarks, frame_width, frame_height)
+            if roi is not None:
+                pose_results = self.roi_estimator.process_roi(frame_rgb, roi)
+                if pose_results is not None:
+                    self.roi_estimator.last_landmarks = pose_results.pose_landmarks.landmark
+                    return pose_results
+
+        return self.select_target(frame_rgb, now)
+
+    def detect_candidates(self, frame_rgb):
+        """
+        Detect the candidates, falling back to the single-person estimator if the detector finds nobody.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+
+        Returns:
+            list: The landmarks of every candidate.
+        """
+        candidates = [landmarks for landmarks in self.detector.detect(frame_rgb, self.max_candidates)
+                      if torso_confidence(landmarks) >= MIN_CANDIDATE_CONFIDENCE]
+        if not candidates:
+            pose_results = self.roi_estimator.process_full_frame(frame_rgb)
+            if pose_results.pose_landmarks:
+                candidates = [pose_results.pose_landmarks.landmark]
+        return candidates
+
+    def score_candidates(self, frame_rgb, candidates):
+        """
+        Score the appearance of all candidates against the gallery in one batch.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            candidates (list): The landmark array of every candidate, see landmarks_to_array.
+
+        Returns:
+            numpy.ndarray or None: The score of every candidate (-inf if the torso is not visible) or
+            None if no person is calibrated.
+        """
+        if self.gallery.is_empty():
+            return None
+
+        histograms, color_sets, valid = [], [], []
+        for index, landmarks in enumerate(candidates):
+            try:
+                torso_region = extract_torso_region(frame_rgb, landmarks)
+            except ValueError:
+                continue
+            colors = find_dominant_colors(torso_region, initial_colors=self.gallery.calibrated_colors)
+            if colors is None:
+                continue
+            histograms.append(calculate_color_histogram(torso_region))
+            color_sets.append(colors)
+            valid.append(index)
+
+        scores = np.full(len(candidates), -np.inf)
+        if valid:
+            scores[valid] = self.gallery.score_candidates(np.stack(histograms), np.stack(color_sets))
+        return scores
+
+    def select_target(self, frame_rgb, now):
+        """
+        Detect all people, score them by appearance and select the target.
+
+        Without calibration the largest person is selected.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            now (float): The current time.
+
+        Returns:
+            object: Pose results with the target's pose_landmarks, which are None if no target was found.
+        """
+        start_time = time.perf_counter()
+        candidates = self.detect_candidates(frame_rgb)
+        landmark_arrays = [landmarks_to_array(landmarks) for landmarks in candidates]
+        scores = self.score_candidates(frame_rgb, landmark_arrays) if candidates else None
+
+        best = None
+        self.target_score = None
+        if candidates and scores is None:
+            sizes = [candidate_size(landmarks) for landmarks in landmark_arrays]
+            best = int(np.argmax(sizes))
+        elif candidates:
+            best = int(np.argmax(scores))
+            if scores[best] >= MIN_TARGET_SIMILARITY:
+                self.target_score = float(scores[best])
+            else:
+                best = None
+
+        target = None
+        if best is not None:
+            target = candidates[best]
+            previous = self.roi_estimator.last_landmarks
+            if previous is None or (np.linalg.norm(torso_center(landmarks_to_array(previous)) -
+                                                   torso_center(landmark_arrays[best])) > SAME_TARGET_DISTANCE):
+                self.target_id += 1
+
+        self.last_selection_time = now
+        self.roi_estimator.last_landmarks = target
+        self.record_cost(len(candidates), time.perf_counter() - start_time)
+        return PoseCandidateResults(target)
+
+    def record_cost(self, num_candidates, seconds):
+        cost = self.selection_costs.setdefault(num_candidates, [0.0, 0])
+        cost[0] += seconds
+        cost[1] += 1
+
+    def get_cost_stats(self):
+        """
+        Get the average target selection time per number of people in the frame.
+
+        Returns:
+            dict: Average seconds per selection, keyed by the number of candidates.
+        """
+        return {count: total / selections for count, (total, selections) in sorted(self.selection_costs.items())}
+
+
+def torso_center(landmarks):
+    """
+    Get the center of the torso landmarks of a candidate.
+
+    Args:
+        landmarks (numpy.ndarray): The landmark array of the candidate, see landmarks_to_array.
+
+    Returns:
+        numpy.ndarray: X and Y in normalized coordinates.
+    """
+    return landmarks[TORSO_INDICES, :2].mean(axis=0)
+
+
+def candidate_size(landmarks):
+    """
+    Get the size of a candidate as the area of the bounding box of its torso landmarks.
+
+    Args:
+        landmarks (numpy.ndarray): The landmark array of the candidate, see landmarks_to_array.
+
+    Returns:
+        float: The area in normalized coordinates.
+    """
+    torso = landmarks[TORSO_INDICES, :2]
+    width, height = torso.max(axis=0) - torso.min(axis=0)
+    return float(width * height)
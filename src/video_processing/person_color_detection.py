@@ -1,13 +1,16 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-from sklearn.cluster import KMeans
 
-from .utils import get_frame_height, get_frame_width
+from .appearance_gallery import AppearanceGallery
+from .color_quantization import quantize_colors, color_distance, MAX_COLOR_DISTANCE
+from .histogram_engine import calculate_histogram, correlate_histograms
+from .pose_estimation import TORSO_INDICES
 
-# Calibrated color histogram and dominant colors
-calibrated_color_histogram = None
-calibrated_dominant_colors = None
+# Appearance templates (color histograms and dominant colors) of the calibrated person, used by the functions
+# below unless a session passes its own gallery
+gallery = AppearanceGallery()
+# Side length of the noise image the color engine is warmed up with
+WARM_UP_IMAGE_SIZE = 64
 
 
 def extract_torso_region(frame, pose_landmarks):
@@ -16,7 +19,7 @@ def extract_torso_region(frame, pose_landmarks):
 
     Args:
         frame (numpy.ndarray): The current video frame.
-        pose_landmarks (list): List of pose landmarks for the person in the frame.
+        pose_landmarks (numpy.ndarray): Landmark array of the person in the frame, see landmarks_to_array.
 
     Returns:
         numpy.ndarray: Cropped frame containing the torso region.
@@ -25,21 +28,18 @@ def extract_torso_region(frame, pose_landmarks):
         ValueError: If coordinates of landmarks are not within the range of 0 to 1.
     """
     # Get coordinates of shoulders and hips
-    left_shoulder = pose_landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER]
-    right_shoulder = pose_landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER]
-    left_hip = pose_landmarks[mp.solutions.pose.PoseLandmark.LEFT_HIP]
-    right_hip = pose_landmarks[mp.solutions.pose.PoseLandmark.RIGHT_HIP]
+    torso = pose_landmarks[TORSO_INDICES, :2]
 
     # Check if x and y values are within the range of [0, 1]
-    if not all(0 <= lm.x <= 1 and 0 <= lm.y <= 1 for lm in [left_shoulder, right_shoulder, left_hip, right_hip]):
+    if not ((torso >= 0) & (torso <= 1)).all():
         raise ValueError("Coordinates of landmarks are not within the range of 0 to 1")
 
     # Calculate bounding box for the torso
-    x_min = int(min(left_shoulder, right_shoulder, left_hip.x, right_hip.x) * get_frame_width())
-    x_max = int(max(left_shoulder, right_shoulder, left_hip.x, right_hip.x) * get_frame_width())
-    y_min = int(min(left_shoulder.y, right_shoulder.y, left_hip.y, right_hip.y) * get_frame_height())
-    y_max = int(max(left_shoulder.y, right_shoulder.y, left_hip.y, right_hip.y) * get_frame_height())
-    bounding_box = frame[y_min:y_max, x_min:x_max]
+    x_min, y_min = torso.min(axis=0)
+    x_max, y_max = torso.max(axis=0)
+    frame_height, frame_width = frame.shape[:2]
+    bounding_box = frame[int(y_min * frame_height):int(y_max * frame_height),
+                         int(x_min * frame_width):int(x_max * frame_width)]
 
     return bounding_box
 
@@ -48,32 +48,31 @@ def calculate_color_histogram(image):
     """
     Compute a normalized color histogram for the given image.
 
+    Uses 8x8x8 bins on a subsample of the pixels, see histogram_engine.calculate_histogram.
+
     Args:
         image (numpy.ndarray): The input image.
 
     Returns:
         numpy.ndarray: The normalized color histogram.
     """
-    hist = cv2.calcHist([image], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-    hist = cv2.normalize(hist, hist).flatten()
-    return hist.astype(np.float32)
+    return calculate_histogram(image)
 
 
-def find_dominant_colors(image, k=3):
+def find_dominant_colors(image, k=3, initial_colors=None):
     """
-    Identify the dominant colors in the image using K-means clustering.
+    Identify the dominant colors in the image using K-means clustering on a subsample of the pixels.
 
     Args:
         image (numpy.ndarray): The input image.
         k (int, optional): Number of clusters for K-means. Default is 3.
+        initial_colors (numpy.ndarray, optional): Colors to start the clustering from, e.g. the calibrated colors.
 
     Returns:
         numpy.ndarray or None: Array of dominant colors or None if an error occurs.
     """
     try:
-        pixels = image.reshape(-1, 3)
-        kmeans = KMeans(n_clusters=k).fit(pixels)
-        colors = np.round(kmeans.cluster_centers_).astype(int)
+        colors = np.round(quantize_colors(image, k, initial_colors)).astype(int)
         return colors
     except ValueError as e:
         print(f"Error occurred when finding dominant colors: {e}")
@@ -81,6 +80,18 @@ def find_dominant_colors(image, k=3):
     return None
 
 
+def warm_up_color_engine(size=WARM_UP_IMAGE_SIZE):
+    """
+    Run the color quantization and the histogram once on a noise image, without touching the gallery.
+
+    Args:
+        size (int, optional): Side length of the noise image. Default is WARM_UP_IMAGE_SIZE.
+    """
+    image = np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    find_dominant_colors(image)
+    calculate_color_histogram(image)
+
+
 def calculate_histogram_similarity(hist1, hist2, method=cv2.HISTCMP_CORREL):
     """
     Compare two histograms and return a similarity score.
@@ -93,6 +104,8 @@ def calculate_histogram_similarity(hist1, hist2, method=cv2.HISTCMP_CORREL):
     Returns:
         float: Similarity score between the two histograms.
     """
+    if method == cv2.HISTCMP_CORREL:
+        return float(correlate_histograms(hist2, hist1)[0])
     return cv2.compareHist(hist1, hist2, method)
 
 
@@ -100,6 +113,8 @@ def calculate_color_similarity(calibrated_colors, current_colors):
     """
     Compare two color arrays and return a similarity score.
 
+    The colors are matched independent of their order in the arrays.
+
     Args:
         calibrated_colors (numpy.ndarray): Array of calibrated dominant colors.
         current_colors (numpy.ndarray): Array of current dominant colors.
@@ -107,103 +122,105 @@ def calculate_color_similarity(calibrated_colors, current_colors):
     Returns:
         float: Similarity score between the two color arrays.
     """
-    color_similarity = np.mean([np.linalg.norm(calibrated_colors[i] - current_colors[i]) for i in
-                                range(len(calibrated_colors))])
-    color_similarity = 1 - (color_similarity / 441.67)  # Normalize to [0, 1]
+    color_similarity = color_distance(calibrated_colors, current_colors)
+    color_similarity = 1 - (color_similarity / MAX_COLOR_DISTANCE)  # Normalize to [0, 1]
     return color_similarity
 
 
-def calibrate_colors(frame, pose_landmarks):
+def calibrate_colors(frame, pose_landmarks, appearance_gallery=None):
     """
     Calibrate the colors for the input frame.
 
     Args:
         frame (numpy.ndarray): The current video frame.
-        pose_landmarks (list): List of pose landmarks for the person in the frame.
+        pose_landmarks (numpy.ndarray): Landmark array of the person in the frame, see landmarks_to_array.
+        appearance_gallery (AppearanceGallery, optional): The gallery to calibrate. Default is the module gallery.
     """
-    global calibrated_color_histogram, calibrated_dominant_colors
-
+    if appearance_gallery is None:
+        appearance_gallery = gallery
     try:
         torso_region = extract_torso_region(frame, pose_landmarks)
         calibrated_color_histogram = calculate_color_histogram(torso_region)
         calibrated_dominant_colors = find_dominant_colors(torso_region)
+        if calibrated_dominant_colors is not None:
+            appearance_gallery.reset(calibrated_color_histogram, calibrated_dominant_colors)
     except ValueError:
         print(f"Calibration did not work: Torso not fully in frame")
 
 
-def are_torso_colors_calibrated():
+def are_torso_colors_calibrated(appearance_gallery=None):
     """
     Check if torso colors are calibrated.
 
+    Args:
+        appearance_gallery (AppearanceGallery, optional): The gallery to check. Default is the module gallery.
+
     Returns:
         bool: True if calibrated, False otherwise.
     """
-    return calibrated_color_histogram is not None and calibrated_dominant_colors is not None
+    if appearance_gallery is None:
+        appearance_gallery = gallery
+    return not appearance_gallery.is_empty()
 
 
-def check_person_similarity(frame, pose_landmarks, method=cv2.HISTCMP_CORREL):
+def check_person_similarity(frame, pose_landmarks, method=cv2.HISTCMP_CORREL, appearance_gallery=None):
     """
     Check the similarity of the current frame's person to the calibrated person.
 
     Args:
         frame (numpy.ndarray): The current video frame.
-        pose_landmarks (list): List of pose landmarks for the person in the frame.
+        pose_landmarks (numpy.ndarray): Landmark array of the person in the frame, see landmarks_to_array.
         method (int, optional): OpenCV histogram comparison method. Default is cv2.HISTCMP_CORREL.
+        appearance_gallery (AppearanceGallery, optional): The calibrated gallery. Default is the module gallery.
 
     Returns:
         float or None: The average similarity score or None if similarity cannot be computed.
     """
-    if are_torso_colors_calibrated():
-        # Extract torso if torso is fully in frame
-        try:
-            current_torso_region = extract_torso_region(frame, pose_landmarks)
-        except ValueError:
-            print(f"Calibration did not work: Torso not fully in frame")
-            return None
-
-        current_histogram = calculate_color_histogram(current_torso_region)
-        current_colors = find_dominant_colors(current_torso_region)
-
-        if current_colors is not None:
-            histogram_similarity = calculate_histogram_similarity(calibrated_color_histogram, current_histogram, method)
-            color_similarity = calculate_color_similarity(calibrated_dominant_colors, current_colors)
-
-            return (histogram_similarity + color_similarity) / 2  # Average of both similarities
-        else:
-            return None
-    # Return None if torso colors aren't calibrated
-    else:
+    if not are_torso_colors_calibrated(appearance_gallery):
+        return None
+
+    try:
+        current_torso_region = extract_torso_region(frame, pose_landmarks)
+    except ValueError:
+        print(f"Calibration did not work: Torso not fully in frame")
         return None
 
+    return check_torso_similarity(current_torso_region, method, appearance_gallery)
 
-def check_person_similarity(frame, pose_landmarks, method=cv2.HISTCMP_CORREL):
+
+def check_torso_similarity(torso_region, method=cv2.HISTCMP_CORREL, appearance_gallery=None):
     """
-    Check the similarity of the current frame's person to the calibrated person.
+    Check the similarity of an extracted torso region to the calibrated person.
 
-    Parameters:
-    frame (np.ndarray): The current video frame.
-    pose_landmarks (list): The pose landmarks of the person in the frame.
-    method (int): The method for comparing histograms (default: cv2.HISTCMP_CORREL).
+    With the default method, the torso is matched against all templates of the gallery and
+    learned as a new template if it is a confident, new appearance. Other methods compare
+    with the calibrated template only.
+
+    Args:
+        torso_region (numpy.ndarray): Cropped frame containing the torso region.
+        method (int, optional): OpenCV histogram comparison method. Default is cv2.HISTCMP_CORREL.
+        appearance_gallery (AppearanceGallery, optional): The calibrated gallery. Default is the module gallery.
 
     Returns:
-    float or None: The average similarity score or None if the comparison cannot be made.
+        float or None: The average similarity score or None if similarity cannot be computed.
     """
-    if not are_torso_colors_calibrated():
+    if appearance_gallery is None:
+        appearance_gallery = gallery
+    if not are_torso_colors_calibrated(appearance_gallery):
         return None
 
-    try:
-        current_torso_region = extract_torso_region(frame, pose_landmarks)
-    except ValueError:
-        print(f"Calibration did not work: Torso not fully in frame")
-        return None
-
-    current_histogram = calculate_color_histogram(current_torso_region)
-    current_colors = find_dominant_colors(current_torso_region)
+    current_histogram = calculate_color_histogram(torso_region)
+    # Start the clustering from the calibrated colors, so it converges in a few iterations
+    current_colors = find_dominant_colors(torso_region, initial_colors=appearance_gallery.calibrated_colors)
 
     if current_colors is None:
         return None
 
-    histogram_similarity = calculate_histogram_similarity(calibrated_color_histogram, current_histogram, method)
-    color_similarity = calculate_color_similarity(calibrated_dominant_colors, current_colors)
+    if method == cv2.HISTCMP_CORREL:
+        return appearance_gallery.match(current_histogram, current_colors)
+
+    histogram_similarity = calculate_histogram_similarity(appearance_gallery.calibrated_histogram, current_histogram,
+                                                          method)
+    color_similarity = calculate_color_similarity(appearance_gallery.calibrated_colors, current_colors)
 
     return (histogram_similarity + color_similarity) / 2
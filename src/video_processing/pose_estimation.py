@@ -1,20 +1,84 @@
 import math
-import mediapipe as mp
 
-from .utils import get_frame_height, get_frame_width
+import numpy as np
 
-# Number of measurements that should be used to calculate average coordinates
-FILTER_SIZE = 3
+# MediaPipe takes about a second to import, it's imported on first use
+_mp = None
 
-# Store recent measurements for the average filter
-recent_shoulder_xs = []
-recent_shoulder_ys = []
-recent_torso_sizes = []
+# Model complexity of the pose landmark model: 0 (lite), 1 (full) or 2 (heavy). Only the full model is
+# shipped with MediaPipe, the others are downloaded when they are used for the first time
+DEFAULT_MODEL_COMPLEXITY = 1
 
-# Initialize MediaPipe Pose estimator
-mp_drawing = mp.solutions.drawing_utils
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+# Number of pose landmarks and columns of a landmark array
+NUM_LANDMARKS = 33
+LANDMARK_X, LANDMARK_Y, LANDMARK_Z, LANDMARK_VISIBILITY = range(4)
+
+# Row indices of the torso landmarks in a landmark array, the numbers of mp.solutions.pose.PoseLandmark
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_HIP = 23
+RIGHT_HIP = 24
+TORSO_INDICES = [LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_HIP, RIGHT_HIP]
+
+
+def load_mediapipe():
+    """
+    Import MediaPipe on first use.
+
+    Returns:
+        module: The mediapipe module.
+    """
+    global _mp
+    if _mp is None:
+        import mediapipe as mp
+        _mp = mp
+    return _mp
+
+
+def create_pose(static_image_mode=False, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                model_complexity=DEFAULT_MODEL_COMPLEXITY):
+    """
+    Build a MediaPipe Pose estimator.
+
+    Args:
+        static_image_mode (bool, optional): Treat every image as unrelated, without tracking. Default is False.
+        min_detection_confidence (float, optional): Minimum confidence of a detection. Default is 0.5.
+        min_tracking_confidence (float, optional): Minimum confidence of the tracking. Default is 0.5.
+        model_complexity (int, optional): 0, 1 or 2, higher is more accurate and slower.
+            Default is DEFAULT_MODEL_COMPLEXITY.
+
+    Returns:
+        mediapipe.python.solutions.pose.Pose: The estimator.
+    """
+    return load_mediapipe().solutions.pose.Pose(static_image_mode=static_image_mode,
+                                                model_complexity=model_complexity,
+                                                min_detection_confidence=min_detection_confidence,
+                                                min_tracking_confidence=min_tracking_confidence)
+
+
+def draw_landmarks(image, pose_landmarks):
+    """
+    Draw the skeleton of a pose into the image.
+
+    Args:
+        image (numpy.ndarray): The BGR image.
+        pose_landmarks (mediapipe.framework.formats.landmark_pb2.NormalizedLandmarkList): The landmarks.
+    """
+    mp = load_mediapipe()
+    mp.solutions.drawing_utils.draw_landmarks(image, pose_landmarks, mp.solutions.pose.POSE_CONNECTIONS)
+
+
+def landmarks_to_array(landmarks):
+    """
+    Convert pose landmarks into a compact array, so they are read from the protobuf messages only once.
+
+    Args:
+        landmarks (list): The list of pose landmarks.
+
+    Returns:
+        numpy.ndarray: Array of shape (NUM_LANDMARKS, 4) with x, y, z and visibility of every landmark.
+    """
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks], dtype=np.float32)
 
 
 def calculate_distance(coord1, coord2):
@@ -36,75 +100,38 @@ def calculate_torso_size(landmarks):
     Calculate the size of the torso using shoulder and hip landmarks.
 
     Args:
-        landmarks (list): The list of pose landmarks.
+        landmarks (numpy.ndarray): The landmark array, see landmarks_to_array.
 
     Returns:
         float: The calculated torso size.
     """
-    left_shoulder = landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER]
-    right_shoulder = landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER]
-    left_hip = landmarks[mp_pose.PoseLandmark.LEFT_HIP]
-    right_hip = landmarks[mp_pose.PoseLandmark.RIGHT_HIP]
-
-    shoulder_distance = calculate_distance((left_shoulder.x, left_shoulder.y),
-                                           (right_shoulder.x, right_shoulder.y))
-    hip_distance = calculate_distance((left_hip.x, left_hip.y),
-                                      (right_hip.x, right_hip.y))
-    torso_height = calculate_distance(((left_shoulder.x + right_shoulder.x) / 2,
-                                       (left_shoulder.y + right_shoulder.y) / 2),
-                                      ((left_hip.x + right_hip.x) / 2, (left_hip.y + right_hip.y) / 2))
-
-    return shoulder_distance + hip_distance + torso_height
+    left_shoulder, right_shoulder, left_hip, right_hip = landmarks[TORSO_INDICES, :2].tolist()
 
+    shoulder_distance = calculate_distance(left_shoulder, right_shoulder)
+    hip_distance = calculate_distance(left_hip, right_hip)
+    torso_height = calculate_distance(((left_shoulder[0] + right_shoulder[0]) / 2,
+                                       (left_shoulder[1] + right_shoulder[1]) / 2),
+                                      ((left_hip[0] + right_hip[0]) / 2, (left_hip[1] + right_hip[1]) / 2))
 
-def append_recent_measurements(avg_shoulder_x, avg_shoulder_y, current_torso_size):
-    """
-    Append recent measurements to the tracking lists and maintain their size.
-
-    Args:
-        avg_shoulder_x (float): The average x-coordinate of the shoulders.
-        avg_shoulder_y (float): The average y-coordinate of the shoulders.
-        current_torso_size (float): The current size of the torso.
-    """
-    recent_shoulder_xs.append(avg_shoulder_x)
-    recent_shoulder_ys.append(avg_shoulder_y)
-    recent_torso_sizes.append(current_torso_size)
-
-    # Maintain the size of the recent measurements list
-    if len(recent_shoulder_ys) > FILTER_SIZE:
-        recent_shoulder_ys.pop(0)
-    if len(recent_torso_sizes) > FILTER_SIZE:
-        recent_torso_sizes.pop(0)
-    if len(recent_shoulder_xs) > FILTER_SIZE:
-        recent_shoulder_xs.pop(0)
+    return shoulder_distance + hip_distance + torso_height
 
 
-def calculate_avg_coordinates(pose_landmarks, current_torso_size):
+def calculate_avg_coordinates(landmarks, current_torso_size, track_filter, timestamp=None):
     """
-    Calculate the average coordinates of the shoulders and the average torso size.
+    Calculate the filtered coordinates of the shoulders and the filtered torso size.
 
     Args:
-        pose_landmarks (list): The list of pose landmarks.
+        landmarks (numpy.ndarray): The landmark array, see landmarks_to_array.
         current_torso_size (float): The current size of the torso.
+        track_filter (TrackFilter): The filter state of the tracked person.
+        timestamp (float, optional): Capture time of the frame.
 
     Returns:
-        tuple: The average x and y coordinates of the shoulders, and the average torso size.
+        tuple: The average x and y coordinates of the shoulders, normalized to the frame size, and the average
+            torso size.
     """
-    # Get shoulder x-coordinates
-    left_shoulder_x = pose_landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER].x * get_frame_width()
-    right_shoulder_x = pose_landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER].x * get_frame_width()
-    avg_shoulder_x = (left_shoulder_x + right_shoulder_x) / 2
-
-    # Get shoulder y-coordinates
-    left_shoulder_y = pose_landmarks[mp.solutions.pose.PoseLandmark.LEFT_SHOULDER].y * get_frame_height()
-    right_shoulder_y = pose_landmarks[mp.solutions.pose.PoseLandmark.RIGHT_SHOULDER].y * get_frame_height()
-    avg_shoulder_y = (left_shoulder_y + right_shoulder_y) / 2
-
-    append_recent_measurements(avg_shoulder_x, avg_shoulder_y, current_torso_size)
-
-    # Calculate moving average
-    avg_shoulder_x = sum(recent_shoulder_xs) / len(recent_shoulder_xs)
-    avg_shoulder_y = sum(recent_shoulder_ys) / len(recent_shoulder_ys)
-    torso_size = sum(recent_torso_sizes) / len(recent_torso_sizes)
+    # Get the center between the shoulders, the landmarks don't depend on the resolution of the inference
+    avg_shoulder_x = (landmarks[LEFT_SHOULDER, LANDMARK_X] + landmarks[RIGHT_SHOULDER, LANDMARK_X]) / 2
+    avg_shoulder_y = (landmarks[LEFT_SHOULDER, LANDMARK_Y] + landmarks[RIGHT_SHOULDER, LANDMARK_Y]) / 2
 
-    return avg_shoulder_x, avg_shoulder_y, torso_size
+    return track_filter.update(avg_shoulder_x, avg_shoulder_y, current_torso_size, timestamp)
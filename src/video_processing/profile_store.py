@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .histogram_engine import NUM_BINS
+
+# Directory of the profile store, relative to the working directory
+PROFILE_DIR = "profiles"
+# Number of dominant colors per template, as found by find_dominant_colors
+NUM_COLORS = 3
+# One appearance template, appended to the data file and memory-mapped with numpy
+TEMPLATE_DTYPE = np.dtype([("histogram", "<f4", (NUM_BINS,)), ("colors", "<f4", (NUM_COLORS, 3))])
+# Data file of the templates of all profiles and the index of the profiles in it
+DATA_FILE = "templates.bin"
+INDEX_FILE = "index.json"
+# Allowed profile names, they are sent over the serial link
+PROFILE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+
+class ProfileStore:
+    """
+    Named appearance profiles of calibrated people, kept on disk across flights.
+
+    The templates (color histogram and dominant colors) of all profiles are fixed-size records,
+    see TEMPLATE_DTYPE, appended to one data file. A small JSON index maps every name to its
+    first record and record count. Loading a profile reads the index and copies its records from
+    the memory-mapped data file, so it takes about a millisecond. Saving a name again appends new
+    records and points the index to them, the index is replaced atomically.
+    """
+
+    def __init__(self, directory=PROFILE_DIR):
+        """
+        Initialize the ProfileStore.
+
+        Args:
+            directory (str, optional): Directory of the store, created on the first save. Default is PROFILE_DIR.
+        """
+        self.directory = directory
+        self.data_path = os.path.join(directory, DATA_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.lock = threading.Lock()
+
+    def read_index(self):
+        """
+        Read the index of the profiles.
+
+        Returns:
+            dict: Per profile name its first record ("offset"), the number of records ("count") and
+            the time it was saved ("saved_at").
+        """
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def write_index(self, index):
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(index, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.index_path)
+
+    def save(self, name, gallery):
+        """
+        Save the templates of a gallery as a profile, replacing a profile of the same name.
+
+        Args:
+            name (str): Name of the profile, see PROFILE_NAME_PATTERN.
+            gallery (AppearanceGallery): The calibrated gallery.
+
+        Raises:
+            ValueError: If the name is invalid or no person is calibrated.
+        """
+        if not PROFILE_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid profile name '{name}', use up to 32 letters, digits, '_' or '-'")
+        histograms, colors = gallery.get_templates()
+        if len(histograms) == 0:
+            raise ValueError("No person is calibrated")
+        if colors.shape[1:] != (NUM_COLORS, 3):
+            raise ValueError(f"Expected {NUM_COLORS} dominant colors per template, got {colors.shape[1]}")
+
+        records = np.empty(len(histograms), dtype=TEMPLATE_DTYPE)
+        records["histogram"] = histograms
+        records["colors"] = colors
+
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.data_path, "ab") as f:
+                offset = f.tell() // TEMPLATE_DTYPE.itemsize
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            index = self.read_index()
+            index[name] = {"offset": offset, "count": len(records), "saved_at": time.time()}
+            self.write_index(index)
+
+    def load(self, name, gallery):
+        """
+        Load a profile into a gallery, replacing its templates.
+
+        Args:
+            name (str): Name of the profile.
+            gallery (AppearanceGallery): The gallery to load the templates into.
+
+        Raises:
+            KeyError: If there is no profile of that name.
+        """
+        with self.lock:
+            entry = self.read_index().get(name)
+            if entry is None:
+                raise KeyError(f"No profile '{name}'")
+            data = np.memmap(self.data_path, dtype=TEMPLATE_DTYPE, mode="r")
+            records = data[entry["offset"]:entry["offset"] + entry["count"]]
+            histograms, colors = np.array(records["histogram"]), np.array(records["colors"])
+            del data
+        gallery.set_templates(histograms, colors)
+
+    def list_profiles(self):
+        """
+        List the saved profiles.
+
+        Returns:
+            list: Name, number of templates and save time of every profile, sorted by name.
+        """
+        with self.lock:
+            index = self.read_index()
+        return [{"name": name, "templates": entry["count"], "saved_at": entry["saved_at"]}
+                for name, entry in sorted(index.items())]
@@ -0,0 +1,156 @@
+import time
+
+from .inference_scheduler import LATENCY_BUDGET, LATENCY_SMOOTHING
+from .pose_estimation import DEFAULT_MODEL_COMPLEXITY
+
+# Quality levels of the pose estimation from best to fastest: width in pixels the full frame is
+# downscaled to before inference and complexity of the pose model
+QUALITY_LEVELS = ((1280, 2), (1280, 1), (960, 1), (640, 1), (640, 0))
+# Highest model complexity used by default, the heavy model isn't shipped with MediaPipe
+MAX_MODEL_COMPLEXITY = DEFAULT_MODEL_COMPLEXITY
+# The quality is lowered when the smoothed pose latency exceeds the budget times this ratio
+DOWNGRADE_RATIO = 1.0
+# The quality is raised when the smoothed pose latency is below the budget times this ratio
+UPGRADE_RATIO = 0.6
+# Pose estimations at a level before its latency is trusted for a switch
+MIN_LEVEL_SAMPLES = 10
+# Seconds a better level that was too slow isn't tried again
+LEVEL_MEMORY = 30.0
+
+
+class QualityGovernor:
+    """
+    Adapt the inference width and the model complexity of the pose estimation to a latency budget.
+
+    The pose latency is smoothed per quality level. If it stays above the budget, the next faster
+    level is used, if it stays well below, the next better one. A level that was left for being too
+    slow isn't tried again for LEVEL_MEMORY seconds, and every level has to be measured for
+    MIN_LEVEL_SAMPLES pose estimations before the next switch, so the quality doesn't oscillate.
+    The landmarks are normalized to the frame, so a switch doesn't affect the tracking geometry.
+    """
+
+    def __init__(self, target, latency_budget=LATENCY_BUDGET, max_model_complexity=MAX_MODEL_COMPLEXITY,
+                 levels=QUALITY_LEVELS, downgrade_ratio=DOWNGRADE_RATIO, upgrade_ratio=UPGRADE_RATIO,
+                 min_level_samples=MIN_LEVEL_SAMPLES, level_memory=LEVEL_MEMORY):
+        """
+        Initialize the QualityGovernor.
+
+        Args:
+            target (object): Pose estimation with build_models(model_complexities) and
+                set_quality(inference_width, model_complexity) methods, e.g. a RoiPoseEstimator.
+            latency_budget (float, optional): Time budget for one pose estimation in seconds. Default is LATENCY_BUDGET.
+            max_model_complexity (int, optional): Highest model complexity of the levels.
+                Default is MAX_MODEL_COMPLEXITY.
+            levels (tuple, optional): Pairs of inference width and model complexity, from best to fastest.
+                Default is QUALITY_LEVELS.
+            downgrade_ratio (float, optional): Ratio of the budget above which the quality is lowered.
+            upgrade_ratio (float, optional): Ratio of the budget below which the quality is raised.
+            min_level_samples (int, optional): Pose estimations at a level before the next switch.
+            level_memory (float, optional): Seconds a level that was too slow isn't tried again.
+        """
+        self.target = target
+        self.latency_budget = latency_budget
+        self.levels = [level for level in levels if level[1] <= max_model_complexity]
+        self.downgrade_ratio = downgrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.min_level_samples = min_level_samples
+        self.level_memory = level_memory
+
+        self.level = 0
+        self.latency = None
+        self.samples = 0
+        # Time a level was left for being too slow, by level
+        self.too_slow_since = {}
+
+        self.downgrades = 0
+        self.upgrades = 0
+
+    @property
+    def inference_width(self):
+        return self.levels[self.level][0]
+
+    @property
+    def model_complexity(self):
+        return self.levels[self.level][1]
+
+    def build_models(self):
+        """
+        Build the pose models of all levels, so a switch doesn't stall the inference.
+
+        Levels whose model can't be built, e.g. because it can't be downloaded, are removed.
+        """
+        for model_complexity in sorted({level[1] for level in self.levels}, reverse=True):
+            try:
+                self.target.build_models([model_complexity])
+            except Exception as e:
+                print(f"Pose model of complexity {model_complexity} not available, it isn't used: {e}")
+                self.levels = [level for level in self.levels if level[1] != model_complexity]
+        if not self.levels:
+            raise RuntimeError("No pose model is available")
+        self.set_level(0)
+
+    def set_level(self, level):
+        """
+        Switch to a quality level and start measuring its latency.
+
+        Args:
+            level (int): Index of the level in levels.
+        """
+        self.level = level
+        self.latency = None
+        self.samples = 0
+        self.target.set_quality(self.inference_width, self.model_complexity)
+
+    def update(self, inference_time, now=None):
+        """
+        Update the governor with the duration of a pose estimation and switch the level if necessary.
+
+        Args:
+            inference_time (float): Duration of the pose estimation in seconds.
+            now (float, optional): The current time. Default is time.time().
+
+        Returns:
+            bool: True if the level was switched.
+        """
+        if now is None:
+            now = time.time()
+
+        if self.latency is None:
+            self.latency = inference_time
+        else:
+            self.latency += LATENCY_SMOOTHING * (inference_time - self.latency)
+        self.samples += 1
+        if self.samples < self.min_level_samples:
+            return False
+
+        latency = self.latency
+        if latency > self.latency_budget * self.downgrade_ratio and self.level < len(self.levels) - 1:
+            self.too_slow_since[self.level] = now
+            self.set_level(self.level + 1)
+            self.downgrades += 1
+        elif (latency < self.latency_budget * self.upgrade_ratio and self.level > 0 and
+              now - self.too_slow_since.get(self.level - 1, now - self.level_memory) >= self.level_memory):
+            self.set_level(self.level - 1)
+            self.upgrades += 1
+        else:
+            return False
+
+        print(f"Pose quality: {self.inference_width} px wide, model complexity {self.model_complexity} "
+              f"(latency {latency * 1000:.0f} ms, budget {self.latency_budget * 1000:.0f} ms)")
+        return True
+
+    def get_stats(self):
+        """
+        Get the current level and the number of switches.
+
+        Returns:
+            dict: The governor statistics.
+        """
+        return {
+            "level": self.level,
+            "inference_width": self.inference_width,
+            "model_complexity": self.model_complexity,
+            "latency": self.latency,
+            "downgrades": self.downgrades,
+            "upgrades": self.upgrades,
+        }
@@ -0,0 +1,292 @@
+import time
+
+import cv2
+import numpy as np
+
+from .pose_estimation import create_pose, TORSO_INDICES, DEFAULT_MODEL_COMPLEXITY
+
+# Padding around the bounding box of the landmarks, relative to the box size
+ROI_PADDING = 0.3
+# Side length in pixels of the square the region of interest is rescaled to
+ROI_INPUT_SIZE = 384
+# Minimum side length of the region of interest in pixels
+ROI_MIN_SIZE = 96
+# Minimum visibility of a landmark to be used for the bounding box
+LANDMARK_VISIBILITY_THRESHOLD = 0.5
+# Minimum mean visibility of the torso landmarks for an ROI result to be trusted
+ROI_MIN_CONFIDENCE = 0.6
+
+TORSO_LANDMARKS = TORSO_INDICES
+
+
+def compute_roi(landmarks, frame_width, frame_height, padding=ROI_PADDING):
+    """
+    Compute a padded, square region of interest around the visible landmarks.
+
+    Args:
+        landmarks (list): The list of pose landmarks in normalized full-frame coordinates.
+        frame_width (int): Width of the frame in pixels.
+        frame_height (int): Height of the frame in pixels.
+        padding (float, optional): Padding relative to the box size. Default is ROI_PADDING.
+
+    Returns:
+        tuple or None: The region (x_min, y_min, x_max, y_max) in pixels or None if too few landmarks are visible.
+    """
+    xs = [lm.x for lm in landmarks if lm.visibility >= LANDMARK_VISIBILITY_THRESHOLD]
+    ys = [lm.y for lm in landmarks if lm.visibility >= LANDMARK_VISIBILITY_THRESHOLD]
+    if len(xs) < len(TORSO_LANDMARKS):
+        return None
+
+    x_min, x_max = min(xs) * frame_width, max(xs) * frame_width
+    y_min, y_max = min(ys) * frame_height, max(ys) * frame_height
+
+    # Square box around the center, so the rescaling keeps the aspect ratio
+    size = max(x_max - x_min, y_max - y_min) * (1 + 2 * padding)
+    size = min(max(size, ROI_MIN_SIZE), frame_width, frame_height)
+    center_x = (x_min + x_max) / 2
+    center_y = (y_min + y_max) / 2
+
+    # Shift the box into the frame instead of cutting it
+    left = int(min(max(center_x - size / 2, 0), frame_width - size))
+    top = int(min(max(center_y - size / 2, 0), frame_height - size))
+    return left, top, left + int(size), top + int(size)
+
+
+def map_landmarks_to_frame(landmarks, roi, frame_width, frame_height):
+    """
+    Map landmarks from normalized ROI coordinates to normalized full-frame coordinates in place.
+
+    Args:
+        landmarks (list): The list of pose landmarks in normalized ROI coordinates.
+        roi (tuple): The region (x_min, y_min, x_max, y_max) in pixels.
+        frame_width (int): Width of the frame in pixels.
+        frame_height (int): Height of the frame in pixels.
+    """
+    x_min, y_min, x_max, y_max = roi
+    scale_x = (x_max - x_min) / frame_width
+    scale_y = (y_max - y_min) / frame_height
+    for lm in landmarks:
+        lm.x = lm.x * scale_x + x_min / frame_width
+        lm.y = lm.y * scale_y + y_min / frame_height
+        # z uses roughly the same scale as x
+        lm.z = lm.z * scale_x
+
+
+def torso_confidence(landmarks):
+    """
+    Calculate the mean visibility of the torso landmarks.
+
+    Args:
+        landmarks (list): The list of pose landmarks.
+
+    Returns:
+        float: The mean visibility between 0 and 1.
+    """
+    return sum(landmarks[index].visibility for index in TORSO_LANDMARKS) / len(TORSO_LANDMARKS)
+
+
+class RoiPoseEstimator:
+    """
+    Pose estimation on a crop around the person found in the previous inference.
+
+    The crop is rescaled to ROI_INPUT_SIZE before inference and the resulting landmarks are
+    mapped back to full-frame coordinates, so all downstream functions work unchanged. If no
+    person was found before or the confidence of the ROI result is too low, the full frame is
+    searched instead.
+
+    The full frame can be downscaled to an inference width before inference, the landmarks are
+    normalized, so they don't depend on the resolution.
+    """
+
+    def __init__(self, roi_enabled=True, input_size=ROI_INPUT_SIZE, min_confidence=ROI_MIN_CONFIDENCE,
+                 inference_width=None, model_complexity=DEFAULT_MODEL_COMPLEXITY):
+        """
+        Initialize the RoiPoseEstimator.
+
+        Args:
+            roi_enabled (bool, optional): Whether the ROI mode is used at all. Default is True.
+            input_size (int, optional): Side length the ROI is rescaled to. Default is ROI_INPUT_SIZE.
+            min_confidence (float, optional): Minimum torso confidence of an ROI result. Default is ROI_MIN_CONFIDENCE.
+            inference_width (int, optional): Width the full frame is downscaled to. Default is the frame width.
+            model_complexity (int, optional): Complexity of the pose model, 0, 1 or 2.
+                Default is DEFAULT_MODEL_COMPLEXITY.
+        """
+        self.roi_enabled = roi_enabled
+        self.input_size = input_size
+        self.min_confidence = min_confidence
+        self.inference_width = inference_width
+        self.model_complexity = model_complexity
+
+        # Estimators per model complexity, owned by this instance, as their tracking state belongs to one stream.
+        # The ROI estimators run in static image mode: the crop moves with the person, so landmarks tracked
+        # in the coordinates of the previous crop would be wrong in the next one
+        self.full_frame_poses = {}
+        self.roi_poses = {}
+        self.roi_input = np.empty((input_size, input_size, 3), dtype=np.uint8)
+        # Downscaled full frame, reused while the inference width doesn't change
+        self.frame_input = None
+
+        self.last_landmarks = None
+        self.last_roi = None
+
+        self.roi_inferences = 0
+        self.full_frame_inferences = 0
+        self.fallbacks = 0
+        self.roi_time = 0.0
+        self.full_frame_time = 0.0
+
+    @property
+    def roi_pose(self):
+        """
+        The ROI estimator of the current model complexity, None until it's built.
+        """
+        return self.roi_poses.get(self.model_complexity)
+
+    @property
+    def full_frame_pose(self):
+        """
+        The full-frame estimator of the current model complexity, built on first use.
+        """
+        if self.model_complexity not in self.full_frame_poses:
+            self.full_frame_poses[self.model_complexity] = create_pose(model_complexity=self.model_complexity)
+        return self.full_frame_poses[self.model_complexity]
+
+    def build_models(self, model_complexities=None):
+        """
+        Build the pose estimators, which loads MediaPipe and its models.
+
+        Args:
+            model_complexities (list, optional): Model complexities to build. Default is the current one.
+        """
+        for model_complexity in model_complexities or [self.model_complexity]:
+            if model_complexity not in self.full_frame_poses:
+                self.full_frame_poses[model_complexity] = create_pose(model_complexity=model_complexity)
+            if self.roi_enabled and model_complexity not in self.roi_poses:
+                self.roi_poses[model_complexity] = create_pose(static_image_mode=True,
+                                                               model_complexity=model_complexity)
+
+    def set_quality(self, inference_width, model_complexity):
+        """
+        Change the inference width of the full frame and the model complexity.
+
+        Args:
+            inference_width (int or None): Width the full frame is downscaled to, None for the frame width.
+            model_complexity (int): Complexity of the pose model, 0, 1 or 2.
+        """
+        self.inference_width = inference_width
+        self.model_complexity = model_complexity
+
+    def warm_up(self, frame_rgb):
+        """
+        Run one inference per estimator, so the first frame isn't slowed down by their initialization.
+
+        The inference statistics aren't updated.
+
+        Args:
+            frame_rgb (numpy.ndarray): A dummy RGB frame image.
+        """
+        self.build_models()
+        self.full_frame_pose.process(frame_rgb)
+        if self.roi_pose is not None:
+            self.roi_pose.process(self.roi_input)
+
+    def process(self, frame_rgb):
+        """
+        Estimate the pose, in the ROI around the last known person if possible.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+
+        Returns:
+            mediapipe.python.solution_base.SolutionOutputs: The pose results in full-frame coordinates.
+        """
+        frame_height, frame_width = frame_rgb.shape[:2]
+        roi = None
+        if self.roi_enabled and self.last_landmarks is not None:
+            roi = compute_roi(self.last_landmarks, frame_width, frame_height)
+
+        pose_results = None
+        if roi is not None:
+            pose_results = self.process_roi(frame_rgb, roi)
+            if pose_results is None:
+                self.fallbacks += 1
+
+        if pose_results is None:
+            pose_results = self.process_full_frame(frame_rgb)
+            roi = None
+
+        self.last_roi = roi
+        self.last_landmarks = pose_results.pose_landmarks.landmark if pose_results.pose_landmarks else None
+        return pose_results
+
+    def process_roi(self, frame_rgb, roi):
+        """
+        Estimate the pose on the rescaled ROI.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+            roi (tuple): The region (x_min, y_min, x_max, y_max) in pixels.
+
+        Returns:
+            mediapipe.python.solution_base.SolutionOutputs or None: The results or None if the confidence is too low.
+        """
+        if self.roi_pose is None:
+            self.roi_poses[self.model_complexity] = create_pose(static_image_mode=True,
+                                                                model_complexity=self.model_complexity)
+
+        start_time = time.perf_counter()
+        x_min, y_min, x_max, y_max = roi
+        cv2.resize(frame_rgb[y_min:y_max, x_min:x_max], (self.input_size, self.input_size),
+                   dst=self.roi_input, interpolation=cv2.INTER_AREA)
+        pose_results = self.roi_pose.process(self.roi_input)
+        self.roi_time += time.perf_counter() - start_time
+        self.roi_inferences += 1
+
+        if not pose_results.pose_landmarks:
+            return None
+        landmarks = pose_results.pose_landmarks.landmark
+        if torso_confidence(landmarks) < self.min_confidence:
+            return None
+
+        frame_height, frame_width = frame_rgb.shape[:2]
+        map_landmarks_to_frame(landmarks, roi, frame_width, frame_height)
+        return pose_results
+
+    def process_full_frame(self, frame_rgb):
+        """
+        Estimate the pose on the full frame, downscaled to the inference width.
+
+        Args:
+            frame_rgb (numpy.ndarray): The RGB frame image.
+
+        Returns:
+            mediapipe.python.solution_base.SolutionOutputs: The pose results.
+        """
+        start_time = time.perf_counter()
+        frame_height, frame_width = frame_rgb.shape[:2]
+        if self.inference_width is not None and self.inference_width < frame_width:
+            shape = (round(frame_height * self.inference_width / frame_width), self.inference_width, 3)
+            if self.frame_input is None or self.frame_input.shape != shape:
+                self.frame_input = np.empty(shape, dtype=np.uint8)
+            cv2.resize(frame_rgb, (shape[1], shape[0]), dst=self.frame_input, interpolation=cv2.INTER_AREA)
+            frame_rgb = self.frame_input
+        pose_results = self.full_frame_pose.process(frame_rgb)
+        self.full_frame_time += time.perf_counter() - start_time
+        self.full_frame_inferences += 1
+        return pose_results
+
+    def get_stats(self):
+        """
+        Get the number of inferences and the average inference time per mode.
+
+        Returns:
+            dict: The inference statistics.
+        """
+        return {
+            "roi_inferences": self.roi_inferences,
+            "full_frame_inferences": self.full_frame_inferences,
+            "fallbacks": self.fallbacks,
+            "avg_roi_time": self.roi_time / self.roi_inferences if self.roi_inferences else None,
+            "avg_full_frame_time": (self.full_frame_time / self.full_frame_inferences
+                                    if self.full_frame_inferences else None),
+        }
@@ -0,0 +1,160 @@
+import threading
+
+import numpy as np
+
+# Process noise (acceleration variance) of the constant-velocity model, per signal. The shoulder
+# position is normalized to the frame size, the values correspond to 2000 px²/s⁴ in the 720p video
+SHOULDER_X_PROCESS_NOISE = 2000.0 / 1280 ** 2
+SHOULDER_Y_PROCESS_NOISE = 2000.0 / 720 ** 2
+TORSO_PROCESS_NOISE = 0.05
+# Measurement noise (variance) of the pose estimation, per signal, 100 px² for the shoulder position
+SHOULDER_X_MEASUREMENT_NOISE = 100.0 / 1280 ** 2
+SHOULDER_Y_MEASUREMENT_NOISE = 100.0 / 720 ** 2
+TORSO_MEASUREMENT_NOISE = 0.001
+# Predictions are not extrapolated further than this many seconds past the last measurement
+MAX_EXTRAPOLATION = 0.5
+
+
+class ConstantVelocityKalman:
+    """
+    Kalman filter for one signal with a constant-velocity state model (position, velocity).
+
+    Measurements are applied at the time their frame was captured, so the age of a measurement
+    is compensated when the state is predicted to the current time.
+    """
+
+    def __init__(self, process_noise, measurement_noise):
+        """
+        Initialize the ConstantVelocityKalman.
+
+        Args:
+            process_noise (float): Variance of the acceleration.
+            measurement_noise (float): Variance of a measurement.
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.state = None
+        self.covariance = None
+        self.timestamp = None
+
+    def reset(self):
+        self.state = None
+        self.covariance = None
+        self.timestamp = None
+
+    def propagate(self, timestamp):
+        """
+        Get the state and covariance predicted to a point in time.
+
+        Args:
+            timestamp (float): The point in time.
+
+        Returns:
+            tuple: The predicted state and covariance.
+        """
+        dt = timestamp - self.timestamp
+        transition = np.array([[1.0, dt], [0.0, 1.0]])
+        noise = self.process_noise * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+        return transition @ self.state, transition @ self.covariance @ transition.T + noise
+
+    def update(self, measurement, timestamp):
+        """
+        Apply a measurement.
+
+        Args:
+            measurement (float): The measured position.
+            timestamp (float): Capture time of the frame the measurement belongs to.
+        """
+        if self.state is None:
+            self.state = np.array([measurement, 0.0])
+            self.covariance = np.diag([self.measurement_noise, self.measurement_noise * 100])
+            self.timestamp = timestamp
+            return
+
+        # Measurements older than the state are applied as if they were current
+        state, covariance = self.propagate(max(timestamp, self.timestamp))
+        innovation = measurement - state[0]
+        innovation_variance = covariance[0, 0] + self.measurement_noise
+        gain = covariance[:, 0] / innovation_variance
+
+        self.state = state + gain * innovation
+        self.covariance = covariance - np.outer(gain, covariance[0, :])
+        self.timestamp = max(timestamp, self.timestamp)
+
+    def predict(self, timestamp):
+        """
+        Predict the position at a point in time without changing the filter.
+
+        Args:
+            timestamp (float): The point in time.
+
+        Returns:
+            float or None: The predicted position or None if no measurement was applied yet.
+        """
+        if self.state is None:
+            return None
+        dt = min(max(timestamp - self.timestamp, 0.0), MAX_EXTRAPOLATION)
+        return float(self.state[0] + self.state[1] * dt)
+
+
+class TrackState:
+    """
+    Predicted shoulder position and torso size of the tracked person, fed by sparse pose measurements.
+
+    The shoulder position is in coordinates normalized to the frame size, independent of the
+    resolution pose estimation runs on.
+    """
+
+    def __init__(self):
+        self.shoulder_x = ConstantVelocityKalman(SHOULDER_X_PROCESS_NOISE, SHOULDER_X_MEASUREMENT_NOISE)
+        self.shoulder_y = ConstantVelocityKalman(SHOULDER_Y_PROCESS_NOISE, SHOULDER_Y_MEASUREMENT_NOISE)
+        self.torso_size = ConstantVelocityKalman(TORSO_PROCESS_NOISE, TORSO_MEASUREMENT_NOISE)
+        self.lock = threading.Lock()
+        self.last_measurement_time = None
+
+    def reset(self):
+        """
+        Forget the tracked person.
+        """
+        with self.lock:
+            self.shoulder_x.reset()
+            self.shoulder_y.reset()
+            self.torso_size.reset()
+            self.last_measurement_time = None
+
+    def update(self, timestamp, avg_shoulder_x, avg_shoulder_y, torso_size):
+        """
+        Apply a pose measurement.
+
+        Args:
+            timestamp (float): Capture time of the frame the pose was estimated on.
+            avg_shoulder_x (float): The average X-coordinate of the shoulders.
+            avg_shoulder_y (float): The average Y-coordinate of the shoulders.
+            torso_size (float): The detected size of the torso.
+        """
+        with self.lock:
+            self.shoulder_x.update(avg_shoulder_x, timestamp)
+            self.shoulder_y.update(avg_shoulder_y, timestamp)
+            self.torso_size.update(torso_size, timestamp)
+            self.last_measurement_time = timestamp
+
+    def predict(self, timestamp, max_age=None):
+        """
+        Predict the shoulder position and torso size.
+
+        Args:
+            timestamp (float): The point in time.
+            max_age (float, optional): Seconds the last measurement may be older than the point in time.
+                Default is no limit.
+
+        Returns:
+            tuple or None: The predicted shoulder X and Y coordinates and torso size or None without a
+            (recent enough) measurement.
+        """
+        with self.lock:
+            if self.last_measurement_time is None:
+                return None
+            if max_age is not None and timestamp - self.last_measurement_time > max_age:
+                return None
+            return (self.shoulder_x.predict(timestamp), self.shoulder_y.predict(timestamp),
+                    self.torso_size.predict(timestamp))
@@ -0,0 +1,270 @@
+import math
+
+import numpy as np
+
+# Number of measurements that are averaged by the moving average filter
+FILTER_SIZE = 3
+# Smoothing factor of the exponential filter, higher values follow new measurements faster
+EXPONENTIAL_ALPHA = 0.5
+# One-euro filter: minimum cutoff frequency in Hz, speed coefficient and cutoff frequency of the derivative
+ONE_EURO_MIN_CUTOFF = 1.0
+ONE_EURO_BETA = 0.01
+ONE_EURO_DERIVATIVE_CUTOFF = 1.0
+# Speed coefficients of the one-euro filter of a track: shoulder X and Y are normalized to the frame size,
+# their coefficients correspond to ONE_EURO_BETA per pixel of the 720p video
+TRACK_ONE_EURO_BETA = (ONE_EURO_BETA * 1280, ONE_EURO_BETA * 720, ONE_EURO_BETA)
+# Time step in seconds assumed by the one-euro filter if no timestamps are given
+DEFAULT_TIME_STEP = 1 / 30
+
+FILTER_TYPES = ("moving_average", "exponential", "one_euro")
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of the last measurement vectors with a running sum.
+    """
+
+    def __init__(self, size, dims):
+        """
+        Initialize the RingBuffer.
+
+        Args:
+            size (int): Maximum number of stored vectors.
+            dims (int): Length of a vector.
+        """
+        self.values = np.zeros((size, dims))
+        self.total = np.zeros(dims)
+        self.index = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def reset(self):
+        self.values[:] = 0
+        self.total[:] = 0
+        self.index = 0
+        self.count = 0
+
+    def push(self, value):
+        """
+        Store a vector, replacing the oldest one if the buffer is full.
+
+        Args:
+            value (numpy.ndarray): The vector.
+        """
+        self.total += value - self.values[self.index]
+        self.values[self.index] = value
+        self.index += 1
+        if self.index == len(self.values):
+            self.index = 0
+            # Recompute the sum once per pass to avoid accumulating rounding errors
+            self.total = self.values.sum(axis=0)
+        self.count = min(self.count + 1, len(self.values))
+
+    def mean(self):
+        """
+        Get the mean of the stored vectors.
+
+        Returns:
+            numpy.ndarray: The mean vector.
+        """
+        return self.total / self.count
+
+
+class MovingAverageFilter:
+    """
+    Average of the last measurements.
+    """
+
+    def __init__(self, dims, size=FILTER_SIZE):
+        self.buffer = RingBuffer(size, dims)
+
+    def reset(self):
+        self.buffer.reset()
+
+    def update(self, value, timestamp=None):
+        """
+        Apply a measurement.
+
+        Args:
+            value (numpy.ndarray): The measured vector.
+            timestamp (float, optional): Capture time of the measurement, unused.
+
+        Returns:
+            numpy.ndarray: The filtered vector.
+        """
+        self.buffer.push(value)
+        return self.buffer.mean()
+
+
+class ExponentialFilter:
+    """
+    Exponentially weighted moving average of the measurements.
+    """
+
+    def __init__(self, dims, alpha=EXPONENTIAL_ALPHA):
+        self.alpha = alpha
+        self.value = None
+
+    def reset(self):
+        self.value = None
+
+    def update(self, value, timestamp=None):
+        """
+        Apply a measurement.
+
+        Args:
+            value (numpy.ndarray): The measured vector.
+            timestamp (float, optional): Capture time of the measurement, unused.
+
+        Returns:
+            numpy.ndarray: The filtered vector.
+        """
+        if self.value is None:
+            self.value = np.array(value, dtype=float)
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value.copy()
+
+
+def smoothing_factor(time_step, cutoff):
+    """
+    Get the smoothing factor of an exponential filter with the given cutoff frequency.
+
+    Args:
+        time_step (float): Seconds since the last measurement.
+        cutoff (float or numpy.ndarray): The cutoff frequency in Hz.
+
+    Returns:
+        float or numpy.ndarray: The smoothing factor.
+    """
+    r = 2 * math.pi * cutoff * time_step
+    return r / (r + 1)
+
+
+class OneEuroFilter:
+    """
+    One-euro filter: an exponential filter whose cutoff frequency rises with the speed of the signal,
+    so slow movements are smoothed strongly and fast movements are followed with little lag.
+    """
+
+    def __init__(self, dims, min_cutoff=ONE_EURO_MIN_CUTOFF, beta=ONE_EURO_BETA,
+                 derivative_cutoff=ONE_EURO_DERIVATIVE_CUTOFF):
+        """
+        Initialize the OneEuroFilter.
+
+        Args:
+            dims (int): Length of a measurement vector.
+            min_cutoff (float, optional): Cutoff frequency in Hz at rest. Default is ONE_EURO_MIN_CUTOFF.
+            beta (float or tuple, optional): Increase of the cutoff frequency with the speed, one value for
+                all or one per element of the vector. Default is ONE_EURO_BETA.
+            derivative_cutoff (float, optional): Cutoff frequency in Hz of the speed estimation.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = np.asarray(beta, dtype=float)
+        self.derivative_cutoff = derivative_cutoff
+        self.value = None
+        self.derivative = np.zeros(dims)
+        self.timestamp = None
+
+    def reset(self):
+        self.value = None
+        self.derivative[:] = 0
+        self.timestamp = None
+
+    def update(self, value, timestamp=None):
+        """
+        Apply a measurement.
+
+        Args:
+            value (numpy.ndarray): The measured vector.
+            timestamp (float, optional): Capture time of the measurement. Without timestamps,
+                measurements are assumed to be DEFAULT_TIME_STEP apart.
+
+        Returns:
+            numpy.ndarray: The filtered vector.
+        """
+        if self.value is None:
+            self.value = np.array(value, dtype=float)
+            self.timestamp = timestamp
+            return self.value.copy()
+
+        time_step = DEFAULT_TIME_STEP
+        if timestamp is not None and self.timestamp is not None and timestamp > self.timestamp:
+            time_step = timestamp - self.timestamp
+        self.timestamp = timestamp
+
+        derivative = (value - self.value) / time_step
+        self.derivative += smoothing_factor(time_step, self.derivative_cutoff) * (derivative - self.derivative)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.derivative)
+        self.value += smoothing_factor(time_step, cutoff) * (value - self.value)
+        return self.value.copy()
+
+
+def create_filter(filter_type, dims, one_euro_beta=ONE_EURO_BETA):
+    """
+    Create a filter by name.
+
+    Args:
+        filter_type (str): One of FILTER_TYPES.
+        dims (int): Length of a measurement vector.
+        one_euro_beta (float or tuple, optional): Speed coefficient of the one-euro filter. Default is ONE_EURO_BETA.
+
+    Returns:
+        object: The filter.
+
+    Raises:
+        ValueError: If the filter type is unknown.
+    """
+    if filter_type == "moving_average":
+        return MovingAverageFilter(dims)
+    if filter_type == "exponential":
+        return ExponentialFilter(dims)
+    if filter_type == "one_euro":
+        return OneEuroFilter(dims, beta=one_euro_beta)
+    raise ValueError(f"Unknown filter type '{filter_type}', expected one of {', '.join(FILTER_TYPES)}")
+
+
+class TrackFilter:
+    """
+    Filter state of one tracked person: shoulder position and torso size are filtered together.
+
+    The shoulder position is in coordinates normalized to the frame size.
+    """
+
+    def __init__(self, filter_type="moving_average"):
+        """
+        Initialize the TrackFilter.
+
+        Args:
+            filter_type (str, optional): One of FILTER_TYPES. Default is "moving_average".
+        """
+        self.filter = create_filter(filter_type, 3, TRACK_ONE_EURO_BETA)
+        self.measurement = np.zeros(3)
+
+    def reset(self):
+        """
+        Forget the measurements, e.g. when a new person is tracked.
+        """
+        self.filter.reset()
+
+    def update(self, avg_shoulder_x, avg_shoulder_y, torso_size, timestamp=None):
+        """
+        Apply a measurement.
+
+        Args:
+            avg_shoulder_x (float): The average X-coordinate of the shoulders.
+            avg_shoulder_y (float): The average Y-coordinate of the shoulders.
+            torso_size (float): The torso size.
+            timestamp (float, optional): Capture time of the frame.
+
+        Returns:
+            tuple: The filtered shoulder X and Y coordinates and torso size.
+        """
+        self.measurement[0] = avg_shoulder_x
+        self.measurement[1] = avg_shoulder_y
+        self.measurement[2] = torso_size
+        avg_shoulder_x, avg_shoulder_y, torso_size = self.filter.update(self.measurement, timestamp)
+        return float(avg_shoulder_x), float(avg_shoulder_y), float(torso_size)
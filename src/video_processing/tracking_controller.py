@@ -0,0 +1,156 @@
+import threading
+import time
+
+from .drone_tracking import adjust_drone
+from .state_estimation import TrackState
+
+# Rate in Hz at which commands are sent to the drone
+CONTROL_RATE = 20.0
+# Seconds after the last pose measurement until the controller stops sending commands
+MAX_MEASUREMENT_AGE = 1.0
+
+
+class TrackingController:
+    """
+    Send tracking commands to the drone at a fixed rate.
+
+    Pose measurements arrive sparsely from the inference stage and are fed into a
+    constant-velocity Kalman state. On every control tick, shoulder position and torso size are
+    predicted to the current time, compensating the age of the last measurement, and the drone
+    is adjusted accordingly. Without a current measurement of the followed person, the sticks are
+    released.
+    """
+
+    def __init__(self, mixer, rate=CONTROL_RATE, max_measurement_age=MAX_MEASUREMENT_AGE, latency_tracker=None,
+                 histogram=None):
+        """
+        Initialize the TrackingController.
+
+        Args:
+            mixer (CommandMixer): Combines the axes into the stick state of the drone.
+            rate (float, optional): Command rate in Hz. Default is CONTROL_RATE.
+            max_measurement_age (float, optional): Seconds without measurement until commands stop.
+            latency_tracker (LatencyTracker, optional): Records the glass-to-command latency of every measurement.
+            histogram (LatencyHistogram, optional): Records the duration of every control tick.
+        """
+        self.mixer = mixer
+        self.period = 1.0 / rate
+        self.max_measurement_age = max_measurement_age
+        self.latency_tracker = latency_tracker
+        self.histogram = histogram
+
+        self.state = TrackState()
+        self.active = True
+        self.follow = False
+        self.running = False
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        # Capture time of the measurement whose latency was not recorded yet
+        self.pending_latency_time = None
+        self.ticks = 0
+        self.commands = 0
+        self.overruns = 0
+
+    def start(self):
+        """
+        Start the control thread.
+        """
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop the control thread.
+        """
+        self.running = False
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def set_active(self, active):
+        """
+        Activate or deactivate the tracking.
+
+        Args:
+            active (bool): Whether commands should be sent.
+        """
+        self.active = active
+        if not active:
+            self.state.reset()
+
+    def update_measurement(self, timestamp, avg_shoulder_x, avg_shoulder_y, torso_size, follow=True):
+        """
+        Feed a pose measurement into the state model.
+
+        Args:
+            timestamp (float): Capture time of the frame the pose was estimated on.
+            avg_shoulder_x (float): The average X-coordinate of the shoulders.
+            avg_shoulder_y (float): The average Y-coordinate of the shoulders.
+            torso_size (float): The detected size of the torso.
+            follow (bool, optional): Whether the person was recognized and should be followed. Default is True.
+        """
+        self.follow = follow
+        if not follow:
+            return
+        self.state.update(timestamp, avg_shoulder_x, avg_shoulder_y, torso_size)
+        self.pending_latency_time = timestamp
+
+    def tick(self, now=None):
+        """
+        Send one command based on the predicted state.
+
+        Args:
+            now (float, optional): The current time. Default is time.time().
+
+        Returns:
+            bool: True if the drone was adjusted.
+        """
+        if now is None:
+            now = time.time()
+        self.ticks += 1
+
+        # Checked and predicted under the lock of the state, which may be reset by set_active meanwhile
+        prediction = self.state.predict(now, self.max_measurement_age) if self.active and self.follow else None
+        if prediction is None:
+            self.mixer.release()
+            return False
+
+        avg_shoulder_x, avg_shoulder_y, torso_size = prediction
+        if not adjust_drone(self.mixer, avg_shoulder_x, avg_shoulder_y, torso_size):
+            self.mixer.release()
+            return False
+
+        self.commands += 1
+        pending_latency_time = self.pending_latency_time
+        if pending_latency_time is not None and self.latency_tracker is not None:
+            self.latency_tracker.record(pending_latency_time, now)
+            self.pending_latency_time = None
+        return True
+
+    def run(self):
+        """
+        Run the control loop at the fixed rate until the controller is stopped.
+        """
+        next_tick = time.monotonic()
+        while self.running:
+            tick_start = time.perf_counter()
+            try:
+                self.tick()
+            except Exception as e:
+                # The drone must not keep flying on the last sticks, the next tick tries again
+                self.mixer.release()
+                print(f"Tracking control tick failed: {e}")
+            if self.histogram is not None:
+                self.histogram.record(time.perf_counter() - tick_start)
+
+            next_tick += self.period
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Skip missed ticks instead of sending a burst of commands
+                self.overruns += 1
+                next_tick = time.monotonic()
+                delay = 0
+            self.stop_event.wait(delay)
@@ -0,0 +1,268 @@
+import collections
+import threading
+import time
+
+# Threading of the H.264 decoder: slice threading decodes the parts of one frame in parallel without
+# delaying it, frame threading has more throughput but holds back one frame per thread
+DECODE_THREAD_TYPE = "SLICE"
+# Number of decoder threads, 0 lets FFmpeg choose by the number of CPU cores
+DECODE_THREAD_COUNT = 0
+# Demuxed packets waiting for the decoder from which non-reference frames are skipped
+SKIP_DEPTH = 3
+# Waiting packets up to which non-reference frames are decoded again
+RESUME_DEPTH = 1
+# Waiting packets from which the decoder jumps to the newest waiting keyframe
+FLUSH_DEPTH = 10
+# Maximum number of waiting packets, the demuxer waits for the decoder when it's reached
+PACKET_QUEUE_SIZE = 120
+# Seconds the decoder waits for a packet before checking whether it should stop
+PACKET_TIMEOUT = 0.1
+
+
+class VideoIngest:
+    """
+    Demux and decode the video stream with a bounded delay.
+
+    The stream is demuxed on an own thread into a packet queue, so the number of waiting packets
+    shows how far decoding is behind the stream. The decoder uses FFmpeg's low-delay mode and slice
+    threading. When it falls behind, non-reference frames, which no other frame depends on, are
+    skipped until the queue is drained. If that isn't enough, all packets before the newest waiting
+    keyframe are dropped and decoding continues from the keyframe.
+    """
+
+    def __init__(self, thread_type=DECODE_THREAD_TYPE, thread_count=DECODE_THREAD_COUNT, low_delay=True,
+                 catch_up=True, pace=False, skip_depth=SKIP_DEPTH, resume_depth=RESUME_DEPTH,
+                 flush_depth=FLUSH_DEPTH, queue_size=PACKET_QUEUE_SIZE, histogram=None, recorder=None):
+        """
+        Initialize the VideoIngest.
+
+        Args:
+            thread_type (str, optional): Decoder threading, one of "NONE", "SLICE", "FRAME" and "AUTO".
+                Default is DECODE_THREAD_TYPE.
+            thread_count (int, optional): Number of decoder threads, 0 for automatic. Default is DECODE_THREAD_COUNT.
+            low_delay (bool, optional): Output every frame as soon as it's decoded. Default is True.
+            catch_up (bool, optional): Skip frames when decoding falls behind. Without, every frame is
+                decoded, e.g. to replay a video frame by frame. Default is True.
+            pace (bool, optional): Release the packets of a recorded video at their decoding time, like
+                a live stream. Default is False.
+            skip_depth (int, optional): Waiting packets from which non-reference frames are skipped.
+                Default is SKIP_DEPTH.
+            resume_depth (int, optional): Waiting packets up to which all frames are decoded again.
+                Default is RESUME_DEPTH.
+            flush_depth (int, optional): Waiting packets from which the decoder jumps to the newest
+                keyframe. Default is FLUSH_DEPTH.
+            queue_size (int, optional): Maximum number of waiting packets. Default is PACKET_QUEUE_SIZE.
+            histogram (LatencyHistogram, optional): Records the decoding time of every packet.
+            recorder (FlightRecorder, optional): Records every demuxed packet, also the skipped ones.
+        """
+        self.thread_type = thread_type
+        self.thread_count = thread_count
+        self.low_delay = low_delay
+        self.catch_up = catch_up
+        self.pace = pace
+        self.skip_depth = skip_depth
+        self.resume_depth = resume_depth
+        self.flush_depth = flush_depth
+        self.queue_size = queue_size
+        self.histogram = histogram
+        self.recorder = recorder
+
+        self.packets = collections.deque()
+        self.condition = threading.Condition()
+        self.demux_thread = None
+        self.demux_finished = False
+        self.running = False
+        self.skipping = False
+
+        # Packets read from the stream, the number of every packet is passed on to its frame
+        self.demuxed_packets = 0
+        self.decoded_packets = 0
+        self.decoded_frames = 0
+        # Packets dropped before a keyframe and the number of jumps to a keyframe
+        self.flushed_packets = 0
+        self.flushes = 0
+        self.max_depth = 0
+
+    def start(self, container):
+        """
+        Configure the decoder of the container's video stream and start demuxing.
+
+        Args:
+            container (av.container.InputContainer): The opened video stream.
+        """
+        from av.codec.context import Flags, Flags2
+
+        self.stream = container.streams.video[0]
+        codec_context = self.stream.codec_context
+        codec_context.thread_type = self.thread_type
+        codec_context.thread_count = self.thread_count
+        # Pass the packet numbers on to the frames
+        codec_context.flags |= Flags.copy_opaque
+        if self.low_delay:
+            codec_context.flags |= Flags.low_delay
+            codec_context.flags2 |= Flags2.fast
+
+        if self.recorder is not None:
+            self.recorder.start(self.stream)
+
+        self.running = True
+        self.demux_thread = threading.Thread(target=self.demux, args=(container,), daemon=True)
+        self.demux_thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def demux(self, container):
+        """
+        Demux thread: read the packets of the video stream into the queue.
+
+        Args:
+            container (av.container.InputContainer): The opened video stream.
+        """
+        import av
+
+        playback_start = None
+        try:
+            for packet in container.demux(self.stream):
+                if packet.dts is None and packet.size == 0:
+                    # Empty packet at the end of the stream
+                    continue
+                if self.pace and packet.dts is not None:
+                    # Release the packets of a recorded video at their decoding time
+                    packet_time = float(packet.dts * packet.time_base)
+                    if playback_start is None:
+                        playback_start = time.time() - packet_time
+                    time.sleep(max(playback_start + packet_time - time.time(), 0))
+
+                packet.opaque = self.demuxed_packets
+                self.demuxed_packets += 1
+                if self.recorder is not None:
+                    self.recorder.record_packet(packet)
+                with self.condition:
+                    while self.running and len(self.packets) >= self.queue_size:
+                        self.condition.wait(PACKET_TIMEOUT)
+                    if not self.running:
+                        break
+                    self.packets.append(packet)
+                    self.condition.notify_all()
+        except av.error.FFmpegError as e:
+            print(f"Reading the video stream failed: {e}")
+        finally:
+            with self.condition:
+                self.demux_finished = True
+                self.condition.notify_all()
+
+    def next_packet(self):
+        """
+        Wait for the next packet to decode, after skipping ahead if decoding is behind.
+
+        Returns:
+            av.packet.Packet or None: The packet, None at the end of the stream or if the ingest was stopped.
+        """
+        with self.condition:
+            while self.running and not self.packets and not self.demux_finished:
+                self.condition.wait(PACKET_TIMEOUT)
+            if not self.running or not self.packets:
+                return None
+
+            depth = len(self.packets)
+            self.max_depth = max(self.max_depth, depth)
+            if self.catch_up and depth >= self.flush_depth:
+                self.flush_to_keyframe()
+            packet = self.packets.popleft()
+            # The demuxer may wait for free space
+            self.condition.notify_all()
+
+        if self.catch_up:
+            self.update_skipping(len(self.packets))
+        return packet
+
+    def flush_to_keyframe(self):
+        """
+        Drop the waiting packets before the newest waiting keyframe, must be called with the condition held.
+        """
+        for index in range(len(self.packets) - 1, 0, -1):
+            if self.packets[index].is_keyframe:
+                break
+        else:
+            # No keyframe to jump to, skipping non-reference frames has to do
+            return
+
+        for _ in range(index):
+            self.packets.popleft()
+        self.flushed_packets += index
+        self.flushes += 1
+        # Drop the reference frames of the skipped packets, decoding restarts at the keyframe
+        self.stream.codec_context.flush_buffers()
+
+    def update_skipping(self, depth):
+        """
+        Skip non-reference frames while the queue is deeper than skip_depth, until it's drained to resume_depth.
+
+        Args:
+            depth (int): Number of waiting packets.
+        """
+        if not self.skipping and depth >= self.skip_depth:
+            self.skipping = True
+            self.stream.codec_context.skip_frame = "NONREF"
+        elif self.skipping and depth <= self.resume_depth:
+            self.skipping = False
+            self.stream.codec_context.skip_frame = "DEFAULT"
+
+    def frames(self):
+        """
+        Decode the frames of the stream.
+
+        Yields:
+            av.video.frame.VideoFrame: The decoded frames, in presentation order. The opaque attribute
+                of a frame is the number of its packet in the stream, in decoding order.
+        """
+        while True:
+            packet = self.next_packet()
+            if packet is None:
+                break
+            decode_start = time.perf_counter()
+            frames = self.stream.codec_context.decode(packet)
+            if self.histogram is not None:
+                self.histogram.record(time.perf_counter() - decode_start)
+            self.decoded_packets += 1
+            for frame in frames:
+                self.decoded_frames += 1
+                yield frame
+
+        if self.running:
+            # Frames held back by the decoder at the end of the stream
+            for frame in self.stream.codec_context.decode(None):
+                # Without a packet, the time base isn't set by the decoder
+                frame.time_base = self.stream.time_base
+                self.decoded_frames += 1
+                yield frame
+
+    @property
+    def skipped_frames(self):
+        """
+        Number of decoded packets that gave no frame, i.e. the skipped non-reference frames.
+
+        While the stream is decoded, this includes the frames the decoder holds back for reordering.
+        """
+        return self.decoded_packets - self.decoded_frames
+
+    def get_stats(self):
+        """
+        Get the number of decoded and skipped frames and the queue depth.
+
+        Returns:
+            dict: The ingest statistics.
+        """
+        return {
+            "demuxed_packets": self.demuxed_packets,
+            "decoded_packets": self.decoded_packets,
+            "decoded_frames": self.decoded_frames,
+            "skipped_frames": self.skipped_frames,
+            "flushed_packets": self.flushed_packets,
+            "flushes": self.flushes,
+            "packet_queue_depth": len(self.packets),
+            "max_packet_queue_depth": self.max_depth,
+        }
@@ -1,154 +1,596 @@
-import av
 import cv2
-import mediapipe as mp
 import numpy as np
+import threading
 import time
 import warnings
 
-from .pose_estimation import pose, calculate_torso_size, mp_drawing, calculate_avg_coordinates
-from .person_color_detection import check_person_similarity, calibrate_colors
-from .drone_tracking import track_person
+from metrics import MetricsRegistry
+from .pose_estimation import (calculate_torso_size, draw_landmarks, calculate_avg_coordinates, landmarks_to_array,
+                              load_mediapipe)
+from .person_color_detection import calibrate_colors, warm_up_color_engine
+from .utils import get_frame_height, get_frame_width
+from .model_warmup import ModelWarmup
+from .video_ingest import VideoIngest, DECODE_THREAD_TYPE, DECODE_THREAD_COUNT
+from .drone_tracking import track_person, should_follow
+from .frame_pipeline import FramePacket, LatestFrameSlot, LatencyTracker
+from .frame_conversion import FrameConverter, bgr_view
+from .inference_scheduler import InferenceScheduler, LATENCY_BUDGET
+from .quality_governor import QualityGovernor, MAX_MODEL_COMPLEXITY
+from .roi_pose import RoiPoseEstimator
+from .appearance_gallery import AppearanceGallery
+from .appearance_worker import AppearanceWorker
+from .profile_store import ProfileStore
+from .multi_person import MultiPersonTracker, create_person_detector
+from .tracking_controller import TrackingController, CONTROL_RATE
+from .track_filters import TrackFilter
+from .command_mixer import CommandMixer
+
+# Seconds between two pipeline reports on the console
+PIPELINE_REPORT_INTERVAL = 10.0
+# Seconds a stage waits for a new frame before checking whether it should stop
+STAGE_TIMEOUT = 0.1
+# Maximum number of displayed frames per second
+DISPLAY_FPS = 15.0
+# Pipeline stages whose processing time is recorded
+PIPELINE_STAGES = ("decode", "conversion", "pose", "similarity", "control", "display")
 
 
 class VideoProcessor:
-    def __init__(self, drone_controller):
+    def __init__(self, drone_controller, scheduler=None, scheduler_log_path=None, roi_mode=False,
+                 multi_person=False, control_rate=CONTROL_RATE, filter_type="moving_average", headless=False,
+                 display_fps=DISPLAY_FPS, pace_playback=False, drop_frames=True, metrics=None,
+                 decode_thread_type=DECODE_THREAD_TYPE, decode_thread_count=DECODE_THREAD_COUNT, recorder=None,
+                 pose_budget=LATENCY_BUDGET, adaptive_quality=True, max_model_complexity=MAX_MODEL_COMPLEXITY,
+                 worker_pool=None, session_name=None, profile_store=None, person_detector="hog", landmarker_model=None):
         """
         Initialize the VideoProcessor with a drone controller.
 
         Args:
             drone_controller (object): The drone controller object.
+            scheduler (InferenceScheduler, optional): Decides on which frames inference runs.
+            scheduler_log_path (str, optional): File the scheduler decisions are written to at the end.
+            roi_mode (bool, optional): Run pose estimation on a crop around the last known person. Default is False.
+            multi_person (bool, optional): Select the target among several people by appearance. Default is False.
+            control_rate (float, optional): Rate in Hz of the tracking commands. Default is CONTROL_RATE.
+                With None, the drone is adjusted directly after every pose estimation.
+            filter_type (str, optional): Filter for shoulder position and torso size, one of FILTER_TYPES.
+                Default is "moving_average".
+            headless (bool, optional): Don't render or display frames, the drone is controlled over serial
+                and keyboard only. Default is False.
+            display_fps (float, optional): Maximum number of displayed frames per second. Default is DISPLAY_FPS.
+            pace_playback (bool, optional): Decode a recorded video at its frame rate, like a live stream.
+                Default is False.
+            drop_frames (bool, optional): Drop frames the inference stage is too slow for and skip decoding
+                frames when the decoder falls behind. With False, the decode stage decodes every frame and waits
+                for the inference stage, e.g. to replay a video frame by frame. Default is True.
+            metrics (MetricsRegistry, optional): Registry of the stage timings and counters. Default is an own registry.
+            decode_thread_type (str, optional): Threading of the decoder, see VideoIngest. Default is DECODE_THREAD_TYPE.
+            decode_thread_count (int, optional): Number of decoder threads, 0 for automatic.
+                Default is DECODE_THREAD_COUNT.
+            recorder (FlightRecorder, optional): Records the video packets, the poses and the stick commands.
+            pose_budget (float, optional): Time budget for one pose estimation in seconds, for the default
+                scheduler and the quality governor. Default is LATENCY_BUDGET.
+            adaptive_quality (bool, optional): Lower the inference resolution and model complexity of the pose
+                estimation while it exceeds the budget. Default is True.
+            max_model_complexity (int, optional): Highest model complexity of the pose estimation.
+                Default is MAX_MODEL_COMPLEXITY.
+            worker_pool (WorkerPool, optional): Shared pool the pose estimations and appearance checks run in,
+                e.g. of several drones in one process. Default is an own inference and appearance thread.
+            session_name (str, optional): Name of the session in the worker pool and of the display window.
+            profile_store (ProfileStore, optional): Saved appearance profiles. Default is a store in PROFILE_DIR.
+            person_detector (str, optional): Detector of the people in multi-person mode, one of PERSON_DETECTORS.
+                Default is "hog".
+            landmarker_model (str, optional): Pose landmarker model bundle of the "landmarker" person detector.
         """
         self.drone_controller = drone_controller
+        self.session_name = session_name
 
-        self.current_frame = None
-        self.last_30_frame_delays = []
+        self.current_frame_rgb = None
         self.frame_count = 0
 
+        # Processing time of the pipeline stages
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.stage_histograms = {stage: self.metrics.histogram("pipeline_stage_seconds",
+                                                               "Processing time of a pipeline stage", stage=stage)
+                                 for stage in PIPELINE_STAGES}
+
+        self.pose_results = None
+        # Landmark array of the tracked person, see landmarks_to_array
         self.pose_landmarks = None
         self.torso_size = None
+        # Filter state of the tracked person
+        self.track_filter = TrackFilter(filter_type)
+        # Appearance of the person calibrated for this session, can be saved and loaded as named profile
+        self.gallery = AppearanceGallery()
+        self.profile_store = profile_store if profile_store is not None else ProfileStore()
+
+        # Pose estimations are served before the appearance checks of the session
+        self.pool_session = None
+        if worker_pool is not None:
+            self.pool_session = worker_pool.register(session_name)
+            self.pool_session.add_lane("pose", 1)
+
+        # Latest SimilarityResult, published by the appearance worker
         self.last_similarity = None
+        self.appearance_worker = AppearanceWorker(self.publish_similarity,
+                                                  histogram=self.stage_histograms["similarity"],
+                                                  appearance_gallery=self.gallery, pool_session=self.pool_session)
+
+        # Motion-gated scheduling of pose estimation and appearance checks
+        self.scheduler = scheduler if scheduler is not None else InferenceScheduler(latency_budget=pose_budget)
+        self.scheduler_log_path = scheduler_log_path
+
+        # Pose estimation, cropped to the region around the last known person in ROI mode
+        self.pose_estimator = RoiPoseEstimator(roi_enabled=roi_mode)
+        # Target selection among several people in the frame
+        self.multi_person_tracker = None
+        if multi_person:
+            self.multi_person_tracker = MultiPersonTracker(create_person_detector(person_detector, landmarker_model),
+                                                           appearance_gallery=self.gallery)
+        # Target the filters belong to, they are reset when another person is selected
+        self.target_id = 0
+        # Inference resolution and model complexity adapted to the pose latency
+        self.quality_governor = None
+        if adaptive_quality:
+            target = self.multi_person_tracker if self.multi_person_tracker is not None else self.pose_estimator
+            self.quality_governor = QualityGovernor(target, pose_budget, max_model_complexity)
 
         self.tracking_active = True
+        self.command_latency = LatencyTracker(histogram=self.metrics.histogram(
+            "command_latency_seconds", "Time from a frame leaving the decoder to the resulting drone command"))
+        # Combines the tracking outputs into one stick state of the drone
+        self.command_mixer = CommandMixer(drone_controller.drone)
+        # Sends commands at a fixed rate, predicted from the sparse pose measurements
+        self.tracking_controller = None
+        if control_rate:
+            self.tracking_controller = TrackingController(self.command_mixer, control_rate,
+                                                          latency_tracker=self.command_latency,
+                                                          histogram=self.stage_histograms["control"])
+
+        # Latest-frame-wins handoffs between the decode, inference and render stages
+        self.inference_slot = LatestFrameSlot("inference")
+        self.render_slot = LatestFrameSlot("render")
+        self.headless = headless
+        self.window_name = "Output" if session_name is None else f"Output {session_name}"
+        self.display_period = 1.0 / display_fps
+        self.drop_frames = drop_frames
+        # Demuxing and low-delay decoding, skips frames when the decoder falls behind the stream
+        self.ingest = VideoIngest(decode_thread_type, decode_thread_count, catch_up=drop_frames, pace=pace_playback,
+                                  histogram=self.stage_histograms["decode"], recorder=recorder)
+        # Flight recording without decoding, the packets are recorded by the ingest
+        self.recorder = recorder
+        if recorder is not None:
+            self.command_mixer.add_listener(recorder.record_sticks)
+        self.last_report_time = time.time()
+
+        # Decoded frames are converted into pooled RGB buffers, the display gets its own BGR buffer
+        self.frame_converter = FrameConverter()
+        self.display_image = None
+
+        # MediaPipe and the models are loaded in the background, the inference stage waits for them
+        self.warmup = ModelWarmup(self.warmup_steps())
+
+        self.register_counters()
+
+    def warmup_steps(self):
+        """
+        Get the steps of the model warm-up, see ModelWarmup.
+
+        Returns:
+            list: Pairs of step name and function.
+        """
+        dummy_frame = np.zeros((get_frame_height(), get_frame_width(), 3), dtype=np.uint8)
+        steps = [
+            ("import", load_mediapipe),
+            ("pose_model", self.pose_estimator.build_models),
+            ("pose_inference", lambda: self.pose_estimator.warm_up(dummy_frame)),
+            ("color_engine", warm_up_color_engine),
+        ]
+        if self.multi_person_tracker is not None:
+            steps.append(("multi_person_model", self.multi_person_tracker.build_models))
+        if self.quality_governor is not None:
+            steps.append(("quality_levels", self.quality_governor.build_models))
+        return steps
+
+    def register_counters(self):
+        """
+        Expose the counters of the pipeline stages in the metrics registry.
+        """
+        self.metrics.counter("frames_decoded_total", "Decoded video frames", lambda: self.frame_count)
+        self.metrics.counter("frames_dropped_total", "Frames replaced before a stage took them",
+                             lambda: self.inference_slot.dropped, stage="inference")
+        self.metrics.counter("frames_dropped_total", "", lambda: self.render_slot.dropped, stage="display")
+        self.metrics.counter("decode_skipped_frames_total", "Non-reference frames skipped by the lagging decoder",
+                             lambda: self.ingest.skipped_frames)
+        self.metrics.counter("decode_flushed_packets_total", "Packets dropped to jump to a newer keyframe",
+                             lambda: self.ingest.flushed_packets)
+        self.metrics.counter("decode_flushes_total", "Jumps of the lagging decoder to a newer keyframe",
+                             lambda: self.ingest.flushes)
+        if self.recorder is not None:
+            self.metrics.counter("recorded_packets_total", "Video packets written to the flight recording",
+                                 lambda: self.recorder.recorded_packets)
+            self.metrics.counter("recorder_dropped_total", "Records dropped from the full queue of the flight recorder",
+                                 lambda: self.recorder.dropped)
+        self.metrics.counter("appearance_checks_total", "Completed appearance checks",
+                             lambda: self.appearance_worker.completed)
+        self.metrics.counter("appearance_checks_dropped_total", "Appearance checks dropped from the full queue",
+                             lambda: self.appearance_worker.dropped)
+        if self.quality_governor is not None:
+            self.metrics.counter("pose_quality_switches_total", "Switches of the pose inference quality",
+                                 lambda: self.quality_governor.downgrades, direction="down")
+            self.metrics.counter("pose_quality_switches_total", "", lambda: self.quality_governor.upgrades,
+                                 direction="up")
+        self.metrics.counter("stick_updates_total", "Stick states sent to the drone", lambda: self.command_mixer.sent)
+        self.metrics.counter("stick_updates_suppressed_total", "Unchanged stick states that were not sent",
+                             lambda: self.command_mixer.suppressed)
 
     def start_tracking(self):
         self.tracking_active = True
+        if self.tracking_controller is not None:
+            self.tracking_controller.set_active(True)
 
     def stop_tracking(self):
         self.tracking_active = False
+        if self.tracking_controller is not None:
+            self.tracking_controller.set_active(False)
+        else:
+            self.command_mixer.release()
 
-    def calculate_delay(self, start_time, end_time, image):
+    def calibrate_colors(self, image=None):
         """
-        Calculate and display the average delay of the last 30 frames.
+        Calibrate colors of the person in the frame.
 
         Args:
-            start_time (float): The start time of frame processing.
-            end_time (float): The end time of frame processing.
-            image (numpy.ndarray): The current frame image.
+            image (numpy.ndarray, optional): The RGB frame image. Default is the current frame.
         """
-        frame_delay = end_time - start_time
-        self.last_30_frame_delays.append(frame_delay)
+        if image is None:
+            image = self.current_frame_rgb
+        if self.pose_landmarks is not None and image is not None:
+            calibrate_colors(image, self.pose_landmarks, self.gallery)
+        else:
+            print("Color calibration didn't work. No pose landmarks detected")
 
-        # Only keep the last 30 delays
-        if len(self.last_30_frame_delays) > 30:
-            self.last_30_frame_delays.pop(0)
+    def save_profile(self, name):
+        """
+        Save the calibrated appearance as a named profile.
 
-        # Calculate the average delay of the last 30 frames
-        average_delay = sum(self.last_30_frame_delays) / len(self.last_30_frame_delays)
+        Args:
+            name (str): Name of the profile.
 
-        # Draw the delay on screen
-        cv2.putText(image, f'Avg Delay Last 30 Frames: {average_delay:.4f} s', (10, 110),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2, cv2.LINE_AA)
+        Raises:
+            ValueError: If the name is invalid or no person is calibrated.
+        """
+        self.profile_store.save(name, self.gallery)
 
-    def calibrate_colors(self, image):
+    def load_profile(self, name):
         """
-        Calibrate colors of the person in the frame.
+        Load a saved profile as calibrated appearance, so the person is recognized without calibration.
 
         Args:
-            image (numpy.ndarray): The RGB frame image.
+            name (str): Name of the profile.
+
+        Raises:
+            KeyError: If there is no profile of that name.
         """
-        if self.pose_landmarks:
-            calibrate_colors(image, self.pose_landmarks)
-        else:
-            print("Color calibration didn't work. No pose landmarks detected")
+        self.profile_store.load(name, self.gallery)
+        # Scores of the previous appearance don't apply anymore
+        self.last_similarity = None
 
-    def process_pose_landmarks(self, pose_results):
+    def process_pose_landmarks(self, pose_results, timestamp=None):
         """
         Process the pose landmarks to calculate average shoulder position and torso size.
 
         Args:
             pose_results (mediapipe.python.solutions.pose.PoseLandmark): The pose landmarks results.
+            timestamp (float, optional): Capture time of the frame.
 
         Returns:
             tuple: The average shoulder X and Y coordinates.
         """
-        self.pose_landmarks = pose_results.pose_landmarks.landmark
-        avg_shoulder_x, avg_shoulder_y, self.torso_size = calculate_avg_coordinates(self.pose_landmarks,
-                                                                                    calculate_torso_size(
-                                                                                        self.pose_landmarks))
+        # Read the landmarks from the protobuf messages once, all further processing uses the array
+        self.pose_landmarks = landmarks_to_array(pose_results.pose_landmarks.landmark)
+        avg_shoulder_x, avg_shoulder_y, self.torso_size = calculate_avg_coordinates(
+            self.pose_landmarks, calculate_torso_size(self.pose_landmarks), self.track_filter, timestamp)
         return avg_shoulder_x, avg_shoulder_y
 
-    def process_frame_tracking(self, frame_rgb, pose_results):
+    def process_frame_tracking(self, packet, pose_results, inference_time=None):
         """
         Process the frame for tracking purposes.
 
         Args:
-            frame_rgb (numpy.ndarray): The RGB frame image.
+            packet (FramePacket): The frame the pose was estimated on.
             pose_results (mediapipe.python.solutions.pose.PoseLandmark): The pose landmarks results.
+            inference_time (float, optional): Duration of the pose estimation in seconds.
         """
-        avg_shoulder_x, avg_shoulder_y = self.process_pose_landmarks(pose_results)
+        avg_shoulder_x, avg_shoulder_y = self.process_pose_landmarks(pose_results, packet.capture_time)
+        if self.recorder is not None and self.pose_landmarks is not None:
+            self.recorder.record_pose(packet.capture_time, packet.stream_index, self.pose_landmarks)
+        self.scheduler.update_pose(packet.capture_time, avg_shoulder_x, avg_shoulder_y, self.torso_size,
+                                   inference_time)
 
-        # Perform person color similarity check every 30th frame
-        if self.frame_count % 30 == 0:
-            self.last_similarity = check_person_similarity(frame_rgb, self.pose_landmarks)
+        # Perform person color similarity check in the background if the scheduler asks for it
+        if self.scheduler.should_run_appearance(packet.frame_id, packet.capture_time):
+            self.appearance_worker.submit(packet.frame_id, packet.capture_time, packet.frame_rgb,
+                                          self.pose_landmarks)
 
         # Follow person in the frame if tracking is activated
         if self.tracking_active:
-            track_person(self.last_similarity, self.drone_controller.drone, avg_shoulder_x, avg_shoulder_y,
-                         self.torso_size)
+            similarity = self.last_similarity
+            score = similarity.score if similarity is not None else None
+            age = similarity.age(packet.capture_time) if similarity is not None else None
+            if self.tracking_controller is not None:
+                # The control thread sends the commands
+                self.tracking_controller.update_measurement(packet.capture_time, avg_shoulder_x, avg_shoulder_y,
+                                                            self.torso_size, should_follow(score, age))
+            else:
+                control_start = time.time()
+                if track_person(score, self.command_mixer, avg_shoulder_x, avg_shoulder_y, self.torso_size, age):
+                    self.command_latency.record(packet.capture_time)
+                self.stage_histograms["control"].record(time.time() - control_start)
         else:
             print("Tracking not active.")
 
-    def process_frame(self, frame_rgb):
+    def publish_similarity(self, result):
+        """
+        Publish the result of an appearance check, unless a newer one was already published.
+
+        Args:
+            result (SimilarityResult): The result of the appearance check.
+        """
+        if self.last_similarity is None or result.frame_id >= self.last_similarity.frame_id:
+            self.last_similarity = result
+
+    def process_frame(self, packet):
         """
         Process the frame for pose detection.
 
         Args:
-            frame_rgb (numpy.ndarray): The RGB frame image.
+            packet (FramePacket): The frame to process.
 
         Returns:
             mediapipe.python.solutions.pose.PoseLandmark: The pose landmarks results.
         """
-        pose_results = pose.process(frame_rgb)
+        start_time = time.time()
+        if self.multi_person_tracker is not None:
+            pose_results = self.multi_person_tracker.process(packet.frame_rgb, packet.capture_time)
+            if self.multi_person_tracker.target_id != self.target_id:
+                self.reset_target(self.multi_person_tracker.target_id)
+        else:
+            pose_results = self.pose_estimator.process(packet.frame_rgb)
+        inference_time = time.time() - start_time
+        self.stage_histograms["pose"].record(inference_time)
+        if self.quality_governor is not None:
+            self.quality_governor.update(inference_time)
+
         # Process the pose landmarks if a person is in frame
         if pose_results.pose_landmarks:
-            self.process_frame_tracking(frame_rgb, pose_results)
+            self.process_frame_tracking(packet, pose_results, inference_time)
+        else:
+            self.scheduler.update_pose(packet.capture_time, inference_time=inference_time)
+        self.pose_results = pose_results
         return pose_results
 
+    def reset_target(self, target_id):
+        """
+        Forget the filtered and predicted state of the previous target, so it isn't mixed into the new one.
+
+        Args:
+            target_id (int): ID of the new target.
+        """
+        self.target_id = target_id
+        self.track_filter.reset()
+        if self.tracking_controller is not None:
+            self.tracking_controller.state.reset()
+
+    @property
+    def current_frame(self):
+        """
+        Read-only BGR view of the current frame.
+        """
+        return bgr_view(self.current_frame_rgb)
+
     def get_current_frame(self):
         """
         Get the current frame image.
+
+        Returns:
+            numpy.ndarray or None: Read-only BGR view of the current frame.
         """
         return self.current_frame
 
-    @staticmethod
-    def create_image_from_frame(frame):
+    def get_pipeline_stats(self):
         """
-        Convert a frame to a Color and RGB image.
+        Get the frame drop counts and glass-to-command latency of the pipeline.
+
+        Returns:
+            dict: The pipeline statistics.
+        """
+        stats = {
+            "decoded_frames": self.frame_count,
+            "decode_skipped": self.ingest.skipped_frames,
+            "decode_flushed": self.ingest.flushed_packets,
+            "inference_dropped": self.inference_slot.dropped,
+            "render_dropped": self.render_slot.dropped,
+            "appearance_checks": self.appearance_worker.completed,
+            "appearance_dropped": self.appearance_worker.dropped,
+            "commands": (self.tracking_controller.commands if self.tracking_controller is not None
+                         else self.command_latency.count),
+            "avg_command_latency": self.command_latency.average(),
+            "max_command_latency": self.command_latency.maximum(),
+            "stick_updates_sent": self.command_mixer.sent,
+            "stick_updates_suppressed": self.command_mixer.suppressed,
+        }
+        stats["stage_timings"] = {stage: histogram.summary() for stage, histogram in self.stage_histograms.items()
+                                  if histogram.count}
+        if self.quality_governor is not None:
+            stats["pose_quality"] = self.quality_governor.get_stats()
+        if self.pool_session is not None:
+            stats["worker_pool"] = self.pool_session.get_stats()
+        if self.multi_person_tracker is not None:
+            stats["selection_time_by_person_count"] = self.multi_person_tracker.get_cost_stats()
+        return stats
+
+    def report_pipeline_stats(self):
+        """
+        Print the pipeline statistics every PIPELINE_REPORT_INTERVAL seconds.
+        """
+        now = time.time()
+        if now - self.last_report_time < PIPELINE_REPORT_INTERVAL:
+            return
+        self.last_report_time = now
+
+        stats = self.get_pipeline_stats()
+        latency = stats["avg_command_latency"]
+        latency_text = f"{latency * 1000:.1f} ms" if latency is not None else "n/a"
+        print(f"Pipeline: {stats['decoded_frames']} frames decoded, "
+              f"{stats['decode_skipped'] + stats['decode_flushed']} skipped by the decoder, "
+              f"{stats['inference_dropped']} dropped before inference, "
+              f"{stats['render_dropped']} dropped before display, "
+              f"avg glass-to-command latency {latency_text}")
+        if "pose_quality" in stats:
+            quality = stats["pose_quality"]
+            print(f"Pose quality: {quality['inference_width']} px wide, model complexity {quality['model_complexity']}, "
+                  f"{quality['downgrades']} downgrades, {quality['upgrades']} upgrades")
+        if "selection_time_by_person_count" in stats:
+            costs = ", ".join(f"{count} people: {seconds * 1000:.1f} ms"
+                              for count, seconds in stats["selection_time_by_person_count"].items())
+            print(f"Target selection: {costs}")
+
+    def stop_pipeline(self):
+        """
+        Stop all pipeline stages.
+        """
+        self.drone_controller.running = False
+        self.ingest.stop()
+        self.inference_slot.close()
+        self.render_slot.close()
+
+    def decode_frames(self, container):
+        """
+        Decode stage: decode frames from the stream and hand them to the inference and render stages.
 
         Args:
-            frame (av.frame.Frame): The input frame.
+            container (av.container.InputContainer): The opened video stream.
+        """
+        import av
 
-        Returns:
-            tuple: The BGR image and the RGB image.
+        try:
+            self.ingest.start(container)
+            for frame in self.ingest.frames():
+                if not self.drone_controller.running:
+                    break
+
+                conversion_start = time.time()
+                # Convert frame to RGB into a pooled buffer
+                frame_rgb = self.frame_converter.convert(frame)
+                self.stage_histograms["conversion"].record(time.time() - conversion_start)
+
+                if not self.drop_frames:
+                    self.inference_slot.wait_empty()
+
+                # Count number of frames for skipping processing for some frames
+                self.frame_count += 1
+                packet = FramePacket(self.frame_count, time.time(), frame_rgb, frame.opaque)
+
+                # Update the current frame
+                self.current_frame_rgb = frame_rgb
+
+                self.inference_slot.put(packet)
+                if not self.headless:
+                    self.render_slot.put(packet)
+            if not self.drop_frames:
+                # Let the inference stage take the last frame before the pipeline is stopped
+                self.inference_slot.wait_empty()
+        except av.error.FFmpegError as e:
+            print(f"Decoding of the video stream failed: {e}")
+        finally:
+            self.stop_pipeline()
+
+    def run_inference(self):
+        """
+        Inference stage: run pose estimation and tracking on the freshest frame.
+
+        Frames decoded before the models are warmed up are dropped.
         """
-        image = cv2.cvtColor(np.array(frame.to_image()), cv2.COLOR_RGB2BGR)
-        frame_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        return image, frame_rgb
+        self.warmup.start()
+        while not self.warmup.wait(STAGE_TIMEOUT):
+            if self.inference_slot.closed:
+                return
+        if not self.warmup.ready:
+            print("Pose estimation not available, the models failed to load")
+            return
+
+        while not self.inference_slot.closed:
+            packet = self.inference_slot.get(timeout=STAGE_TIMEOUT)
+            if packet is None:
+                continue
+
+            # Only run pose estimation if the scheduler asks for it
+            if not self.scheduler.should_run_pose(packet.frame_id, packet.frame_rgb, packet.capture_time):
+                continue
+
+            # Process the frame for pose detection, in turn with the other sessions of a worker pool
+            if self.pool_session is not None:
+                self.pool_session.run("pose", self.process_frame, packet)
+            else:
+                self.process_frame(packet)
+
+    def render_frame(self, packet):
+        """
+        Render stage: draw data and skeleton into the frame and display it.
+
+        Args:
+            packet (FramePacket): The frame to display.
+        """
+        # Draw into an own BGR buffer, the pooled frame is shared with the other stages
+        if self.display_image is None or self.display_image.shape != packet.frame_rgb.shape:
+            self.display_image = np.empty_like(packet.frame_rgb)
+        image = cv2.cvtColor(packet.frame_rgb, cv2.COLOR_RGB2BGR, dst=self.display_image)
+        pose_results = self.pose_results
+
+        # Draw data and skeleton in the frame
+        if self.pose_landmarks is not None and pose_results is not None and pose_results.pose_landmarks:
+            # Draw the torso size on the frame
+            cv2.putText(image, f'Torso Size: {self.torso_size:.2f}', (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2, cv2.LINE_AA)
+
+            # Draw skeleton on the frame
+            draw_landmarks(image, pose_results.pose_landmarks)
+
+            # Draw similar score
+            #if self.last_similarity is not None and self.last_similarity.score is not None:
+               # cv2.putText(image, f'Similarity: {self.last_similarity.score:.2f}', (10, 70),
+                           # cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
+
+        # Ensure cv2.imshow is called in a GUI-capable environment
+        try:
+            cv2.imshow(self.window_name, image)
+        except cv2.error as e:
+            warnings.warn("cv2.imshow failed. Skipping frame display.", UserWarning)
+            print(f"cv2.error: {e}")
+
+        # Check for key press
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('c') and self.pose_landmarks is not None:
+            # Calibrate torso colors of person in frame
+            calibrate_colors(packet.frame_rgb, self.pose_landmarks, self.gallery)
+        if key == ord('q'):
+            # Quit
+            self.stop_pipeline()
 
     def start_video_stream(self):
         """
         Start the video stream and process each frame.
+
+        Decoding and inference run in their own threads, the frames are displayed in the calling
+        thread to ensure cv2.imshow works. The stages are connected by latest-frame-wins slots, so
+        a slow stage drops stale frames instead of falling behind the live stream. The display is
+        capped at display_fps, in headless mode nothing is rendered at all.
         """
+        import av
+
+        # Usually started earlier, so the models load while the drone connects
+        self.warmup.start()
         try:
             container = av.open(self.drone_controller.drone.get_video_stream())
         except av.error.InvalidDataError as e:
@@ -157,61 +599,44 @@ class VideoProcessor:
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             return
+
+        decode_thread = threading.Thread(target=self.decode_frames, args=(container,), daemon=True)
+        inference_thread = threading.Thread(target=self.run_inference, daemon=True)
+        self.appearance_worker.start()
+        if self.tracking_controller is not None:
+            self.tracking_controller.start()
+        decode_thread.start()
+        inference_thread.start()
+
         try:
-            while self.drone_controller.running:
-                for frame in container.decode(video=0):
-                    # Get frame and convert to RGB
-                    image, frame_rgb = self.create_image_from_frame(frame)
-
-                    # Update the current frame
-                    self.current_frame = image.copy()
-
-                    # Count number of frames for skipping processing for some frames
-                    self.frame_count += 1
-                    # Save start time to calculate delay from processing
-                    start_time = time.time()
-
-                    # Process every 10th frame
-                    if self.frame_count % 10 == 0:
-                        # Process the frame for pose detection
-                        pose_results = self.process_frame(frame_rgb)
-
-                    # Draw data and skeleton in the frame
-                    if self.pose_landmarks:
-                        # Draw the torso size on the frame
-                        cv2.putText(image, f'Torso Size: {self.torso_size:.2f}', (10, 30),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2, cv2.LINE_AA)
-
-                        # Draw skeleton on the frame
-                        mp_drawing.draw_landmarks(image, pose_results.pose_landmarks,
-                                                  mp.solutions.pose.POSE_CONNECTIONS)
-
-                        # Draw similar score
-                        #if self.last_similarity is not None:
-                           # cv2.putText(image, f'Similarity: {self.last_similarity:.2f}', (10, 70),
-                                       # cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
-
-                    # Calculate delay from processing
-                    #self.calculate_delay(start_time, time.time(), image)
-
-                    # Ensure cv2.imshow is called in a GUI-capable environment
-                    try:
-                        cv2.imshow('Output', image)
-                    except cv2.error as e:
-                        warnings.warn("cv2.imshow failed. Skipping frame display.", UserWarning)
-                        print(f"cv2.error: {e}")
-
-                    # Check for key press
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('c') and self.pose_landmarks:
-                        # Calibrate torso colors of person in frame
-                        calibrate_colors(image, self.pose_landmarks)
-                    if key == ord('q'):
-                        # Quit
-                        self.drone_controller.running = False
-                        break
+            while not self.render_slot.closed:
+                if self.headless:
+                    # Only report, the pipeline is stopped by the decode stage
+                    time.sleep(STAGE_TIMEOUT)
+                else:
+                    packet = self.render_slot.get(timeout=STAGE_TIMEOUT)
+                    if packet is not None:
+                        render_start = time.time()
+                        self.render_frame(packet)
+                        self.stage_histograms["display"].record(time.time() - render_start)
+                        # Frames decoded meanwhile are dropped by the render slot
+                        time.sleep(max(self.display_period - (time.time() - render_start), 0))
+                self.report_pipeline_stats()
         except KeyboardInterrupt:
             pass
 
+        self.stop_pipeline()
+        inference_thread.join()
+        decode_thread.join(timeout=1.0)
+        self.appearance_worker.stop()
+        if self.tracking_controller is not None:
+            self.tracking_controller.stop()
+        if self.recorder is not None:
+            self.recorder.stop()
+
+        if self.scheduler_log_path:
+            self.scheduler.save_decision_log(self.scheduler_log_path)
+
         self.drone_controller.quit()
-        cv2.destroyAllWindows()
+        if not self.headless:
+            cv2.destroyAllWindows()
@@ -0,0 +1,260 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Number of worker threads shared by all sessions, MediaPipe and OpenCV release the GIL during inference
+NUM_WORKERS = os.cpu_count() or 1
+# Maximum number of pending tasks per lane, the oldest is dropped if a new one arrives
+LANE_SIZE = 2
+
+
+class PoolTask:
+    """
+    A function call queued in a lane of the WorkerPool.
+    """
+
+    def __init__(self, function, args):
+        self.function = function
+        self.args = args
+        self.submitted_at = time.time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        self.done.set()
+
+
+class PoolLane:
+    """
+    Queue of one kind of task of a session, e.g. its pose estimations.
+
+    The tasks of a lane run one after another, never in parallel, so they can share state
+    like a pose estimator without locking.
+    """
+
+    def __init__(self, name, queue_size):
+        self.name = name
+        self.queue = deque(maxlen=queue_size)
+        self.busy = False
+
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.wait_time = 0.0
+
+    def runnable(self):
+        return not self.busy and bool(self.queue)
+
+
+class PoolSession:
+    """
+    Handle of one session, e.g. one drone, in the WorkerPool.
+    """
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+        # Lanes in the order they are served within the session
+        self.lanes = {}
+
+    def add_lane(self, name, queue_size=LANE_SIZE):
+        """
+        Add a lane. Lanes added first are served first when a worker turns to this session.
+
+        Args:
+            name (str): Name of the lane, e.g. "pose".
+            queue_size (int, optional): Maximum number of pending tasks. Default is LANE_SIZE.
+        """
+        with self.pool.condition:
+            self.lanes[name] = PoolLane(name, queue_size)
+
+    def next_task(self):
+        """
+        Take the next task of the first runnable lane. The condition of the pool has to be held by the caller.
+
+        Returns:
+            tuple or None: The lane and the task, None if no lane is runnable.
+        """
+        for lane in self.lanes.values():
+            if lane.runnable():
+                lane.busy = True
+                return lane, lane.queue.popleft()
+        return None
+
+    def submit(self, lane_name, function, *args):
+        """
+        Queue a call without waiting for it, dropping the oldest pending call of the lane if it is full.
+
+        Args:
+            lane_name (str): Name of the lane.
+            function (callable): The function, called on a worker thread.
+            *args: Arguments of the function.
+
+        Returns:
+            PoolTask: The queued task.
+        """
+        return self.pool.enqueue(self, self.lanes[lane_name], PoolTask(function, args))
+
+    def run(self, lane_name, function, *args):
+        """
+        Run a call on a worker thread and wait for it.
+
+        Args:
+            lane_name (str): Name of the lane.
+            function (callable): The function, called on a worker thread.
+            *args: Arguments of the function.
+
+        Returns:
+            object: The return value of the function, None if the pool was stopped before it ran.
+        """
+        task = self.submit(lane_name, function, *args)
+        task.done.wait()
+        if task.error is not None:
+            raise task.error
+        return task.result
+
+    def get_stats(self):
+        """
+        Get the number of tasks and the average queueing time per lane.
+
+        Returns:
+            dict: The lane statistics, keyed by lane name.
+        """
+        return {name: {
+            "submitted": lane.submitted,
+            "dropped": lane.dropped,
+            "completed": lane.completed,
+            "avg_wait_time": lane.wait_time / lane.completed if lane.completed else None,
+        } for name, lane in self.lanes.items()}
+
+
+class WorkerPool:
+    """
+    Fixed number of worker threads running the pose and appearance work of several sessions.
+
+    Every session has its own bounded lanes, so a busy session can't grow a backlog that
+    delays the others. Idle workers turn to the sessions in round-robin order and take the
+    next task of the first runnable lane of that session, so every session with pending work
+    gets its turn, regardless of how many tasks it queues.
+    """
+
+    def __init__(self, num_workers=NUM_WORKERS):
+        """
+        Initialize the WorkerPool.
+
+        Args:
+            num_workers (int, optional): Number of worker threads. Default is NUM_WORKERS.
+        """
+        self.num_workers = num_workers
+        self.condition = threading.Condition()
+        self.sessions = []
+        # Index of the session the next idle worker looks at first
+        self.next_session = 0
+        self.running = False
+        self.threads = []
+
+    def register(self, name):
+        """
+        Register a session.
+
+        Args:
+            name (str): Name of the session, e.g. the address of the drone.
+
+        Returns:
+            PoolSession: The handle to submit the tasks of the session.
+        """
+        session = PoolSession(self, name)
+        with self.condition:
+            self.sessions.append(session)
+        return session
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        self.threads = [threading.Thread(target=self.run, name=f"pool-worker-{index}", daemon=True)
+                        for index in range(self.num_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop the worker threads after their current tasks, pending tasks are cancelled.
+        """
+        with self.condition:
+            self.running = False
+            for session in self.sessions:
+                for lane in session.lanes.values():
+                    while lane.queue:
+                        lane.queue.popleft().cancel()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def enqueue(self, session, lane, task):
+        with self.condition:
+            if not self.running:
+                task.cancel()
+                return task
+            lane.submitted += 1
+            if len(lane.queue) == lane.queue.maxlen:
+                lane.dropped += 1
+                lane.queue[0].cancel()
+            lane.queue.append(task)
+            self.condition.notify()
+        return task
+
+    def take_task(self):
+        """
+        Take the next task in round-robin order over the sessions. The condition has to be held by the caller.
+
+        Returns:
+            tuple or None: The lane and the task, None if no task is runnable.
+        """
+        count = len(self.sessions)
+        for offset in range(count):
+            index = (self.next_session + offset) % count
+            entry = self.sessions[index].next_task()
+            if entry is not None:
+                self.next_session = (index + 1) % count
+                return entry
+        return None
+
+    def run(self):
+        """
+        Run the tasks of all sessions until the pool is stopped.
+        """
+        while True:
+            with self.condition:
+                entry = None
+                while self.running:
+                    entry = self.take_task()
+                    if entry is not None:
+                        break
+                    self.condition.wait()
+                if entry is None:
+                    return
+            lane, task = entry
+
+            start_time = time.time()
+            try:
+                task.result = task.function(*task.args)
+            except Exception as e:
+                task.error = e
+            task.done.set()
+
+            with self.condition:
+                lane.busy = False
+                lane.completed += 1
+                lane.wait_time += start_time - task.submitted_at
+                # The lane may be runnable again
+                self.condition.notify()